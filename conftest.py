@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_cache():
+    # Тесты не трогают кеш разработчика (см. core/testing.py).
+    from core.testing import isolated_cache
+
+    with isolated_cache():
+        yield
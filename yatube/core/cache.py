@@ -0,0 +1,316 @@
+"""Кеш в файле SQLite, общий для всех процессов на одном сервере.
+
+В отличие от ``LocMemCache`` записи видны всем WSGI-воркерам, поэтому
+страница, собранная одним воркером, достаётся и остальным. Кроме
+стандартного API кеша бэкенд умеет ``get_or_compute``:
+
+* пересчёт значения выполняет только один процесс (single-flight),
+  остальные ждут результат или отдают устаревшее значение;
+* значение пересчитывается с вероятностью, растущей к концу срока
+  жизни (probabilistic early expiration, XFetch), чтобы горячие ключи
+  не истекали одновременно у всех;
+* после истечения срока значение ещё ``stale`` секунд может отдаваться,
+  пока его пересчитывает другой процесс (stale-while-revalidate).
+"""
+import math
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core import metrics
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' stale_until REAL,'
+    ' delta REAL NOT NULL DEFAULT 0'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_stale_until ON cache (stale_until)',
+    'CREATE TABLE IF NOT EXISTS cache_lock ('
+    ' key TEXT PRIMARY KEY,'
+    ' until REAL NOT NULL'
+    ') WITHOUT ROWID',
+)
+
+
+class SQLiteCache(BaseCache):
+    """Бэкенд кеша Django поверх файла SQLite в режиме WAL.
+
+    Параметры ``OPTIONS`` помимо стандартных:
+
+    * ``LOCK_TIMEOUT`` — сколько секунд пересчёт держит блокировку ключа;
+    * ``STALE_TIMEOUT`` — сколько секунд после истечения срока
+      значение можно отдавать, пока его пересчитывают;
+    * ``EARLY_EXPIRY_BETA`` — коэффициент раннего пересчёта XFetch,
+      0 отключает ранний пересчёт.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.lock_timeout = float(options.get('LOCK_TIMEOUT', 10))
+        self.stale_timeout = float(options.get('STALE_TIMEOUT', 60))
+        self.beta = float(options.get('EARLY_EXPIRY_BETA', 1))
+        self._local = threading.local()
+
+    # Соединения
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и каждого процесса: после
+        # fork унаследованным соединением пользоваться нельзя.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self, **kwargs):
+        # Соединение с файлом кеша живёт дольше запроса.
+        pass
+
+    # Вспомогательные методы
+
+    def _expiry(self, timeout):
+        # Возвращает момент истечения или None для вечных ключей.
+        return self.get_backend_timeout(timeout)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _write(self, key, value, expires, stale_until=None, delta=0.0):
+        self._db.execute(
+            'INSERT OR REPLACE INTO cache '
+            '(key, value, expires, stale_until, delta) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (
+                key,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                expires,
+                expires if stale_until is None else stale_until,
+                delta,
+            ),
+        )
+        self._maybe_cull()
+
+    def _maybe_cull(self):
+        if random.randrange(self._cull_frequency * 100):
+            return
+        db = self._db
+        db.execute(
+            'DELETE FROM cache WHERE stale_until < ?', (time.time(),)
+        )
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM cache'
+                ' ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    def _count_lookup(self, key, hit):
+        metrics.inc(
+            'yatube_cache_requests_total',
+            (
+                ('prefix', metrics.cache_prefix(key)),
+                ('result', 'hit' if hit else 'miss'),
+            ),
+        )
+
+    def _live_row(self, key):
+        return self._db.execute(
+            'SELECT value FROM cache '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+
+    # Стандартный API кеша
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if self._live_row(key) is not None:
+                return False
+            self._write(key, value, self._expiry(timeout))
+            return True
+        finally:
+            db.execute('COMMIT')
+
+    def get(self, key, default=None, version=None):
+        row = self._live_row(self._key(key, version))
+        self._count_lookup(key, row is not None)
+        return default if row is None else pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(self._key(key, version), value, self._expiry(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expiry(timeout)
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ?, stale_until = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (expires, expires, self._key(key, version), time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        self._db.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def has_key(self, key, version=None):
+        return self._live_row(self._key(key, version)) is not None
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        rows = self._db.execute(
+            'SELECT key, value FROM cache WHERE key IN ({}) '
+            'AND (expires IS NULL OR expires > ?)'.format(
+                ', '.join('?' * len(keys))
+            ),
+            (*keys, time.time()),
+        )
+        found = {keys[key]: pickle.loads(value) for key, value in rows}
+        for key in keys.values():
+            self._count_lookup(key, key in found)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expiry(timeout)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            for key, value in data.items():
+                self._write(self._key(key, version), value, expires)
+        finally:
+            db.execute('COMMIT')
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._db.execute(
+                'DELETE FROM cache WHERE key IN ({})'.format(
+                    ', '.join('?' * len(keys))
+                ),
+                keys,
+            )
+
+    def incr(self, key, delta=1, version=None):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            value = self.get(key, version=version)
+            if value is None:
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            # Срок жизни ключа при этом не меняется.
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                    self._key(key, version),
+                ),
+            )
+            return value
+        finally:
+            db.execute('COMMIT')
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+        self._db.execute('DELETE FROM cache_lock')
+
+    # Защита от «набегов» на пересчёт
+
+    def _acquire(self, key):
+        now = time.time()
+        db = self._db
+        db.execute(
+            'DELETE FROM cache_lock WHERE key = ? AND until < ?', (key, now)
+        )
+        cursor = db.execute(
+            'INSERT OR IGNORE INTO cache_lock (key, until) VALUES (?, ?)',
+            (key, now + self.lock_timeout),
+        )
+        return cursor.rowcount == 1
+
+    def _release(self, key):
+        self._db.execute('DELETE FROM cache_lock WHERE key = ?', (key,))
+
+    def _is_fresh(self, expires, delta, now):
+        if expires is None:
+            return True
+        if self.beta and delta:
+            # XFetch: чем дороже пересчёт и ближе истечение,
+            # тем вероятнее пересчитать заранее.
+            now -= delta * self.beta * math.log(1 - random.random())
+        return now < expires
+
+    def get_or_compute(self, key, compute, timeout=DEFAULT_TIMEOUT,
+                       version=None, cacheable=None):
+        """Возвращает значение ключа, при необходимости вычисляя его
+        вызовом ``compute()`` не более чем в одном процессе.
+
+        ``cacheable(value)`` решает, сохранять ли вычисленное значение.
+        """
+        name, key = key, self._key(key, version)
+        deadline = time.time() + self.lock_timeout
+        while True:
+            now = time.time()
+            row = self._db.execute(
+                'SELECT value, expires, stale_until, delta FROM cache '
+                'WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and self._is_fresh(row[1], row[3], now):
+                self._count_lookup(name, True)
+                return pickle.loads(row[0])
+            if self._acquire(key):
+                break
+            if row is not None and row[2] is not None and row[2] > now:
+                # Значение пересчитывает другой процесс, отдаём прежнее.
+                self._count_lookup(name, True)
+                return pickle.loads(row[0])
+            if now >= deadline:
+                return compute()
+            time.sleep(0.01)
+
+        self._count_lookup(name, False)
+        try:
+            started = time.time()
+            value = compute()
+            delta = time.time() - started
+            if cacheable is None or cacheable(value):
+                expires = self._expiry(timeout)
+                stale_until = (
+                    None if expires is None
+                    else expires + self.stale_timeout
+                )
+                self._write(key, value, expires, stale_until, delta)
+            return value
+        finally:
+            self._release(key)
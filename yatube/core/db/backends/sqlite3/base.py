@@ -0,0 +1,71 @@
+"""Бэкенд SQLite, настроенный для работы под нагрузкой.
+
+Отличия от ``django.db.backends.sqlite3``:
+
+* при подключении выставляются прагмы из ``PRAGMAS`` (журнал WAL,
+  ``synchronous``, ``mmap_size``, ``cache_size``, ``busy_timeout``);
+  их можно переопределить ключом ``pragmas`` в ``OPTIONS``;
+* транзакции, открытые внутри ``immediate()``, начинаются с
+  ``BEGIN IMMEDIATE``: блокировка на запись берётся сразу, и
+  конкурирующая транзакция ждёт её в пределах ``busy_timeout``.
+  Отложенная транзакция, которая сначала читает, а потом пишет,
+  получает «database is locked» без всякого ожидания. Остальные
+  транзакции, в том числе только читающие, начинаются с обычного
+  ``BEGIN`` и блокировку на запись не занимают.
+"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    # Читатели не блокируют писателя и наоборот.
+    'journal_mode': 'WAL',
+    # В режиме WAL fsync нужен только при checkpoint; после сбоя
+    # питания можно потерять последние транзакции, но не целостность.
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в килобайтах.
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+
+@contextmanager
+def immediate(using=DEFAULT_DB_ALIAS):
+    """Транзакции соединения ``using`` внутри блока начинаются с
+    ``BEGIN IMMEDIATE``. На соединения других бэкендов не влияет.
+    """
+    connection = connections[using]
+    previous = getattr(connection, 'begin_immediate', False)
+    connection.begin_immediate = True
+    try:
+        yield
+    finally:
+        connection.begin_immediate = previous
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    begin_immediate = False
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = {
+            **PRAGMAS,
+            **self.settings_dict['OPTIONS'].get('pragmas', {}),
+        }
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.begin_immediate:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
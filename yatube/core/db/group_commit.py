@@ -0,0 +1,168 @@
+"""Групповая фиксация записей (group commit).
+
+У SQLite один писатель, и каждая транзакция — это отдельный захват
+блокировки и запись в журнал. Когда в процессе одновременно пишут
+несколько потоков, ``submit`` складывает их изменения в очередь, и
+первый освободившийся поток («лидер») выполняет всю накопленную очередь
+в одной транзакции. Каждое изменение выполняется в своей точке
+сохранения, поэтому ошибка в одном из них не откатывает остальные.
+Общая транзакция начинается с ``BEGIN IMMEDIATE`` (см.
+``core.db.backends.sqlite3``).
+Результат или исключение возвращается потоку, который его поставил,
+только после фиксации общей транзакции.
+
+SQLite проверяет внешние ключи Django только при фиксации, и одна
+запись со ссылкой на несуществующую строку провалила бы всю пачку.
+Поэтому ссылки сохраняемого объекта модели проверяются сразу, в его
+точке сохранения, а если фиксация всё же не удалась, записи пачки
+повторяются по одной. Колбэки ``on_commit`` выполняются после
+фиксации и после выдачи результатов: их ошибка только пишется в лог.
+"""
+import logging
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import (DEFAULT_DB_ALIAS, IntegrityError, connections,
+                       transaction)
+from django.db.models import ForeignKey, Model
+
+from core.db.backends.sqlite3.base import immediate
+
+logger = logging.getLogger(__name__)
+
+
+def check_references(func):
+    """Проверяет внешние ключи объекта, если ``func`` — его ``save``."""
+    instance = getattr(func, '__self__', None)
+    if not isinstance(instance, Model):
+        return
+    for field in instance._meta.concrete_fields:
+        if not isinstance(field, ForeignKey) or not field.db_constraint:
+            continue
+        value = getattr(instance, field.attname)
+        if value is None:
+            continue
+        target = field.remote_field.model._base_manager.using(
+            instance._state.db
+        )
+        if not target.filter(
+            **{field.target_field.attname: value}
+        ).exists():
+            raise IntegrityError(
+                f'{instance._meta.label}.{field.name}: нет строки {value}'
+            )
+
+
+def run_hooks(hooks):
+    for hook in hooks:
+        try:
+            hook()
+        except Exception:
+            logger.exception('Колбэк после фиксации %s', hook)
+
+
+class GroupCommitQueue:
+    def __init__(self, using=DEFAULT_DB_ALIAS, max_batch=None):
+        self.using = using
+        self.max_batch = max_batch or getattr(
+            settings, 'GROUP_COMMIT_MAX_BATCH', 64
+        )
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._leader_lock = threading.Lock()
+        self.batches = 0
+
+    def submit(self, func, *args, **kwargs):
+        """Выполняет ``func(*args, **kwargs)`` в общей транзакции и
+        возвращает результат после её фиксации.
+        """
+        if connections[self.using].in_atomic_block:
+            # Внутри транзакции вызывающего нельзя писать другим
+            # соединением: оно будет ждать эту же транзакцию.
+            return func(*args, **kwargs)
+        future = Future()
+        with self._pending_lock:
+            self._pending.append((future, func, args, kwargs))
+        while not future.done():
+            with self._leader_lock:
+                # Пока ждали, нашу запись мог выполнить прежний лидер.
+                if not future.done():
+                    self._flush()
+        return future.result()
+
+    def _take_batch(self):
+        with self._pending_lock:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+        return batch
+
+    def _flush(self):
+        batch = self._take_batch()
+        try:
+            try:
+                results, hooks = self._commit(batch)
+            except Exception:
+                # Не удалась сама фиксация: по одной ошибку получит
+                # только та запись, из-за которой это случилось.
+                results, hooks = self._commit_one_by_one(batch)
+        except BaseException:
+            # Лидера прервали: ожидающие потоки не должны висеть вечно.
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError('Фиксация прервана'))
+            raise
+        for future, resolve, value in results:
+            resolve(value)
+        run_hooks(hooks)
+
+    def _commit_one_by_one(self, batch):
+        results, hooks = [], []
+        for item in batch:
+            future = item[0]
+            try:
+                item_results, item_hooks = self._commit([item])
+            except Exception as error:
+                item_results = [(future, future.set_exception, error)]
+                item_hooks = []
+            results.extend(item_results)
+            hooks.extend(item_hooks)
+        return results, hooks
+
+    def _commit(self, batch):
+        """Выполняет записи в одной транзакции. Возвращает результаты и
+        колбэки ``on_commit``, которые выполнит вызывающий.
+        """
+        connection = connections[self.using]
+        results = []
+        with immediate(self.using), transaction.atomic(using=self.using):
+            for future, func, args, kwargs in batch:
+                try:
+                    with transaction.atomic(using=self.using):
+                        value = func(*args, **kwargs)
+                        check_references(func)
+                except Exception as error:
+                    results.append((future, future.set_exception, error))
+                else:
+                    results.append((future, future.set_result, value))
+            # Колбэки откатанных точек сохранения Django уже убрал.
+            hooks = [hook for _, hook in connection.run_on_commit]
+            connection.run_on_commit = []
+        self.batches += 1
+        return results, hooks
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(using=DEFAULT_DB_ALIAS):
+    with _queues_lock:
+        if using not in _queues:
+            _queues[using] = GroupCommitQueue(using)
+        return _queues[using]
+
+
+def submit(func, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Ставит запись в очередь групповой фиксации базы ``using``."""
+    return get_queue(using).submit(func, *args, **kwargs)
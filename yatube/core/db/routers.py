@@ -0,0 +1,194 @@
+"""Чтение лент с реплик базы данных.
+
+``ReplicaMiddleware`` направляет чтения GET-запросов к представлениям
+из ``REPLICA_VIEWS`` (ленты, пост, списки админки) на одну из реплик
+``DATABASE_REPLICAS``; остальные запросы и все записи идут в основную
+базу. Реплика выбирается, только если она отстаёт не больше чем на
+``REPLICA_MAX_LAG`` секунд, иначе чтение остаётся в основной базе.
+
+После записи (любой не-GET запрос или представление из
+``REPLICA_PIN_VIEWS``) клиент получает cookie с моментом записи и до
+``REPLICA_PIN_SECONDS`` читает только с реплик, которые уже содержат
+этот момент: пользователь сразу видит свой пост, комментарий или
+подписку.
+
+Положение реплики — момент, до которого в ней есть все изменения
+основной базы. У PostgreSQL это время последней применённой
+транзакции, у копии SQLite — время начала копирования командой
+``sync_replicas``.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from core import metrics
+
+PIN_COOKIE = 'primary_since'
+SAFE_METHODS = ('GET', 'HEAD')
+# Таблица копии SQLite с моментом начала копирования.
+SYNC_TABLE = 'replica_sync'
+
+_state = threading.local()
+# Положения реплик в этом процессе: alias -> (когда проверено, положение).
+_positions = {}
+
+
+def replica_position(alias):
+    """Момент (unix time), до которого реплика содержит все изменения
+    основной базы, или ``None``, если реплика недоступна.
+    """
+    connection = connections[alias]
+    if connection.vendor == 'sqlite':
+        sql = f'SELECT synced FROM {SYNC_TABLE}'
+    elif connection.vendor == 'postgresql':
+        # Реплика, применившая всё полученное, не отстаёт, даже если
+        # последняя транзакция была давно, — но только пока приёмник
+        # WAL подключён к основной базе. Отключённая реплика тоже
+        # применила всё полученное, а новых изменений просто не видит.
+        # Статус приёмника виден ролям с pg_read_all_stats.
+        sql = (
+            'SELECT extract(epoch FROM CASE'
+            ' WHEN NOT pg_is_in_recovery() THEN now()'
+            ' WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()'
+            ' AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver'
+            " WHERE status = 'streaming')"
+            ' THEN now() ELSE pg_last_xact_replay_timestamp() END)'
+        )
+    else:
+        return time.time()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    return None if row is None or row[0] is None else float(row[0])
+
+
+def _position(alias):
+    # Положение проверяется не чаще раза в REPLICA_CHECK_INTERVAL
+    # секунд, чтобы не добавлять запрос к каждой странице.
+    now = time.monotonic()
+    checked = _positions.get(alias)
+    interval = settings.REPLICA_CHECK_INTERVAL
+    if checked is None or now - checked[0] >= interval:
+        checked = _positions[alias] = (now, replica_position(alias))
+    return checked[1]
+
+
+def choose_replica(since=0.0):
+    """Случайная реплика, которая содержит изменения до ``since`` и
+    отстаёт не больше ``REPLICA_MAX_LAG``, или ``None``.
+    """
+    oldest = time.time() - settings.REPLICA_MAX_LAG
+    candidates = []
+    for alias in settings.DATABASE_REPLICAS:
+        position = _position(alias)
+        if position is not None and position >= max(since, oldest):
+            candidates.append(alias)
+    return random.choice(candidates) if candidates else None
+
+
+def current():
+    """Реплика, с которой читает текущий запрос, или ``None``."""
+    return getattr(_state, 'alias', None)
+
+
+@contextmanager
+def fresh_since(moment):
+    """Внутри блока чтения идут с реплики, только если она содержит
+    изменения до ``moment``, иначе из основной базы.
+
+    Нужен перед записью в кеш под новой версией: страница, собранная
+    по отставшей реплике, осталась бы в кеше до следующей смены версии.
+    """
+    alias = current()
+    if alias is None or (_position(alias) or 0) >= moment:
+        yield
+        return
+    _state.alias = None
+    try:
+        yield
+    finally:
+        _state.alias = alias
+
+
+def _matches(view_name, patterns):
+    return any(fnmatchcase(view_name, pattern) for pattern in patterns)
+
+
+def _pinned_since(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0))
+    except ValueError:
+        return 0.0
+
+
+class ReplicaRouter:
+    """Чтения выбранной для запроса реплики, записи — в основную базу.
+
+    Реплики не мигрируют: схема приходит в них вместе с данными.
+    """
+
+    def db_for_read(self, model, **hints):
+        return current()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.alias = None
+        if settings.DATABASE_REPLICAS and self.is_write(request):
+            response.set_cookie(
+                PIN_COOKIE,
+                f'{time.time():.6f}',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def is_write(self, request):
+        if request.method not in SAFE_METHODS:
+            return True
+        match = request.resolver_match
+        return bool(match) and _matches(
+            match.view_name, settings.REPLICA_PIN_VIEWS
+        )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (not settings.DATABASE_REPLICAS
+                or request.method not in SAFE_METHODS
+                or not _matches(
+                    request.resolver_match.view_name,
+                    settings.REPLICA_VIEWS,
+                )):
+            return None
+        alias = choose_replica(_pinned_since(request))
+        _state.alias = alias
+        metrics.inc(
+            'yatube_db_read_requests_total',
+            (('database', alias or DEFAULT_DB_ALIAS),),
+        )
+        return None
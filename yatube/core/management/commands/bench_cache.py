@@ -0,0 +1,125 @@
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+
+def percentile(values, share):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def make_cache(backend, location):
+    if backend == 'locmem':
+        return LocMemCache('bench', {})
+    return SQLiteCache(location, {})
+
+
+def run_worker(backend, location, options, seed, results):
+    """Имитирует воркер: запросы к страницам с распределением Ципфа."""
+    cache = make_cache(backend, location)
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(options['keys'])]
+    keys = rng.choices(
+        range(options['keys']), weights=weights, k=options['requests']
+    )
+    hits = 0
+    latencies = []
+    for key in keys:
+        computed = []
+
+        def compute():
+            computed.append(1)
+            time.sleep(options['compute_ms'] / 1000)
+            return 'x' * options['size']
+
+        started = time.perf_counter()
+        name = f'page:{key}'
+        if hasattr(cache, 'get_or_compute'):
+            cache.get_or_compute(name, compute, options['ttl'])
+        elif cache.get(name) is None:
+            cache.set(name, compute(), options['ttl'])
+        latencies.append(time.perf_counter() - started)
+        hits += not computed
+    results.put((hits, latencies))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает долю попаданий и p99 задержки LocMemCache и общего '
+        'SQLiteCache при разном числе процессов-воркеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=[1, 4, 16]
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--keys', type=int, default=200)
+        parser.add_argument('--compute-ms', type=float, default=20)
+        parser.add_argument('--ttl', type=float, default=2)
+        parser.add_argument('--size', type=int, default=30000)
+        parser.add_argument(
+            '--output', help='Файл для сохранения результатов в JSON.'
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        report = []
+        for backend in ('locmem', 'sqlite'):
+            for workers in options['workers']:
+                with tempfile.TemporaryDirectory() as directory:
+                    location = os.path.join(directory, 'cache.sqlite3')
+                    report.append(self.run(
+                        context, backend, location, workers, options
+                    ))
+        self.stdout.write(
+            f'{"backend":8} {"workers":>7} {"hit rate":>9} '
+            f'{"p50, ms":>8} {"p99, ms":>8} {"req/s":>8}'
+        )
+        for row in report:
+            self.stdout.write(
+                f'{row["backend"]:8} {row["workers"]:7d} '
+                f'{row["hit_rate"]:9.3f} {row["p50_ms"]:8.2f} '
+                f'{row["p99_ms"]:8.2f} {row["throughput"]:8.0f}'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+
+    def run(self, context, backend, location, workers, options):
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=run_worker,
+                args=(backend, location, options, seed, results),
+            )
+            for seed in range(workers)
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        hits = sum(hit for hit, _ in collected)
+        latencies = [value for _, values in collected for value in values]
+        return {
+            'backend': backend,
+            'workers': workers,
+            'hit_rate': hits / len(latencies),
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'throughput': len(latencies) / elapsed,
+        }
@@ -0,0 +1,323 @@
+"""Нагрузочный прогон всех страниц сайта.
+
+Каждый процесс-клиент по очереди запрашивает адреса из ``posts.urls``,
+``users.urls`` и ``about.urls`` тестовым клиентом Django (без сети и
+веб-сервера), подставляя в адреса случайные группы, авторов и посты с
+тем же перекосом, что и у живого трафика. Для каждого адреса
+считаются запросы в секунду, перцентили задержки и число SQL-запросов.
+
+Отчёт сохраняется в JSON вместе с коммитом и объёмом данных; ``--compare``
+выводит изменение p50 и p95 относительно прошлого отчёта.
+"""
+import json
+import multiprocessing
+import random
+import subprocess
+import time
+from collections import defaultdict
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from about import urls as about_urls
+from core.management.commands.bench_cache import percentile
+from core.profiling import QueryTimer
+from posts import urls as posts_urls
+from posts.models import Comment, Follow, Group, Post, User, UserCounters
+from users import urls as users_urls
+
+URL_MODULES = (posts_urls, users_urls, about_urls)
+
+# Адреса, которые меняют данные или сессию клиента при GET, а также
+# полная выгрузка базы.
+SKIP = {
+    'posts:profile_follow',
+    'posts:profile_unfollow',
+    'posts:add_comment',
+    'posts:export',
+    'users:logout',
+}
+# Страницы только для авторизованных пользователей.
+LOGIN_REQUIRED = {
+    'posts:follow_index',
+    'posts:api_follow_index',
+    'posts:post_create',
+    'posts:post_edit',
+    'users:password_change',
+    'users:password_change_done',
+}
+
+
+def url_patterns():
+    """Пары «имя адреса, имена его аргументов» для всех страниц."""
+    patterns = []
+    for module in URL_MODULES:
+        for pattern in module.urlpatterns:
+            if isinstance(pattern, URLPattern) and pattern.name:
+                name = f'{module.app_name}:{pattern.name}'
+                if name not in SKIP:
+                    patterns.append((name, set(pattern.pattern.converters)))
+    return patterns
+
+
+class Sampler:
+    """Случайные аргументы для адресов: популярные авторы, группы и
+    свежие посты выпадают чаще, как в живом трафике.
+    """
+
+    searches = ('кот', 'город утро', 'кофе книга', 'фильм', 'мор')
+
+    def __init__(self, rng, size=1000):
+        self.rng = rng
+        self.authors = list(
+            UserCounters.objects.filter(posts_count__gt=0)
+            .order_by('-posts_count')
+            .values_list('user__username', flat=True)[:size]
+        )
+        self.slugs = list(
+            Group.objects.order_by('-posts_count')
+            .values_list('slug', flat=True)[:size]
+        )
+        self.posts = list(
+            Post.objects.order_by('-pk').values_list('pk', flat=True)[:size]
+        )
+        if not (self.authors and self.posts):
+            raise CommandError('В базе нет постов: сначала запустите seed.')
+        # Читатель с подписками, чтобы лента подписок была непустой.
+        readers = list(
+            Follow.objects.values_list('user', flat=True)[:size]
+        ) or list(Post.objects.values_list('author', flat=True)[:1])
+        self.reader = User.objects.get(pk=rng.choice(readers))
+        self.own_post = (
+            Post.objects.filter(author=self.reader)
+            .values_list('pk', flat=True).first()
+        )
+
+    def skewed(self, values):
+        # Квадрат равномерной величины смещает выбор к началу списка.
+        return values[int(len(values) * self.rng.random() ** 2)]
+
+    def kwargs(self, name, arguments):
+        """Аргументы адреса или None, если страницу не открыть."""
+        if name == 'posts:post_edit':
+            # Править можно только свой пост.
+            if self.own_post is None:
+                return None
+            return {'post_id': self.own_post}
+        kwargs = {}
+        if 'uidb64' in arguments:
+            kwargs['uidb64'] = urlsafe_base64_encode(
+                force_bytes(self.reader.pk)
+            )
+            kwargs['token'] = default_token_generator.make_token(self.reader)
+        if 'slug' in arguments:
+            if not self.slugs:
+                return None
+            kwargs['slug'] = self.skewed(self.slugs)
+        if 'username' in arguments:
+            kwargs['username'] = self.skewed(self.authors)
+        if 'post_id' in arguments:
+            kwargs['post_id'] = self.skewed(self.posts)
+        return kwargs
+
+    def query(self, name):
+        if name == 'posts:search':
+            return {'q': self.rng.choice(self.searches)}
+        return {}
+
+
+def run_client(options, seed, results):
+    """Клиент: ``options['requests']`` проходов по всем адресам."""
+    rng = random.Random(seed)
+    sampler = Sampler(rng)
+    clients = {}
+    if options['as'] in ('guest', 'both'):
+        clients['guest'] = Client(HTTP_HOST='localhost')
+    if options['as'] in ('user', 'both'):
+        clients['user'] = Client(HTTP_HOST='localhost')
+        clients['user'].force_login(sampler.reader)
+    patterns = [
+        (name, arguments) for name, arguments in url_patterns()
+        if not options['only'] or name in options['only']
+    ]
+    samples = defaultdict(list)
+    for _ in range(options['requests']):
+        for mode, client in clients.items():
+            for name, arguments in patterns:
+                if mode == 'guest' and name in LOGIN_REQUIRED:
+                    continue
+                kwargs = sampler.kwargs(name, arguments)
+                if kwargs is None:
+                    continue
+                url = reverse(name, kwargs=kwargs)
+                timer = QueryTimer()
+                with connections['default'].execute_wrapper(timer):
+                    started = time.perf_counter()
+                    response = client.get(url, sampler.query(name))
+                    elapsed = time.perf_counter() - started
+                samples[f'{mode} {name}'].append(
+                    (elapsed, timer.count, response.status_code)
+                )
+    connections.close_all()
+    results.put(dict(samples))
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает все страницы posts, users и about несколькими '
+        'процессами-клиентами и сохраняет пропускную способность, '
+        'перцентили задержки и число SQL-запросов в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients', type=int, default=4,
+            help='Число параллельных процессов-клиентов.',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=20,
+            help='Сколько раз каждый клиент проходит по всем адресам.',
+        )
+        parser.add_argument(
+            '--as', choices=('guest', 'user', 'both'), default='both',
+        )
+        parser.add_argument(
+            '--only', nargs='+',
+            help='Имена адресов, например posts:index.',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=1,
+            help='Проходов прогрева кеша перед замером.',
+        )
+        parser.add_argument(
+            '--output', help='Файл для сохранения результатов в JSON.'
+        )
+        parser.add_argument(
+            '--compare', help='Отчёт прошлого прогона для сравнения.'
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        if options['warmup']:
+            self.run(context, {**options, 'requests': options['warmup']}, 1)
+        started = time.perf_counter()
+        samples = self.run(context, options, options['clients'])
+        elapsed = time.perf_counter() - started
+        report = self.make_report(samples, elapsed, options)
+        self.print_report(report)
+        if options['compare']:
+            self.print_comparison(report, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+
+    def run(self, context, options, clients):
+        # Соединения нельзя делить между процессами после fork.
+        connections.close_all()
+        results = context.Queue()
+        workers = [
+            context.Process(
+                target=run_client, args=(options, seed, results)
+            )
+            for seed in range(clients)
+        ]
+        for process in workers:
+            process.start()
+        collected = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+        samples = defaultdict(list)
+        for result in collected:
+            for key, values in result.items():
+                samples[key].extend(values)
+        return samples
+
+    def make_report(self, samples, elapsed, options):
+        urls = []
+        for key, values in sorted(samples.items()):
+            times = [value[0] * 1000 for value in values]
+            statuses = defaultdict(int)
+            for value in values:
+                statuses[str(value[2])] += 1
+            urls.append({
+                'url': key,
+                'requests': len(values),
+                'p50_ms': percentile(times, 0.5),
+                'p95_ms': percentile(times, 0.95),
+                'p99_ms': percentile(times, 0.99),
+                'queries': sum(value[1] for value in values) / len(values),
+                'statuses': dict(statuses),
+            })
+        total = sum(url['requests'] for url in urls)
+        return {
+            'commit': git_commit(),
+            'time': timezone.now().isoformat(),
+            'clients': options['clients'],
+            'dataset': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'requests': total,
+            'seconds': elapsed,
+            'requests_per_second': total / elapsed if elapsed else 0,
+            'urls': urls,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{"url":40} {"n":>6} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"p99 ms":>8} {"sql":>5}  statuses'
+        )
+        for url in report['urls']:
+            statuses = ' '.join(
+                f'{status}×{count}'
+                for status, count in sorted(url['statuses'].items())
+            )
+            self.stdout.write(
+                f'{url["url"]:40} {url["requests"]:6d} '
+                f'{url["p50_ms"]:8.1f} {url["p95_ms"]:8.1f} '
+                f'{url["p99_ms"]:8.1f} {url["queries"]:5.1f}  {statuses}'
+            )
+        self.stdout.write(
+            f'Всего {report["requests"]} запросов, '
+            f'{report["requests_per_second"]:.0f} в секунду '
+            f'({report["clients"]} клиентов)'
+        )
+
+    def print_comparison(self, report, path):
+        with open(path, encoding='utf-8') as file:
+            previous = json.load(file)
+        before = {url['url']: url for url in previous['urls']}
+        self.stdout.write(
+            f'\nСравнение с {previous.get("commit") or path}: '
+            f'{previous["requests_per_second"]:.0f} → '
+            f'{report["requests_per_second"]:.0f} запросов в секунду'
+        )
+        for url in report['urls']:
+            old = before.get(url['url'])
+            if old is None:
+                continue
+            self.stdout.write(
+                f'{url["url"]:40} p50 {old["p50_ms"]:7.1f} → '
+                f'{url["p50_ms"]:7.1f}  p95 {old["p95_ms"]:7.1f} → '
+                f'{url["p95_ms"]:7.1f}  sql {old["queries"]:.1f} → '
+                f'{url["queries"]:.1f}'
+            )
@@ -0,0 +1,174 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from core.db.backends.sqlite3.base import immediate
+from core.db.group_commit import GroupCommitQueue
+
+ALIAS = 'bench_writes'
+POSTS = 10
+
+MODES = {
+    # Настройки по умолчанию: журнал отката, BEGIN DEFERRED.
+    'default': ('django.db.backends.sqlite3', False),
+    'tuned': ('core.db.backends.sqlite3', False),
+    'tuned+group': ('core.db.backends.sqlite3', True),
+}
+
+
+def create_schema(path):
+    with sqlite3.connect(path) as db:
+        db.execute(
+            'CREATE TABLE post (id INTEGER PRIMARY KEY, '
+            'comments_count INTEGER NOT NULL DEFAULT 0)'
+        )
+        db.execute(
+            'CREATE TABLE comment (id INTEGER PRIMARY KEY, '
+            'post_id INTEGER NOT NULL, text TEXT NOT NULL)'
+        )
+        db.executemany(
+            'INSERT INTO post (id) VALUES (?)',
+            [(pk,) for pk in range(1, POSTS + 1)],
+        )
+
+
+def add_comment(number):
+    """Та же работа, что у add_comment: проверка поста, вставка
+    комментария и обновление счётчика.
+    """
+    post_id = number % POSTS + 1
+    with connections[ALIAS].cursor() as cursor:
+        cursor.execute('SELECT id FROM post WHERE id = %s', [post_id])
+        cursor.fetchone()
+        cursor.execute(
+            'INSERT INTO comment (post_id, text) VALUES (%s, %s)',
+            [post_id, f'Комментарий {number}'],
+        )
+        cursor.execute(
+            'UPDATE post SET comments_count = comments_count + 1 '
+            'WHERE id = %s',
+            [post_id],
+        )
+
+
+def write_in_transaction(number):
+    with immediate(ALIAS), transaction.atomic(using=ALIAS):
+        add_comment(number)
+
+
+def run_process(mode, path, options, results):
+    engine, grouped = MODES[mode]
+    connections.databases[ALIAS] = {
+        'ENGINE': engine,
+        'NAME': path,
+        'CONN_MAX_AGE': None,
+    }
+    connections.ensure_defaults(ALIAS)
+    queue = GroupCommitQueue(ALIAS) if grouped else None
+    counts = {'writes': 0, 'locked': 0}
+    counts_lock = threading.Lock()
+
+    def worker(offset):
+        writes = locked = 0
+        for number in range(offset, offset + options['writes']):
+            try:
+                if queue is None:
+                    write_in_transaction(number)
+                else:
+                    queue.submit(add_comment, number)
+                writes += 1
+            except OperationalError:
+                locked += 1
+        connections[ALIAS].close()
+        with counts_lock:
+            counts['writes'] += writes
+            counts['locked'] += locked
+
+    threads = [
+        threading.Thread(target=worker, args=(index * options['writes'],))
+        for index in range(options['threads'])
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counts['batches'] = queue.batches if queue else counts['writes']
+    results.put(counts)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость конкурентной записи и число ошибок '
+        '«database is locked» для стандартного бэкенда SQLite, '
+        'настроенного бэкенда core.db и групповой фиксации.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, nargs='+', default=[1, 4]
+        )
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--writes', type=int, default=100,
+            help='Сколько комментариев пишет каждый поток.',
+        )
+        parser.add_argument(
+            '--output', help='Файл для сохранения результатов в JSON.'
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        report = []
+        for mode in MODES:
+            for processes in options['processes']:
+                with tempfile.TemporaryDirectory() as directory:
+                    path = os.path.join(directory, 'bench.sqlite3')
+                    create_schema(path)
+                    report.append(
+                        self.run(context, mode, path, processes, options)
+                    )
+        self.stdout.write(
+            f'{"mode":12} {"procs":>5} {"threads":>7} {"writes/s":>9} '
+            f'{"locked":>7} {"commits":>8}'
+        )
+        for row in report:
+            self.stdout.write(
+                f'{row["mode"]:12} {row["processes"]:5d} '
+                f'{row["threads"]:7d} {row["writes_per_second"]:9.0f} '
+                f'{row["locked"]:7d} {row["commits"]:8d}'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+
+    def run(self, context, mode, path, processes, options):
+        results = context.Queue()
+        workers = [
+            context.Process(
+                target=run_process, args=(mode, path, options, results)
+            )
+            for _ in range(processes)
+        ]
+        started = time.perf_counter()
+        for process in workers:
+            process.start()
+        collected = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - started
+        writes = sum(counts['writes'] for counts in collected)
+        return {
+            'mode': mode,
+            'processes': processes,
+            'threads': options['threads'],
+            'writes_per_second': writes / elapsed,
+            'locked': sum(counts['locked'] for counts in collected),
+            'commits': sum(counts['batches'] for counts in collected),
+        }
@@ -0,0 +1,53 @@
+import json
+import os
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.management.commands.bench_cache import percentile
+from core.profiling import SAMPLES_FILE
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка выборочного профилирования по представлениям: время '
+        'ответа, SQL и рендеринг шаблонов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--last', type=int, default=1000,
+            help='Сколько последних замеров учитывать.',
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.join(settings.PROFILE_DIR, SAMPLES_FILE)
+        if not os.path.exists(path):
+            self.stdout.write('Замеров пока нет')
+            return
+        with open(path, encoding='utf-8') as file:
+            lines = deque(file, maxlen=options['last'])
+        views = defaultdict(list)
+        for line in lines:
+            sample = json.loads(line)
+            views[sample['view']].append(sample)
+        self.stdout.write(
+            f'{"view":32} {"n":>5} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"sql":>6} {"sql ms":>8} {"tpl ms":>8}  slowest'
+        )
+        for view, samples in sorted(
+            views.items(),
+            key=lambda item: -sum(sample['ms'] for sample in item[1]),
+        ):
+            count = len(samples)
+            times = [sample['ms'] for sample in samples]
+            slowest = max(samples, key=lambda sample: sample['ms'])
+            self.stdout.write(
+                f'{view:32} {count:5d} {percentile(times, 0.5):8.1f} '
+                f'{percentile(times, 0.95):8.1f} '
+                f'{sum(s["sql_count"] for s in samples) / count:6.1f} '
+                f'{sum(s["sql_ms"] for s in samples) / count:8.1f} '
+                f'{sum(s["template_ms"] for s in samples) / count:8.1f}  '
+                f'{slowest["file"]}'
+            )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = (
+        'Выдаёт токен для заголовка X-Profile: запросы с ним '
+        'профилируются независимо от выборки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'label', help='Кто профилирует; сохраняется в замерах.'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token(options['label']))
@@ -0,0 +1,76 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.db.routers import SYNC_TABLE
+
+
+def sync_sqlite_replica(alias):
+    """Копирует основную базу SQLite в файл реплики и отмечает в копии
+    момент начала копирования.
+
+    Вызывается вне транзакции: копирование ждёт, пока исходное
+    соединение не зафиксирует открытую запись. Возвращает длительность
+    копирования в секундах.
+    """
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    started = time.time()
+    target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+    try:
+        # Копирование идёт по страницам внутри одного чтения: в копию
+        # попадает согласованный снимок не старше started.
+        source.connection.backup(target)
+        with target:
+            target.execute(
+                f'CREATE TABLE IF NOT EXISTS {SYNC_TABLE} '
+                f'(synced REAL NOT NULL)'
+            )
+            target.execute(f'DELETE FROM {SYNC_TABLE}')
+            target.execute(
+                f'INSERT INTO {SYNC_TABLE} (synced) VALUES (?)', (started,)
+            )
+    finally:
+        target.close()
+    return time.time() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет реплики SQLite из DATABASE_REPLICAS копией основной '
+        'базы. Реплики других СУБД обновляет сама СУБД.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять копирование через столько секунд.',
+        )
+        parser.add_argument(
+            'aliases', nargs='*',
+            help='Реплики для обновления, по умолчанию все.',
+        )
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('Основная база — не SQLite.')
+        aliases = options['aliases'] or settings.DATABASE_REPLICAS
+        aliases = [
+            alias for alias in aliases
+            if connections[alias].vendor == 'sqlite'
+        ]
+        if not aliases:
+            raise CommandError(
+                'Нет реплик SQLite: добавьте их в DATABASE_REPLICAS или '
+                'передайте именами.'
+            )
+        while True:
+            for alias in aliases:
+                seconds = sync_sqlite_replica(alias)
+                self.stdout.write(f'{alias}: скопировано за {seconds:.2f} с')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,262 @@
+"""Метрики приложения в текстовом формате Prometheus.
+
+Значения копятся в словаре своего потока без блокировок: в него пишет
+только этот поток, а значения — неизменяемые числа, поэтому снимок
+делается копированием словарей (``dict.copy`` атомарен под GIL).
+Словари завершившихся потоков переносятся в общий итог процесса, так
+что их число не растёт с каждым новым потоком.
+Запись метрики стоит несколько обращений к словарю, то есть доли
+микросекунды.
+
+Раз в ``METRICS_FLUSH_INTERVAL`` секунд (проверяется в конце запроса)
+процесс записывает свои итоги с момента запуска в собственный файл в
+``METRICS_DIR``. Страница ``/metrics/`` складывает файлы всех воркеров.
+Каталог, как и у multiprocess-режима prometheus_client, очищают при
+развёртывании.
+
+Гистограммы хранят счётчик для каждого интервала отдельно; нарастающие
+``_bucket`` считаются только при выводе.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core.profiling import QueryTimer
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+METRICS = {
+    'yatube_view_latency_seconds': (
+        'histogram', 'Время ответа представления.'
+    ),
+    'yatube_view_db_queries_total': (
+        'counter', 'Число SQL-запросов по представлениям.'
+    ),
+    'yatube_view_db_seconds_total': (
+        'counter', 'Время SQL-запросов по представлениям.'
+    ),
+    'yatube_page_cache_total': (
+        'counter', 'Страницы лент из кеша (hit) и собранные заново (miss).'
+    ),
+    'yatube_cache_requests_total': (
+        'counter', 'Чтения кеша по префиксу ключа.'
+    ),
+    'yatube_db_read_requests_total': (
+        'counter', 'Запросы к лентам по базе, из которой они читали.'
+    ),
+    'yatube_thumbnail_seconds': (
+        'histogram', 'Время создания миниатюр картинки.'
+    ),
+}
+
+
+class Registry:
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        # Имя файла уникально, даже если pid достанется новому воркеру.
+        self.file_name = f'{self.pid}-{uuid.uuid4().hex[:8]}.json'
+        self.last_flush = time.monotonic()
+        self._local = threading.local()
+        # Пары (поток, его словарь) и итог уже завершившихся потоков.
+        self._tables = []
+        self._finished = defaultdict(float)
+        self._tables_lock = threading.Lock()
+
+    def _table(self):
+        if self.pid != os.getpid():
+            # Дочерний процесс после fork начинает со своих нулей.
+            self._reset()
+        table = getattr(self._local, 'table', None)
+        if table is None:
+            table = self._local.table = {}
+            with self._tables_lock:
+                self._fold_finished()
+                self._tables.append((threading.current_thread(), table))
+        return table
+
+    def _fold_finished(self):
+        """Переносит словари завершившихся потоков в общий итог.
+
+        Вызывается под ``_tables_lock``; в словарь завершившегося потока
+        больше никто не пишет.
+        """
+        alive = []
+        for thread, table in self._tables:
+            if thread.is_alive():
+                alive.append((thread, table))
+                continue
+            for key, value in table.items():
+                self._finished[key] += value
+        self._tables = alive
+
+    def inc(self, name, labels=(), value=1.0):
+        table = self._table()
+        key = (name, labels, '')
+        table[key] = table.get(key, 0.0) + value
+
+    def observe(self, name, value, labels=()):
+        table = self._table()
+        index = bisect_left(LATENCY_BUCKETS, value)
+        le = '+Inf'
+        if index < len(LATENCY_BUCKETS):
+            le = str(LATENCY_BUCKETS[index])
+        for key, delta in (
+            ((name, labels, le), 1.0),
+            ((name, labels, 'sum'), value),
+        ):
+            table[key] = table.get(key, 0.0) + delta
+
+    def snapshot(self):
+        """Сумма значений всех потоков процесса."""
+        self._table()
+        with self._tables_lock:
+            self._fold_finished()
+            totals = self._finished.copy()
+            tables = [table.copy() for _, table in self._tables]
+        for table in tables:
+            for key, value in table.items():
+                totals[key] += value
+        return totals
+
+    def flush(self):
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        rows = [
+            [name, list(map(list, labels)), part, value]
+            for (name, labels, part), value in self.snapshot().items()
+        ]
+        path = os.path.join(directory, self.file_name)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(rows, file)
+        os.replace(path + '.tmp', path)
+        self.last_flush = time.monotonic()
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= (
+                settings.METRICS_FLUSH_INTERVAL):
+            self.flush()
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+
+
+# Метка prefix берётся только из этого набора, остальные ключи идут в
+# other: иначе ключ без двоеточия (у sorl-thumbnail разделитель «||»)
+# целиком становился бы значением метки.
+CACHE_PREFIXES = frozenset((
+    'api-card', 'comments-page', 'feed-page', 'feed-version', 'following',
+    'page', 'post-card', 'sorl-thumbnail', 'thumbnail-lock',
+))
+CACHE_KEY_SEPARATOR = re.compile(r':|\|\|')
+
+
+def cache_prefix(key):
+    prefix = CACHE_KEY_SEPARATOR.split(key, 1)[0]
+    return prefix if prefix in CACHE_PREFIXES else 'other'
+
+
+def collect():
+    """Складывает итоги всех воркеров из ``METRICS_DIR``."""
+    registry.flush()
+    totals = defaultdict(float)
+    directory = settings.METRICS_DIR
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as file:
+                rows = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for metric, labels, part, value in rows:
+            totals[metric, tuple(map(tuple, labels)), part] += value
+    return totals
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+def _labels(labels, *extra):
+    pairs = (*labels, *extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"'
+                          for key, value in pairs) + '}'
+
+
+def _value(value):
+    # Формат :g округлил бы большие счётчики до шести знаков.
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render(totals):
+    """Текст в формате Prometheus 0.0.4."""
+    series = defaultdict(dict)
+    for (name, labels, part), value in totals.items():
+        series[name].setdefault(labels, {})[part] = value
+    lines = []
+    for name in sorted(series):
+        kind, help_text = METRICS.get(name, ('untyped', ''))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, parts in sorted(series[name].items()):
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {_value(parts[""])}')
+                continue
+            count = 0.0
+            for bound in (*map(str, LATENCY_BUCKETS), '+Inf'):
+                count += parts.get(bound, 0.0)
+                lines.append(
+                    f'{name}_bucket{_labels(labels, ("le", bound))} '
+                    f'{_value(count)}'
+                )
+            lines.append(
+                f'{name}_sum{_labels(labels)} {_value(parts["sum"])}'
+            )
+            lines.append(f'{name}_count{_labels(labels)} {_value(count)}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Время ответа и SQL-запросы по имени представления."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryTimer()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(counter)
+                )
+            started = time.perf_counter()
+            response = self.get_response(request)
+            seconds = time.perf_counter() - started
+        match = request.resolver_match
+        labels = (('view', match.view_name if match else 'unresolved'),)
+        observe('yatube_view_latency_seconds', seconds, labels)
+        inc('yatube_view_db_queries_total', labels, counter.count)
+        inc('yatube_view_db_seconds_total', labels, counter.seconds)
+        registry.maybe_flush()
+        return response
@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class StoredFile(models.Model):
+    """Файл хранилища по содержимому и число ссылок на него."""
+
+    name = models.CharField('Имя файла', max_length=255, unique=True)
+    references = models.PositiveIntegerField('Число ссылок', default=0)
+    # Когда ссылки менялись: сборщик мусора не трогает файлы, на которые
+    # сослались после начала его обхода.
+    updated = models.DateTimeField('Изменён', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self) -> str:
+        return f'{self.name} ({self.references})'
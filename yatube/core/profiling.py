@@ -0,0 +1,178 @@
+"""Выборочное профилирование запросов в рабочем окружении.
+
+``ProfilingMiddleware`` профилирует cProfile каждый
+``PROFILE_SAMPLE_RATE``-й в среднем запрос, а также любой запрос с
+заголовком ``X-Profile``, в котором передан подписанный токен (его
+выдаёт команда ``profile_token``). Для таких запросов сохраняются:
+
+* файл pstats ``<время>-<представление>-<мс>.prof`` в ``PROFILE_DIR``;
+* строка в ``samples.jsonl``: имя представления, общее время, число и
+  время SQL-запросов, время рендеринга шаблонов.
+
+В каталоге хранится не больше ``PROFILE_KEEP`` файлов pstats, журнал
+замеров при разрастании переименовывается в ``samples.jsonl.1``.
+Сводку по представлениям выводит команда ``profile_summary``.
+
+Запрос без выборки стоит одного вызова ``random`` и проверки заголовка.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.template.base import Template
+from django.utils import timezone
+
+HEADER = 'HTTP_X_PROFILE'
+RESPONSE_HEADER = 'X-Profile'
+TOKEN_SALT = 'core.profiling'
+SAMPLES_FILE = 'samples.jsonl'
+# Размер журнала замеров, после которого он начинается заново.
+SAMPLES_MAX_BYTES = 10 * 1024 * 1024
+
+_TEMPLATE_RENDER = (
+    Template.render.__code__.co_filename,
+    Template.render.__code__.co_firstlineno,
+    Template.render.__code__.co_name,
+)
+
+
+def make_token(label):
+    """Токен для заголовка ``X-Profile``; ``label`` попадает в замер."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(label)
+
+
+def read_token(token):
+    """Метка из действующего токена или ``None``."""
+    try:
+        return signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=settings.PROFILE_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+
+
+class QueryTimer:
+    """Считает число и время SQL-запросов через ``execute_wrapper``."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def template_seconds(profile):
+    """Время рендеринга шаблонов по данным профилировщика.
+
+    cProfile не складывает время вложенных вызовов функции повторно,
+    поэтому для ``Template.render`` с включёнными шаблонами это время
+    самого внешнего рендеринга.
+    """
+    stats = pstats.Stats(profile).stats
+    entry = stats.get(_TEMPLATE_RENDER)
+    return entry[3] if entry else 0.0
+
+
+def _file_name(view_name, milliseconds):
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%S.%f')
+    view = re.sub(r'[^\w.-]+', '_', view_name)
+    return f'{stamp}-{view}-{milliseconds:.0f}ms.prof'
+
+
+def _rotate(directory):
+    """Оставляет ``PROFILE_KEEP`` последних файлов pstats."""
+    names = sorted(
+        name for name in os.listdir(directory) if name.endswith('.prof')
+    )
+    for name in names[:-settings.PROFILE_KEEP]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            # Удалил другой процесс.
+            pass
+    samples = os.path.join(directory, SAMPLES_FILE)
+    try:
+        if os.path.getsize(samples) > SAMPLES_MAX_BYTES:
+            os.replace(samples, samples + '.1')
+    except FileNotFoundError:
+        pass
+
+
+def save_sample(profile, sample):
+    directory = settings.PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = _file_name(sample['view'], sample['ms'])
+    profile.dump_stats(os.path.join(directory, name))
+    sample['file'] = name
+    # Строка дописывается одним write в режиме append, поэтому строки
+    # разных процессов не перемешиваются.
+    line = json.dumps(sample, ensure_ascii=False) + '\n'
+    with open(os.path.join(directory, SAMPLES_FILE), 'a',
+              encoding='utf-8') as file:
+        file.write(line)
+    _rotate(directory)
+    return name
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        label = None
+        token = request.META.get(HEADER)
+        if token:
+            label = read_token(token)
+        rate = settings.PROFILE_SAMPLE_RATE
+        if label is None and not (rate and random.randrange(rate) == 0):
+            return self.get_response(request)
+        return self.profile(request, label)
+
+    def profile(self, request, label):
+        profile = cProfile.Profile()
+        timer = QueryTimer()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            started = time.perf_counter()
+            try:
+                profile.enable()
+            except ValueError:
+                # В этом потоке уже работает другой профилировщик.
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+            seconds = time.perf_counter() - started
+        match = request.resolver_match
+        sample = {
+            'time': timezone.now().isoformat(),
+            'view': match.view_name if match else 'unresolved',
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'label': label,
+            'ms': seconds * 1000,
+            'sql_count': timer.count,
+            'sql_ms': timer.seconds * 1000,
+            'template_ms': template_seconds(profile) * 1000,
+        }
+        name = save_sample(profile, sample)
+        if label is not None:
+            response[RESPONSE_HEADER] = name
+        return response
@@ -0,0 +1,204 @@
+"""Хранилище файлов по содержимому.
+
+Файл сохраняется под именем из SHA-256 содержимого в каталогах по
+первым байтам хеша: ``posts/ab/cd/abcd…ef.jpg``. Одинаковые загрузки
+занимают на диске одну копию, а содержимое файла под таким именем
+никогда не меняется, поэтому его можно кешировать навсегда (см.
+``core.views.media`` и ``IMMUTABLE_CACHE_CONTROL``). Для nginx::
+
+    location ~ ^/media/.+/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64} {
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
+Сколько объектов ссылается на файл, хранит таблица ``StoredFile``.
+``save`` только записывает файл: строка со счётчиком 0 означает
+загрузку, которую ещё не сохранили в объекте. Ссылку добавляет
+``retain`` в транзакции, сохраняющей объект (для постов — сигнал
+``post_save``), поэтому откат сохранения откатывает и её. Если объект
+так и не сохранили, файл удалит сборщик мусора. ``release`` снимает
+ссылку, и файл удаляется вместе с производными, когда ссылок не
+остаётся. Если файл загружали в последние ``MEDIA_GC_MIN_AGE``
+секунд, последняя ссылка снимается без удаления: загрузка могла ещё не
+сохранить свой объект, и такой файл проверит сборщик мусора.
+Производные файлы (варианты картинок) лежат рядом с исходным, их имена
+начинаются с его хеша и сохраняются как есть, без подсчёта ссылок.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+from core.models import StoredFile
+
+# Имя в раскладке по хешу: исходный файл — хеш и расширение,
+# производный — хеш, суффикс и расширение.
+ADDRESSED = re.compile(
+    r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})'
+    r'(?P<suffix>[^/.]*)(?:\.[^/]*)?$'
+)
+IMMUTABLE_CACHE_CONTROL = {
+    'public': True,
+    'max_age': 365 * 24 * 60 * 60,
+    'immutable': True,
+}
+
+
+def is_addressed(name):
+    """Имя лежит в раскладке по хешу: содержимое под ним не меняется."""
+    return ADDRESSED.search(name) is not None
+
+
+def is_original(name):
+    match = ADDRESSED.search(name)
+    return match is not None and not match.group('suffix')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        if content.seekable():
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if is_addressed(name) and not is_original(name):
+            # Производный файл: его имя уже выведено из хеша исходного.
+            self._write(name, content)
+            return name
+        return self.add(name, content, references=0)
+
+    def add(self, name, content, references=1):
+        """Сохраняет файл под именем по содержимому, если такого ещё
+        нет, и добавляет ему ``references`` ссылок (при 0 — только
+        отмечает время загрузки для сборщика мусора). Возвращает имя.
+        """
+        name = self.hashed_name(name, content)
+        # Ссылка и файл появляются под блокировкой строки, поэтому
+        # параллельный release не удалит файл между проверкой и записью.
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            self.retain(name, references)
+            if not self.exists(name):
+                self._write(name, content)
+        return name
+
+    def retain(self, name, references=1):
+        if self._add_references(name, references):
+            return
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                StoredFile.objects.create(name=name, references=references)
+        except IntegrityError:
+            # Строку только что создал другой процесс.
+            self._add_references(name, references)
+
+    def _add_references(self, name, references):
+        return StoredFile.objects.filter(name=name).update(
+            references=F('references') + references,
+            updated=timezone.now(),
+        )
+
+    def release(self, name):
+        """Снимает ссылку на файл; последняя удаляет файл с производными.
+
+        Возвращает ``True``, если файл удалён. Файлы вне раскладки по
+        хешу и без учёта ссылок не трогаются.
+        """
+        if not is_original(name):
+            return False
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            updated = StoredFile.objects.filter(
+                name=name, references__gt=0
+            ).update(references=F('references') - 1)
+            if not updated:
+                return False
+            # Свежую строку оставляем сборщику мусора: её могла тронуть
+            # загрузка того же файла, чей объект ещё не сохранён.
+            fresh_since = timezone.now() - timedelta(
+                seconds=settings.MEDIA_GC_MIN_AGE
+            )
+            deleted, _ = StoredFile.objects.filter(
+                name=name, references=0, updated__lt=fresh_since
+            ).delete()
+            if deleted:
+                for path in self.family(name):
+                    self.delete(path)
+        return bool(deleted)
+
+    def discard(self, name, unused_since):
+        """Удаляет файл по хешу вместе с исходным и производными, если
+        ссылки на исходный не менялись с ``unused_since``, — даже если
+        счётчик их не обнулил. Для сборщика мусора, который уже
+        проверил, что на файл не ссылается ни один объект.
+        """
+        digest = ADDRESSED.search(name).group('digest')
+        prefix = posixpath.join(posixpath.dirname(name), digest)
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            # Строки исходного файла с любым расширением, в том числе
+            # только что созданные параллельной загрузкой.
+            rows = StoredFile.objects.select_for_update().filter(
+                name__startswith=prefix
+            )
+            if rows.filter(updated__gte=unused_since).exists():
+                return False
+            rows.delete()
+            for path in self.family(name):
+                self.delete(path)
+        return True
+
+    def family(self, name):
+        """Исходный файл и его производные, которые есть в хранилище."""
+        directory = posixpath.dirname(name)
+        digest = ADDRESSED.search(name).group('digest')
+        if not self.exists(directory):
+            return []
+        _, files = self.listdir(directory)
+        return [
+            posixpath.join(directory, file_name)
+            for file_name in files
+            if file_name.startswith(digest)
+        ]
+
+    def _write(self, name, content):
+        # Файл пишется рядом и переименовывается: читатели не увидят
+        # его недописанным, а одинаковое содержимое можно записать
+        # поверх без вреда.
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                if content.seekable():
+                    content.seek(0)
+                for chunk in content.chunks():
+                    file.write(chunk)
+            # mkstemp создаёт файл с правами 0600, веб-сервер его бы не
+            # прочитал.
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
@@ -0,0 +1,44 @@
+"""Окружение для тестов проекта.
+
+Тесты не должны читать и чистить кеш разработчика, поэтому на время
+прогона кеш по умолчанию переносится в файл во временном каталоге.
+Для ``manage.py test`` это делает ``TestRunner``, для pytest — фикстура
+в ``conftest.py`` в корне репозитория.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+@contextmanager
+def isolated_cache():
+    """Кеш по умолчанию в собственном файле, удаляемом после блока."""
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    caches = {
+        **settings.CACHES,
+        'default': {
+            **settings.CACHES['default'],
+            'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+        },
+    }
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._isolated_cache = isolated_cache()
+        self._isolated_cache.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._isolated_cache.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
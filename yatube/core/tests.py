@@ -0,0 +1,671 @@
+import json
+import os
+import pstats
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from concurrent.futures import Future
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+
+from core import metrics, profiling, views
+from core.bloom import BloomFilter
+from core.cache import SQLiteCache
+from core.db import routers
+from core.db.group_commit import GroupCommitQueue
+from core.models import StoredFile
+from core.storage import ContentAddressedStorage, is_addressed
+from posts.models import Comment, Post
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(
+            os.path.join(self.directory, 'cache.sqlite3'),
+            {'OPTIONS': options},
+        )
+
+    def test_tests_do_not_use_developer_cache(self):
+        """Прогон тестов пишет в свой файл кеша, а не в каталог проекта."""
+        location = settings.CACHES['default']['LOCATION']
+        self.assertFalse(location.startswith(settings.BASE_DIR))
+
+    def test_basic_operations(self):
+        """Бэкенд поддерживает стандартный API кеша."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 'value'))
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(
+            self.cache.get_many(['key', 'new', 'missing']),
+            {'key': {'value': 1}, 'new': 'value'}
+        )
+        self.cache.delete_many(['key', 'new'])
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_entries_are_shared_between_instances(self):
+        """Запись одного экземпляра (воркера) видна другому."""
+        self.cache.set('shared', 'page', None)
+        self.assertEqual(self.make_cache().get('shared'), 'page')
+
+    def test_expired_entries_are_not_returned(self):
+        self.cache.set('short', 'value', 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertFalse(self.cache.has_key('short'))
+
+    def test_get_or_compute_is_single_flight(self):
+        """Одновременные промахи вычисляют значение один раз."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'page'
+
+        results = []
+
+        def worker():
+            cache = self.make_cache()
+            results.append(cache.get_or_compute('page', compute, 60))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['page'] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_stale_value_served_while_revalidating(self):
+        """Пока значение пересчитывается, отдаётся устаревшее."""
+        cache = self.make_cache(STALE_TIMEOUT=60, EARLY_EXPIRY_BETA=0)
+        cache.get_or_compute('page', lambda: 'old', 0.05)
+        time.sleep(0.1)
+        key = cache.make_key('page')
+        self.assertTrue(cache._acquire(key))
+        self.assertEqual(
+            cache.get_or_compute('page', lambda: 'new', 60), 'old'
+        )
+        cache._release(key)
+        self.assertEqual(
+            cache.get_or_compute('page', lambda: 'new', 60), 'new'
+        )
+
+    def test_uncacheable_values_are_not_stored(self):
+        self.cache.get_or_compute(
+            'page', lambda: 'error', 60, cacheable=lambda value: False
+        )
+        self.assertIsNone(self.cache.get('page'))
+
+
+class SQLiteBackendTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_set_on_connect(self):
+        """При подключении выставляются прагмы настроенного бэкенда."""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('foreign_keys'), 1)
+
+
+class GroupCommitTests(TransactionTestCase):
+    def setUp(self):
+        self.queue = GroupCommitQueue()
+
+    def enqueue(self, func, **kwargs):
+        # Так запись ставит в очередь другой поток, пока лидер занят.
+        future = Future()
+        self.queue._pending.append((future, func, (), kwargs))
+        return future
+
+    def test_pending_writes_commit_together(self):
+        """Накопленные записи фиксируются одной транзакцией."""
+        futures = [
+            self.enqueue(Group.objects.create, name=f'group-{number}')
+            for number in range(3)
+        ]
+        group = self.queue.submit(Group.objects.create, name='last')
+
+        self.assertEqual(self.queue.batches, 1)
+        self.assertEqual(group.name, 'last')
+        self.assertEqual(
+            [future.result().name for future in futures],
+            ['group-0', 'group-1', 'group-2']
+        )
+        self.assertEqual(Group.objects.count(), 4)
+
+    def test_failed_write_does_not_roll_back_others(self):
+        """Ошибка одной записи достаётся только её автору."""
+        Group.objects.create(name='taken')
+        duplicate = self.enqueue(Group.objects.create, name='taken')
+        group = self.queue.submit(Group.objects.create, name='free')
+
+        self.assertEqual(group.name, 'free')
+        with self.assertRaises(IntegrityError):
+            duplicate.result()
+        self.assertEqual(
+            set(Group.objects.values_list('name', flat=True)),
+            {'taken', 'free'}
+        )
+
+    def test_missing_reference_fails_only_its_write(self):
+        """Ссылка на несуществующий пост проваливает только свою запись:
+        SQLite проверил бы её лишь при фиксации всей пачки.
+        """
+        author = get_user_model().objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Пост')
+        orphan = Comment(post_id=99999, author=author, text='Мимо')
+        missing = self.enqueue(orphan.save)
+        comment = Comment(post=post, author=author, text='Комментарий')
+        self.queue.submit(comment.save)
+
+        with self.assertRaises(IntegrityError):
+            missing.result()
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['Комментарий']
+        )
+
+    def test_failed_commit_is_retried_one_by_one(self):
+        """Если не удалась фиксация пачки, записи повторяются по одной,
+        и ошибку получает только виновная.
+        """
+        author = get_user_model().objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Пост')
+        # bulk_create не проверяется заранее: ошибка будет при фиксации.
+        missing = self.enqueue(
+            Comment.objects.bulk_create,
+            objs=[Comment(post_id=99999, author=author, text='Мимо')],
+        )
+        group = self.queue.submit(Group.objects.create, name='group')
+
+        self.assertEqual(group.name, 'group')
+        with self.assertRaises(IntegrityError):
+            missing.result()
+        self.assertTrue(Group.objects.filter(name='group').exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(post.comments.count(), 0)
+
+    def test_hook_error_does_not_fail_saved_write(self):
+        """Ошибка колбэка после фиксации не превращает сохранённую
+        запись в ошибку.
+        """
+        def create():
+            transaction.on_commit(lambda: 1 / 0)
+            return Group.objects.create(name='group')
+
+        with self.assertLogs('core.db.group_commit', 'ERROR'):
+            group = self.queue.submit(create)
+        self.assertEqual(group.name, 'group')
+        self.assertTrue(Group.objects.filter(name='group').exists())
+
+    def test_only_group_commit_takes_write_lock(self):
+        """BEGIN IMMEDIATE выдаёт только общая транзакция групповой
+        фиксации, а не любая транзакция.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                Group.objects.exists()
+            self.queue.submit(Group.objects.create, name='group')
+        self.assertEqual(
+            [
+                query['sql'] for query in queries
+                if query['sql'].startswith('BEGIN')
+            ],
+            ['BEGIN', 'BEGIN IMMEDIATE']
+        )
+
+    def test_runs_inline_inside_transaction(self):
+        """Внутри транзакции вызывающего запись выполняется сразу."""
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Group.objects.create(name='taken')
+                self.queue.submit(Group.objects.create, name='taken')
+        self.assertEqual(self.queue.batches, 0)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            PROFILE_DIR=self.directory, PROFILE_SAMPLE_RATE=0
+        )
+        self.settings_override.enable()
+        # Иначе лента может прийти из кеша без запросов к базе.
+        cache.clear()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def samples(self):
+        path = os.path.join(self.directory, profiling.SAMPLES_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_not_sampled_request_is_not_profiled(self):
+        response = self.client.get('/')
+        self.assertNotIn(profiling.RESPONSE_HEADER, response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_sampled_request_is_dumped(self):
+        """Замер содержит время SQL и шаблонов, pstats читается."""
+        with self.settings(PROFILE_SAMPLE_RATE=1):
+            self.client.get('/')
+        sample, = self.samples()
+        self.assertEqual(sample['view'], 'posts:index')
+        self.assertEqual(sample['status'], 200)
+        self.assertGreater(sample['sql_count'], 0)
+        self.assertGreater(sample['template_ms'], 0)
+        self.assertLessEqual(sample['template_ms'], sample['ms'])
+        stats = pstats.Stats(os.path.join(self.directory, sample['file']))
+        self.assertGreater(stats.total_calls, 0)
+
+    def test_signed_header_forces_profiling(self):
+        token = profiling.make_token('admin')
+        response = self.client.get('/', HTTP_X_PROFILE=token)
+        sample, = self.samples()
+        self.assertEqual(response[profiling.RESPONSE_HEADER], sample['file'])
+        self.assertEqual(sample['label'], 'admin')
+
+        response = self.client.get('/', HTTP_X_PROFILE=token + 'x')
+        self.assertNotIn(profiling.RESPONSE_HEADER, response)
+        self.assertEqual(len(self.samples()), 1)
+
+    def test_old_dumps_are_removed(self):
+        with self.settings(PROFILE_SAMPLE_RATE=1, PROFILE_KEEP=2):
+            for _ in range(4):
+                self.client.get('/')
+        dumps = [
+            name for name in os.listdir(self.directory)
+            if name.endswith('.prof')
+        ]
+        self.assertEqual(len(dumps), 2)
+        self.assertEqual(len(self.samples()), 4)
+
+    def test_summary_command(self):
+        with self.settings(PROFILE_SAMPLE_RATE=1):
+            self.client.get('/')
+            self.client.get('/about/author/')
+        stdout = StringIO()
+        call_command('profile_summary', stdout=stdout)
+        self.assertIn('posts:index', stdout.getvalue())
+        self.assertIn('about:author', stdout.getvalue())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            METRICS_DIR=self.directory, METRICS_TOKEN='secret'
+        )
+        self.settings_override.enable()
+        cache.clear()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def scrape(self):
+        response = self.client.get(
+            '/metrics/', HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_histogram_is_cumulative(self):
+        registry = metrics.Registry()
+        for value in (0.003, 0.02, 0.02, 30):
+            registry.observe('yatube_thumbnail_seconds', value)
+        text = metrics.render(registry.snapshot())
+        self.assertIn('yatube_thumbnail_seconds_bucket{le="0.005"} 1', text)
+        self.assertIn('yatube_thumbnail_seconds_bucket{le="0.025"} 3', text)
+        self.assertIn('yatube_thumbnail_seconds_bucket{le="10"} 3', text)
+        self.assertIn('yatube_thumbnail_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn('yatube_thumbnail_seconds_count 4', text)
+        self.assertIn('# TYPE yatube_thumbnail_seconds histogram', text)
+
+    def test_threads_accumulate_separately(self):
+        """Каждый поток пишет в свой словарь, снимок их складывает."""
+        registry = metrics.Registry()
+        labels = (('view', 'x'),)
+
+        def work():
+            for _ in range(1000):
+                registry.inc('yatube_view_db_queries_total', labels)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        key = ('yatube_view_db_queries_total', labels, '')
+        self.assertEqual(registry.snapshot()[key], 4000)
+
+    def test_finished_threads_are_folded(self):
+        """Словари завершившихся потоков не копятся, их значения
+        остаются в итоге.
+        """
+        registry = metrics.Registry()
+        for _ in range(5):
+            thread = threading.Thread(
+                target=registry.inc, args=('yatube_view_db_queries_total',)
+            )
+            thread.start()
+            thread.join()
+        key = ('yatube_view_db_queries_total', (), '')
+        self.assertEqual(registry.snapshot()[key], 5)
+        # Остаётся только словарь текущего потока.
+        self.assertEqual(len(registry._tables), 1)
+
+    def test_workers_are_summed(self):
+        """Итоги других воркеров берутся из их файлов."""
+        hit = ('yatube_page_cache_total',
+               (('view', 'posts:index'), ('result', 'hit')), '')
+        miss = (hit[0], (('view', 'posts:index'), ('result', 'miss')), '')
+        # Счётчики этого процесса копятся с начала прогона тестов.
+        before = metrics.collect()
+        other = metrics.Registry()
+        other.inc(*hit[:2], 5)
+        other.flush()
+        self.client.get('/')
+        self.client.get('/')
+        after = metrics.collect()
+        self.assertEqual(after[hit] - before[hit], 6)
+        self.assertEqual(after[miss] - before[miss], 1)
+        text = self.scrape()
+        for line in (
+            'yatube_page_cache_total{view="posts:index",result="hit"}',
+            'yatube_view_latency_seconds_count{view="posts:index"}',
+            'yatube_view_db_queries_total{view="posts:index"}',
+            'yatube_cache_requests_total{prefix="feed-version",'
+            'result="hit"}',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, text)
+
+    def test_cache_prefix_labels_are_bounded(self):
+        """Ключи без двоеточия и неизвестные префиксы не порождают
+        новых значений метки.
+        """
+        for key, prefix in (
+            ('post-card:1:1700000000.0', 'post-card'),
+            ('feed-version:group:cats', 'feed-version'),
+            ('sorl-thumbnail||image||0cc175b9c0f1b6a831c399e269772661',
+             'sorl-thumbnail'),
+            ('sorl-thumbnail||thumbnails||0cc175b9c0f1b6a8', 'sorl-thumbnail'),
+            ('0cc175b9c0f1b6a831c399e269772661', 'other'),
+            ('session:abc', 'other'),
+        ):
+            with self.subTest(key=key):
+                self.assertEqual(metrics.cache_prefix(key), prefix)
+
+    def test_metrics_are_protected(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        response = self.client.get(
+            '/metrics/', HTTP_AUTHORIZATION='Bearer wrong'
+        )
+        self.assertEqual(response.status_code, 403)
+        staff = get_user_model().objects.create_user(
+            username='staff', is_staff=True
+        )
+        self.client.force_login(staff)
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica'], REPLICA_MAX_LAG=5, REPLICA_CHECK_INTERVAL=0
+)
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        routers._positions.clear()
+        self.factory = RequestFactory()
+        self.position = time.time()
+        patcher = mock.patch(
+            'core.db.routers.replica_position',
+            side_effect=lambda alias: self.position,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def route(self, path, method='get', **cookies):
+        """Прогоняет запрос через middleware и возвращает базу, из
+        которой представление читало бы посты, и ответ.
+        """
+        request = getattr(self.factory, method)(path)
+        request.COOKIES.update(cookies)
+        request.resolver_match = resolve(path)
+        used = []
+
+        def view(request):
+            used.append(Post.objects.all().db)
+            return HttpResponse()
+
+        middleware = routers.ReplicaMiddleware(view)
+        middleware.process_view(request, view, (), {})
+        response = middleware(request)
+        self.assertIsNone(routers.current())
+        return used[0], response
+
+    def test_feed_reads_go_to_replica(self):
+        for path in ('/', '/group/slug/', '/profile/name/', '/posts/1/'):
+            with self.subTest(path=path):
+                self.assertEqual(self.route(path)[0], 'replica')
+        self.assertEqual(self.route('/follow/')[0], 'default')
+        self.assertEqual(self.route('/', method='post')[0], 'default')
+
+    def test_admin_changelist_reads_go_to_replica(self):
+        self.assertEqual(self.route('/admin/posts/post/')[0], 'replica')
+        self.assertEqual(self.route('/admin/posts/post/1/change/')[0],
+                         'default')
+
+    def test_lagging_or_unavailable_replica_is_skipped(self):
+        self.position = time.time() - 10
+        self.assertEqual(self.route('/')[0], 'default')
+        routers._positions.clear()
+        self.position = None
+        self.assertEqual(self.route('/')[0], 'default')
+
+    def test_writer_reads_own_writes(self):
+        _, response = self.route('/create/', method='post')
+        since = response.cookies[routers.PIN_COOKIE].value
+        _, response = self.route('/profile/name/follow/')
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertNotIn(routers.PIN_COOKIE, self.route('/')[1].cookies)
+
+        routers._positions.clear()
+        self.position = float(since) - 1
+        pinned = {routers.PIN_COOKIE: since}
+        self.assertEqual(self.route('/', **pinned)[0], 'default')
+        routers._positions.clear()
+        self.position = float(since) + 1
+        self.assertEqual(self.route('/', **pinned)[0], 'replica')
+
+    def test_writes_and_migrations_use_primary(self):
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertIs(router.allow_migrate('replica', 'posts'), False)
+        self.assertIsNone(router.allow_migrate('default', 'posts'))
+
+    def test_fresh_since_falls_back_to_primary(self):
+        routers._state.alias = 'replica'
+        try:
+            with routers.fresh_since(self.position - 1):
+                self.assertEqual(Post.objects.all().db, 'replica')
+            with routers.fresh_since(self.position + 1):
+                self.assertEqual(Post.objects.all().db, 'default')
+            self.assertEqual(routers.current(), 'replica')
+        finally:
+            routers._state.alias = None
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaSyncTests(TransactionTestCase):
+    # Копия снимается вне транзакции: резервное копирование SQLite ждёт
+    # фиксации открытой записи в исходном соединении.
+
+    def test_sync_replicas_copies_database(self):
+        get_user_model().objects.create_user(username='copied')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'replica.sqlite3')
+        with mock.patch.dict(
+            connections['replica'].settings_dict, NAME=path
+        ):
+            started = time.time()
+            call_command('sync_replicas', stdout=StringIO())
+        with sqlite3.connect(path) as copy:
+            synced, = copy.execute(
+                f'SELECT synced FROM {routers.SYNC_TABLE}'
+            ).fetchone()
+            users = copy.execute(
+                'SELECT username FROM auth_user'
+            ).fetchall()
+        self.assertGreaterEqual(synced, started)
+        self.assertIn(('copied',), users)
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, error=0.01)
+        names = [f'posts/{index}.jpg' for index in range(1000)]
+        for name in names:
+            bloom.add(name)
+        self.assertTrue(all(name in bloom for name in names))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, error=0.01)
+        for index in range(1000):
+            bloom.add(f'posts/{index}.jpg')
+        false_positives = sum(
+            f'cache/{index}.jpg' in bloom for index in range(10000)
+        )
+        self.assertLess(false_positives, 300)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.directory)
+
+    def references(self, name):
+        return StoredFile.objects.get(name=name).references
+
+    def test_name_is_content_hash(self):
+        name = self.storage.save('posts/cat.JPG', ContentFile(b'cat'))
+        digest = (
+            '77af778b51abd4a3c51c5ddd97204a9c'
+            '3ae614ebccb75a606c3b6865aed6744e'
+        )
+        self.assertEqual(name, f'posts/77/af/{digest}.jpg')
+        self.assertTrue(is_addressed(name))
+        self.assertEqual(self.storage.open(name).read(), b'cat')
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save('posts/a.jpg', ContentFile(b'meme'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'meme'))
+        self.assertEqual(first, second)
+        # Ссылки добавляет тот, кто сохраняет объект с файлом.
+        self.assertEqual(self.references(first), 0)
+        self.storage.retain(first, 2)
+        self.assertEqual(self.references(first), 2)
+        directory = os.path.dirname(self.storage.path(first))
+        self.assertEqual(os.listdir(directory), [os.path.basename(first)])
+
+    @override_settings(MEDIA_GC_MIN_AGE=0)
+    def test_last_release_deletes_file_and_derived(self):
+        name = self.storage.save('posts/a.jpg', ContentFile(b'meme'))
+        self.storage.retain(name, 2)
+        derived = name.replace('.jpg', '-480w.webp')
+        self.assertEqual(
+            self.storage.save(derived, ContentFile(b'small')), derived
+        )
+        self.assertFalse(self.storage.release(name))
+        self.assertTrue(self.storage.exists(name))
+        self.assertTrue(self.storage.release(name))
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(self.storage.exists(derived))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertFalse(self.storage.release(name))
+
+    def test_last_release_leaves_recent_upload_to_collector(self):
+        name = self.storage.save('posts/a.jpg', ContentFile(b'meme'))
+        self.storage.retain(name)
+        self.assertFalse(self.storage.release(name))
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.references(name), 0)
+        self.assertTrue(
+            self.storage.discard(name, timezone.now() + timedelta(1))
+        )
+        self.assertFalse(self.storage.exists(name))
+
+    def test_discard_keeps_recently_referenced_files(self):
+        name = self.storage.save('posts/a.jpg', ContentFile(b'meme'))
+        derived = name.replace('.jpg', '-480w.webp')
+        self.storage.save(derived, ContentFile(b'small'))
+        self.assertFalse(
+            self.storage.discard(derived, timezone.now() - timedelta(1))
+        )
+        self.assertTrue(self.storage.exists(name))
+        self.assertTrue(
+            self.storage.discard(derived, timezone.now() + timedelta(1))
+        )
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(self.storage.exists(derived))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_release_ignores_unaddressed_files(self):
+        with open(os.path.join(self.directory, 'old.jpg'), 'wb') as file:
+            file.write(b'old')
+        self.assertFalse(self.storage.release('old.jpg'))
+        self.assertTrue(self.storage.exists('old.jpg'))
+
+    def test_media_view_marks_addressed_files_immutable(self):
+        name = self.storage.save('posts/a.jpg', ContentFile(b'meme'))
+        with open(os.path.join(self.directory, 'old.jpg'), 'wb') as file:
+            file.write(b'old')
+        request = RequestFactory().get('/media/')
+        with override_settings(MEDIA_ROOT=self.directory):
+            addressed = views.media(request, name)
+            plain = views.media(request, 'old.jpg')
+        self.assertIn('immutable', addressed['Cache-Control'])
+        self.assertIn('max-age=31536000', addressed['Cache-Control'])
+        self.assertNotIn('Cache-Control', plain)
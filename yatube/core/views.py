@@ -1,4 +1,12 @@
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.views import static
+
+from core import metrics as app_metrics
+from core.storage import IMMUTABLE_CACHE_CONTROL, is_addressed
 
 
 def page_not_found(request, exception):
@@ -17,3 +25,35 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def media(request, path):
+    """Файлы MEDIA_ROOT при отладке; в бою их отдаёт nginx с теми же
+    заголовками (см. core/storage.py).
+    """
+    response = static.serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_addressed(path):
+        patch_cache_control(response, **IMMUTABLE_CACHE_CONTROL)
+    return response
+
+
+def _can_read_metrics(request):
+    if request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and constant_time_compare(header, f'Bearer {token}')
+
+
+def metrics(request):
+    """Метрики всех воркеров для Prometheus.
+
+    Доступны сотрудникам и сборщику с токеном ``METRICS_TOKEN`` в
+    заголовке ``Authorization: Bearer``.
+    """
+    if not _can_read_metrics(request):
+        return permission_denied(request, None)
+    return HttpResponse(
+        app_metrics.render(app_metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,9 +1,138 @@
+from django import forms
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
 
+from .forms import PostImageField, PostImageFormMixin
 from .models import Comment, Follow, Group, Post
+from .search import filter_queryset
 
+# До такого числа строк считаем точно: это дёшево.
+EXACT_COUNT_LIMIT = 10000
 
-class PostAdmin(admin.ModelAdmin):
+
+def estimate_table_rows(model, using):
+    """Оценка числа строк таблицы по статистике СУБД или ``None``.
+
+    На SQLite статистику собирает ``ANALYZE`` (или ``PRAGMA
+    optimize``), на PostgreSQL — autovacuum.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'sqlite':
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # Статистика ещё не собиралась.
+        return None
+    if row is None:
+        return None
+    return int(str(row[0]).split()[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки без полного ``COUNT(*)`` на больших таблицах.
+
+    Для всей таблицы число строк берётся из статистики СУБД, а для
+    отфильтрованной выборки считается не дальше ``EXACT_COUNT_LIMIT``
+    строк: дальних страниц таких выборок всё равно никто не листает.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+                return estimate
+        return queryset.order_by()[:EXACT_COUNT_LIMIT].count()
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка всех возможных значений."""
+
+    template = 'admin/input_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        # Непустой список нужен, чтобы фильтр выводился.
+        return ((None, None),)
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        return queryset.filter(**{self.lookup: value.strip()})
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = [
+            (key, value)
+            for key, value in changelist.get_filters_params().items()
+            if key != self.parameter_name
+        ]
+        yield all_choice
+
+
+class AuthorFilter(InputFilter):
+    title = 'автору'
+    parameter_name = 'author'
+    lookup = 'author__username'
+
+
+class UserFilter(InputFilter):
+    title = 'подписчику'
+    parameter_name = 'user'
+    lookup = 'user__username'
+
+
+class PostFilter(InputFilter):
+    title = 'номеру поста'
+    parameter_name = 'post'
+    lookup = 'post_id'
+
+    def queryset(self, request, queryset):
+        if self.value() and not self.value().strip().isdigit():
+            return queryset.none()
+        return super().queryset(request, queryset)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Общие настройки списков больших таблиц."""
+
+    paginator = EstimatedCountPaginator
+    # Иначе при фильтрации считается ещё и вся таблица.
+    show_full_result_count = False
+
+
+class FullTextSearchMixin:
+    """Поиск в админке по полнотекстовому индексу вместо LIKE."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return filter_queryset(queryset, search_term), False
+
+
+class PostAdminForm(PostImageFormMixin, forms.ModelForm):
+    """Картинки из админки обрабатываются так же, как из формы поста."""
+
+    class Meta:
+        model = Post
+        fields = '__all__'
+        field_classes = {'image': PostImageField}
+
+
+class PostAdmin(FullTextSearchMixin, LargeTableAdmin):
+    form = PostAdminForm
     list_display = (
         'pk',
         'text',
@@ -11,9 +140,12 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = ('pub_date', AuthorFilter)
     list_editable = ('group',)
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
     empty_value_display = '-пусто-'
 
 
@@ -24,11 +156,11 @@ class GroupAdmin(admin.ModelAdmin):
         'description',
         'slug'
     )
-    search_fields = 'description',
-    empty_value_key = '-пусто-'
+    search_fields = ('title', 'slug', 'description')
+    empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, LargeTableAdmin):
     list_display = (
         'pk',
         'post',
@@ -36,26 +168,31 @@ class CommentAdmin(admin.ModelAdmin):
         'text',
         'created',
     )
+    list_select_related = ('post', 'author')
     search_fields = ('text',)
-    list_filter = ('post', 'author', 'created')
+    list_filter = (PostFilter, AuthorFilter, 'created')
     list_editable = ('text',)
+    raw_id_fields = ('post', 'author')
     empty_value_display = '-пусто-'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'author',
     )
+    list_select_related = ('user', 'author')
+    # Точное совпадение имени ищется по уникальному индексу username.
     search_fields = (
-        'user',
-        'author',
+        '=user__username',
+        '=author__username',
     )
     list_filter = (
-        'user',
-        'author',
+        UserFilter,
+        AuthorFilter,
     )
-    empty_value_filter = '-пусто-'
+    raw_id_fields = ('user', 'author')
+    empty_value_display = '-пусто-'
 
 
 # Регистрируем кастомизированные модели в админке
@@ -0,0 +1,343 @@
+"""JSON API лент для мобильного клиента.
+
+Представления повторяют ленты из ``posts.views``: те же выборки,
+курсоры и области кеша. Поэтому ответы анонимным пользователям
+кешируются и устаревают по тем же правилам, что и HTML-страницы, и так
+же отвечают 304 на условные запросы.
+
+Параметр ``fields`` (через запятую) оставляет в карточках постов только
+перечисленные поля.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                set_response_etag)
+
+from . import caching, follows, images, thumbnails
+from .caching import cache_feed, conditional, feed_validators
+from .counters import get_user_counters
+from .models import Group, Post, TimelineEntry, User
+from .utils import comments_pagination, pagination
+from .views import get_post, post_page_validators
+
+CARD_FIELDS = (
+    'id',
+    'text',
+    'pub_date',
+    'updated',
+    'author',
+    'group',
+    'image',
+    'thumbnails',
+    'variants',
+)
+
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def error(status, detail):
+    return JsonResponse(
+        {'detail': detail}, status=status, json_dumps_params=JSON_PARAMS
+    )
+
+
+def api_view(view):
+    """Ответ представления — словарь, ошибки — JSON с полем detail."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            data = view(request, *args, **kwargs)
+        except BadRequest as exception:
+            return error(400, str(exception))
+        if data is None:
+            return error(404, 'Не найдено')
+        return JsonResponse(data, json_dumps_params=JSON_PARAMS)
+    return wrapper
+
+
+def login_required(view):
+    """Как ``django.contrib.auth.decorators.login_required``, но вместо
+    перенаправления на форму входа отвечает 401.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error(401, 'Требуется вход')
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def content_conditional(view):
+    """ETag по содержимому ответа для персональных лент, у которых нет
+    версии в кеше. Ответ всё равно собирается, но не передаётся.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        set_response_etag(response)
+        patch_cache_control(response, no_cache=True, private=True)
+        return get_conditional_response(
+            request, etag=response['ETag'], response=response
+        )
+    return wrapper
+
+
+def api_user_validators(request):
+    # Формы и CSRF-токена в ответах API нет: ответ зависит только от
+    # пользователя и его подписок.
+    if not request.user.is_authenticated:
+        return ()
+    return request.user.pk, follows.following_for(request).version
+
+
+def selected_fields(request):
+    value = request.GET.get('fields')
+    if not value:
+        return CARD_FIELDS
+    fields = tuple(name.strip() for name in value.split(',') if name.strip())
+    unknown = set(fields) - set(CARD_FIELDS)
+    if unknown:
+        raise BadRequest(
+            f'Неизвестные поля: {", ".join(sorted(unknown))}. '
+            f'Доступны: {", ".join(CARD_FIELDS)}'
+        )
+    return fields
+
+
+def _card_key(post):
+    # Как у HTML-карточек: updated меняется при правке поста,
+    # переименовании автора или группы и появлении миниатюр.
+    return f'api-card:{post.pk}:{post.updated.timestamp()}'
+
+
+def _variants(post):
+    """Размеры картинки и её варианты по форматам или ``None``."""
+    sources = images.sources(post)
+    if not sources:
+        return None
+    return {
+        'width': post.image_width,
+        'height': post.image_height,
+        'formats': {
+            format_name: [
+                {'url': url, 'width': width} for url, width in variants
+            ]
+            for format_name, variants in sources.items()
+        },
+    }
+
+
+def serialize_post(post):
+    """Карточка поста с готовыми ссылками на миниатюры или варианты
+    картинки.
+    """
+    image = post.image.url if post.image else None
+    variants = _variants(post)
+    sizes = {}
+    for size in settings.POST_THUMBNAIL_SIZES:
+        # У обработанных картинок миниатюр нет, хранилище не нужно.
+        thumbnail = None
+        if variants is None:
+            thumbnail = thumbnails.get_existing(post.image, size)
+        sizes[size] = thumbnail.url if thumbnail else None
+    group = None
+    if post.group_id:
+        group = {'slug': post.group.slug, 'title': post.group.title}
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'updated': post.updated.isoformat(),
+        'author': {
+            'id': post.author_id,
+            'username': post.author.username,
+            'name': post.author.get_full_name(),
+        },
+        'group': group,
+        'image': image,
+        'thumbnails': sizes if image else {},
+        'variants': variants,
+    }
+
+
+def serialize_posts(posts):
+    """Карточки постов из кеша одним ``get_many``, недостающие
+    собираются и сохраняются одним ``set_many``.
+    """
+    keys = {_card_key(post): post for post in posts}
+    cards = cache.get_many(keys)
+    missing = {
+        key: serialize_post(post)
+        for key, post in keys.items()
+        if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, settings.FEED_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [cards[key] for key in keys]
+
+
+def present_cards(request, cards, fields):
+    """Оставляет выбранные поля, делает ссылки абсолютными и отмечает
+    авторов, на которых подписан пользователь.
+    """
+    absolute = request.build_absolute_uri
+    followed = None
+    if request.user.is_authenticated and 'author' in fields:
+        followed = follows.following_for(request).among(
+            {card['author']['id'] for card in cards}
+        )
+    result = []
+    for card in cards:
+        card = {name: card[name] for name in fields}
+        if followed is not None:
+            card['author'] = {
+                **card['author'],
+                'following': card['author']['id'] in followed,
+            }
+        if card.get('image'):
+            card['image'] = absolute(card['image'])
+        if card.get('thumbnails'):
+            card['thumbnails'] = {
+                size: url and absolute(url)
+                for size, url in card['thumbnails'].items()
+            }
+        if card.get('variants'):
+            formats = card['variants']['formats']
+            card['variants'] = {
+                **card['variants'],
+                'formats': {
+                    format_name: [
+                        {**variant, 'url': absolute(variant['url'])}
+                        for variant in variants
+                    ]
+                    for format_name, variants in formats.items()
+                },
+            }
+        result.append(card)
+    return result
+
+
+def feed_page(request, page_obj, fields):
+    return {
+        'results': present_cards(
+            request, serialize_posts(page_obj), fields
+        ),
+        'next': page_obj.next_cursor,
+        'previous': page_obj.previous_cursor,
+    }
+
+
+@conditional(feed_validators(caching.index_scope), api_user_validators)
+@cache_feed(caching.index_scope)
+@api_view
+def index(request):
+    fields = selected_fields(request)
+    page_obj = pagination(request, Post.objects.for_feed())
+    return feed_page(request, page_obj, fields)
+
+
+@conditional(feed_validators(caching.group_scope), api_user_validators)
+@cache_feed(caching.group_scope)
+@api_view
+def group_posts(request, slug):
+    fields = selected_fields(request)
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return None
+    page_obj = pagination(request, group.posts.for_feed())
+    data = feed_page(request, page_obj, fields)
+    data['group'] = {
+        'slug': group.slug,
+        'title': group.title,
+        'description': group.description,
+    }
+    return data
+
+
+@conditional(feed_validators(caching.profile_scope), api_user_validators)
+@cache_feed(caching.profile_scope)
+@api_view
+def profile(request, username):
+    fields = selected_fields(request)
+    author = User.objects.select_related('counters').filter(
+        username=username
+    ).first()
+    if author is None:
+        return None
+    author_counters = get_user_counters(author)
+    page_obj = pagination(request, author.posts.for_feed())
+    data = feed_page(request, page_obj, fields)
+    data['author'] = {
+        'id': author.pk,
+        'username': author.username,
+        'name': author.get_full_name(),
+        'posts_count': author_counters.posts_count,
+        'followers_count': author_counters.followers_count,
+        'following_count': author_counters.following_count,
+    }
+    if request.user.is_authenticated:
+        data['author']['following'] = (
+            author.pk in follows.following_for(request)
+        )
+    return data
+
+
+@login_required
+@content_conditional
+@api_view
+def follow_index(request):
+    fields = selected_fields(request)
+    entries = TimelineEntry.objects.filter(user=request.user).for_feed()
+    page_obj = pagination(request, entries, ordering=('-pub_date', '-post_id'))
+    page_obj.object_list = [entry.post for entry in page_obj]
+    return feed_page(request, page_obj, fields)
+
+
+def serialize_comments(page_obj):
+    return {
+        'results': [
+            {
+                'id': comment.pk,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created.isoformat(),
+            }
+            for comment in page_obj
+        ],
+        'next': page_obj.next_cursor,
+    }
+
+
+@conditional(post_page_validators, api_user_validators)
+@api_view
+def post_view(request, post_id):
+    fields = selected_fields(request)
+    post = get_post(request, post_id)
+    if post is None:
+        return None
+    card, = present_cards(request, serialize_posts([post]), fields)
+    card['comments_count'] = post.comments_count
+    card['author_posts_count'] = get_user_counters(post.author).posts_count
+    card['comments'] = serialize_comments(
+        caching.first_comments_page(post.pk)
+    )
+    return card
+
+
+@api_view
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return None
+    return serialize_comments(
+        comments_pagination(post_id, request.GET.get('cursor'))
+    )
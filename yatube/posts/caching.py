@@ -0,0 +1,315 @@
+"""Кеширование страниц лент с версионными ключами.
+
+У каждой ленты есть область (scope): ``index``, ``group:<slug>`` или
+``profile:<username>``. В ключ закешированной страницы входит текущая
+версия области, поэтому после изменения данных достаточно сменить
+версию, и старые страницы перестают находиться. Страницы можно
+хранить сколь угодно долго: устаревают они только при изменениях.
+
+Те же версии служат валидаторами условных запросов (ETag и
+Last-Modified): браузер или прокси с актуальной копией страницы
+получает 304 без рендеринга шаблонов.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
+
+from core import metrics
+from core.db import routers
+
+from . import follows
+from .models import Group, User
+from .utils import CursorPage, comments_pagination, comments_paginator
+
+INDEX_SCOPE = 'index'
+
+
+def index_scope():
+    return INDEX_SCOPE
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def _version_key(scope):
+    return f'feed-version:{scope}'
+
+
+def _new_version():
+    # Версия — время смены в микросекундах: если ключ версии вытеснен
+    # из кеша, новая версия не совпадёт ни с одной из прежних.
+    return time.time_ns() // 1000
+
+
+def _set_versions(scopes):
+    version = _new_version()
+    cache.set_many(
+        {_version_key(scope): version for scope in scopes},
+        timeout=None,
+    )
+    return version
+
+
+def bump(*scopes):
+    """Объявляет закешированные страницы областей устаревшими.
+
+    Второй раз — после фиксации: параллельный запрос мог до неё собрать
+    страницу по прежним данным и положить её под новой версией.
+    """
+    transaction.on_commit(lambda: _set_versions(scopes))
+    return _set_versions(scopes)
+
+
+def get_version(scope):
+    version = cache.get(_version_key(scope))
+    if version is None:
+        version = _set_versions([scope])
+    return version
+
+
+def version_time(version):
+    """Момент смены версии в виде datetime (UTC)."""
+    return datetime.fromtimestamp(version / 10 ** 6, tz=timezone.utc)
+
+
+def group_scopes(*group_ids):
+    """Области групп по их id; ``None`` среди id пропускается."""
+    slugs = Group.objects.filter(
+        pk__in=[pk for pk in group_ids if pk is not None]
+    ).values_list('slug', flat=True)
+    return [group_scope(slug) for slug in slugs]
+
+
+def profile_scopes(*user_ids):
+    usernames = User.objects.filter(pk__in=user_ids).values_list(
+        'username', flat=True
+    )
+    return [profile_scope(username) for username in usernames]
+
+
+def comments_scope(post_id):
+    return f'comments:{post_id}'
+
+
+def page_key(scope, request):
+    # Ответы API содержат абсолютные ссылки, поэтому в ключ входят
+    # схема и хост.
+    path = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'feed-page:{scope}:{get_version(scope)}:{path}'
+
+
+def get_or_compute(key, compute, cacheable=None):
+    """Берёт значение из кеша или вычисляет его.
+
+    Если бэкенд кеша умеет ``get_or_compute`` (``core.cache``), значение
+    пересчитывает только один процесс, остальные ждут его результата.
+    """
+    if hasattr(cache, 'get_or_compute'):
+        return cache.get_or_compute(
+            key, compute, settings.FEED_CACHE_TIMEOUT, cacheable=cacheable
+        )
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        if cacheable is None or cacheable(value):
+            cache.set(key, value, settings.FEED_CACHE_TIMEOUT)
+    return value
+
+
+def _is_cacheable_response(response):
+    return response.status_code == 200 and not response.cookies
+
+
+def cache_feed(scope):
+    """Кеширует страницу ленты для анонимных посетителей.
+
+    ``scope`` получает именованные аргументы представления и
+    возвращает область, при изменении которой страница устаревает.
+    Авторизованным пользователям страница собирается заново, так как
+    содержит их персональные данные.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            computed = []
+            area = scope(**kwargs)
+
+            def compute():
+                computed.append(True)
+                # Страница попадёт в кеш под текущей версией, поэтому
+                # реплика должна уже содержать изменение, сменившее её.
+                moment = get_version(area) / 10 ** 6
+                with routers.fresh_since(moment):
+                    return view(request, *args, **kwargs)
+
+            response = get_or_compute(
+                page_key(area, request),
+                compute,
+                cacheable=_is_cacheable_response,
+            )
+            metrics.inc('yatube_page_cache_total', (
+                ('view', request.resolver_match.view_name),
+                ('result', 'miss' if computed else 'hit'),
+            ))
+            return response
+        return wrapper
+    return decorator
+
+
+def _user_validators(request):
+    # Страница авторизованного пользователя зависит от него самого и
+    # его подписок, а форма на ней — от секрета CSRF, который меняется
+    # при входе. get_token создаёт секрет, если его ещё нет.
+    if not request.user.is_authenticated:
+        return ()
+    get_token(request)
+    return (
+        request.user.pk,
+        follows.following_for(request).version,
+        request.META['CSRF_COOKIE'],
+    )
+
+
+def conditional(validators, user_validators=_user_validators):
+    """Отвечает 304 на условные GET-запросы, не вызывая представление.
+
+    ``validators`` получает запрос и именованные аргументы
+    представления и возвращает пару ``(last_modified, parts)``:
+    время последнего изменения данных страницы и значения, из которых
+    строится ETag; ``None``, если объекта нет. ``user_validators``
+    добавляет к ETag то, от чего страница зависит у конкретного
+    пользователя. Декоратор ставится снаружи ``cache_feed``, чтобы 304
+    не требовал даже чтения страницы из кеша.
+    """
+    def decorator(view):
+        def get_validators(request, **kwargs):
+            if not hasattr(request, '_page_validators'):
+                request._page_validators = validators(request, **kwargs)
+            return request._page_validators
+
+        def etag(request, *args, **kwargs):
+            result = get_validators(request, **kwargs)
+            if result is None:
+                return None
+            parts = (*result[1], *user_validators(request))
+            return hashlib.md5(
+                ':'.join(map(str, parts)).encode()
+            ).hexdigest()
+
+        def last_modified(request, *args, **kwargs):
+            result = get_validators(request, **kwargs)
+            return None if result is None else result[0]
+
+        conditional_view = condition(etag, last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Копию страницы нужно сверять с сервером при каждом показе,
+            # а персональные страницы — хранить только в браузере.
+            patch_cache_control(
+                response,
+                no_cache=True,
+                private=request.user.is_authenticated,
+            )
+            return response
+        return wrapper
+    return decorator
+
+
+def feed_validators(scope):
+    """Валидаторы страницы ленты — версия её области."""
+    def validators(request, **kwargs):
+        version = get_version(scope(**kwargs))
+        return version_time(version), (version,)
+    return validators
+
+
+def post_validators(post):
+    """Валидаторы страницы поста: время правки поста, версия его
+    комментариев и версия профиля автора (число его постов).
+    """
+    versions = (
+        get_version(comments_scope(post.pk)),
+        get_version(profile_scope(post.author.username)),
+    )
+    last_modified = max(post.updated, *map(version_time, versions))
+    return last_modified, (post.updated.timestamp(), *versions)
+
+
+def first_comments_page(post_id):
+    """Первая страница комментариев поста, закешированная до появления
+    нового комментария.
+    """
+    version = get_version(comments_scope(post_id))
+    key = f'comments-page:{post_id}:{version}'
+    cached = cache.get(key)
+    if cached is not None:
+        comments, has_next = cached
+        return CursorPage(
+            comments, comments_paginator(post_id), has_next, False
+        )
+    with routers.fresh_since(version / 10 ** 6):
+        page = comments_pagination(post_id)
+    cache.set(
+        key,
+        (list(page.object_list), page.has_next()),
+        settings.FEED_CACHE_TIMEOUT,
+    )
+    return page
+
+
+def card_key(post):
+    # updated меняется при правке поста, а также при переименовании
+    # его группы или автора (см. сигналы).
+    return f'post-card:{post.pk}:{post.updated.timestamp()}'
+
+
+FOLLOWING_MARK = (
+    '<p class="text-muted small text-right mb-0">Вы подписаны на автора</p>'
+)
+
+
+def render_post_cards(posts, separator='<hr>', following=follows.NOBODY):
+    """Собирает карточки постов из кеша фрагментов одним ``get_many``,
+    недостающие рендерит и сохраняет одним ``set_many``.
+
+    Пометка о подписке на автора у карточек своя для каждого
+    пользователя, поэтому добавляется уже после кеша по ``following``.
+    """
+    keys = {card_key(post): post for post in posts}
+    cards = cache.get_many(keys)
+    missing = {
+        key: render_to_string(
+            'posts/includes/post_card.html', {'post': post}
+        )
+        for key, post in keys.items()
+        if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, settings.FEED_CACHE_TIMEOUT)
+        cards.update(missing)
+    followed = following.among({post.author_id for post in keys.values()})
+    return mark_safe(separator.join(
+        cards[key] + FOLLOWING_MARK if post.author_id in followed
+        else cards[key]
+        for key, post in keys.items()
+    ))
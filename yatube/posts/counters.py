@@ -0,0 +1,133 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарно выражениями ``F()`` в сигналах, а
+рассинхронизацию (например, после ``bulk_create``) исправляет
+команда ``reconcile_counters``.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+USER_COUNTER_SOURCES = {
+    'posts_count': (Post, 'author_id'),
+    'followers_count': (Follow, 'author_id'),
+    'following_count': (Follow, 'user_id'),
+}
+
+
+def change(model, pk, field, delta):
+    """Сдвигает счётчик ``field`` у объекта ``model`` на ``delta``."""
+    if pk is None:
+        return
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def change_user(user_id, field, delta):
+    # Если строки счётчиков ещё нет, она будет посчитана при чтении.
+    change(UserCounters, user_id, field, delta)
+
+
+def _count_by(model, key, ids):
+    return dict(
+        model.objects.filter(**{f'{key}__in': ids}).order_by().values(
+            key
+        ).annotate(cnt=Count('pk')).values_list(key, 'cnt')
+    )
+
+
+def compute_user_counters(user_ids):
+    """Считает счётчики пользователей по исходным таблицам."""
+    counts = {
+        field: _count_by(model, key, user_ids)
+        for field, (model, key) in USER_COUNTER_SOURCES.items()
+    }
+    return {
+        user_id: {
+            field: counts[field].get(user_id, 0)
+            for field in USER_COUNTER_SOURCES
+        }
+        for user_id in user_ids
+    }
+
+
+def get_user_counters(user):
+    """Возвращает счётчики пользователя, при необходимости создавая их."""
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        defaults = compute_user_counters([user.pk])[user.pk]
+        counters, _ = UserCounters.objects.get_or_create(
+            user=user, defaults=defaults
+        )
+        return counters
+
+
+def _chunks(queryset, chunk_size):
+    """Выдаёт списки первичных ключей порциями по возрастанию."""
+    last_pk = None
+    while True:
+        page = queryset.order_by('pk')
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        pks = list(page.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def _reconcile_column(model, field, source, key, chunk_size):
+    fixed = 0
+    for pks in _chunks(model.objects.all(), chunk_size):
+        actual = _count_by(source, key, pks)
+        stale = [
+            obj for obj in model.objects.filter(pk__in=pks).only('pk', field)
+            if getattr(obj, field) != actual.get(obj.pk, 0)
+        ]
+        for obj in stale:
+            setattr(obj, field, actual.get(obj.pk, 0))
+        with transaction.atomic():
+            model.objects.bulk_update(stale, [field])
+        fixed += len(stale)
+    return fixed
+
+
+def _reconcile_users(chunk_size):
+    fixed = 0
+    fields = list(USER_COUNTER_SOURCES)
+    for pks in _chunks(User.objects.all(), chunk_size):
+        actual = compute_user_counters(pks)
+        existing = {
+            counters.user_id: counters
+            for counters in UserCounters.objects.filter(user_id__in=pks)
+        }
+        missing, stale = [], []
+        for user_id, values in actual.items():
+            counters = existing.get(user_id)
+            if counters is None:
+                missing.append(UserCounters(user_id=user_id, **values))
+            elif any(getattr(counters, f) != values[f] for f in fields):
+                for name, value in values.items():
+                    setattr(counters, name, value)
+                stale.append(counters)
+        with transaction.atomic():
+            UserCounters.objects.bulk_create(missing, ignore_conflicts=True)
+            UserCounters.objects.bulk_update(stale, fields)
+        fixed += len(missing) + len(stale)
+    return fixed
+
+
+def reconcile(chunk_size=1000):
+    """Пересчитывает все счётчики порциями и возвращает число
+    исправленных строк по каждому виду счётчиков.
+    """
+    return {
+        'users': _reconcile_users(chunk_size),
+        'posts': _reconcile_column(
+            Post, 'comments_count', Comment, 'post_id', chunk_size
+        ),
+        'groups': _reconcile_column(
+            Group, 'posts_count', Post, 'group_id', chunk_size
+        ),
+    }
@@ -0,0 +1,90 @@
+"""Граф подписок в кеше.
+
+Для каждого пользователя в кеше лежит отсортированный массив id
+авторов, на которых он подписан (``array('l')``: 8 байт на подписку
+вместо объекта на каждую), и версия этого массива. Проверка «подписан
+ли пользователь на этих авторов» для целой ленты делается по массиву
+без запросов к базе, а сам массив читается из кеша один раз за запрос.
+
+Число подписчиков и подписок хранится в ``UserCounters``; при подписке
+и отписке сигналы сбрасывают массив подписчика.
+"""
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+
+
+class Following:
+    """Авторы, на которых подписан пользователь."""
+
+    __slots__ = ('version', 'author_ids')
+
+    def __init__(self, version, author_ids):
+        self.version = version
+        self.author_ids = author_ids
+
+    def __contains__(self, author_id):
+        index = bisect_left(self.author_ids, author_id)
+        return (index < len(self.author_ids)
+                and self.author_ids[index] == author_id)
+
+    def __len__(self):
+        return len(self.author_ids)
+
+    def among(self, author_ids):
+        """Те из ``author_ids``, на кого пользователь подписан."""
+        return {author_id for author_id in author_ids if author_id in self}
+
+
+NOBODY = Following(0, array('l'))
+
+
+def _key(user_id):
+    return f'following:{user_id}'
+
+
+def load(user_id):
+    author_ids = Follow.objects.filter(user_id=user_id).order_by(
+        'author_id'
+    ).values_list('author_id', flat=True)
+    # Версия — время загрузки в микросекундах, как у версий лент.
+    return Following(time.time_ns() // 1000, array('l', author_ids))
+
+
+def get_following(user_id):
+    cached = cache.get(_key(user_id))
+    if cached is not None:
+        return Following(*cached)
+    following = load(user_id)
+    cache.set(
+        _key(user_id),
+        (following.version, following.author_ids),
+        settings.FOLLOWING_CACHE_TIMEOUT,
+    )
+    return following
+
+
+def following_for(request):
+    """Подписки текущего пользователя, один раз за запрос."""
+    if not request.user.is_authenticated:
+        return NOBODY
+    if not hasattr(request, '_following'):
+        request._following = get_following(request.user.pk)
+    return request._following
+
+
+def invalidate(*user_ids):
+    """Сбрасывает подписки пользователей после изменения.
+
+    Второй раз — после фиксации: параллельный запрос мог успеть
+    положить в кеш прежний список.
+    """
+    keys = [_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,12 +1,64 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
 
+from . import images
 from .models import Comment, Post
 
 
-class PostForm(forms.ModelForm):
+class PostImageField(forms.ImageField):
+    """Картинка поста с проверкой размера файла и числа пикселей.
+
+    Размер файла проверяется до того, как Pillow его откроет, а число
+    пикселей — по заголовку, до декодирования.
+    """
+
+    def to_python(self, data):
+        if data is None:
+            return None
+        if data.size > settings.POST_IMAGE_MAX_BYTES:
+            raise forms.ValidationError(
+                'Файл больше %(limit)s.',
+                code='file_too_large',
+                params={
+                    'limit': filesizeformat(settings.POST_IMAGE_MAX_BYTES)
+                },
+            )
+        upload = super().to_python(data)
+        width, height = upload.image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                'Картинка больше %(limit)d мегапикселей.',
+                code='too_many_pixels',
+                params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+            )
+        return upload
+
+
+class PostImageFormMixin:
+    """Новая картинка проходит обработку ``posts.images`` при
+    сохранении формы, в том числе с ``commit=False``.
+    """
+
+    def save(self, commit=True):
+        post = super().save(commit=False)
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            images.ingest(post, image)
+        elif 'image' in self.changed_data:
+            images.clear(post)
+        if commit:
+            post.save()
+            self._save_m2m()
+        return post
+
+
+class PostForm(PostImageFormMixin, forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
+        field_classes = {'image': PostImageField}
 
 
 class CommentForm(forms.ModelForm):
@@ -0,0 +1,209 @@
+"""Обработка картинок постов при загрузке.
+
+Загрузка пишется во временный файл частями (``ImageUploadHandler``) и
+перестаёт записываться, как только превышает ``POST_IMAGE_MAX_BYTES``.
+Форма проверяет размер картинки в пикселях по заголовку файла, до
+декодирования, поэтому «бомба» из маленького файла не распаковывается.
+Затем картинка:
+
+* поворачивается по EXIF и сохраняется без EXIF (профиль ICC остаётся);
+* уменьшается до ``POST_IMAGE_MAX_SIZE`` пикселей по большей стороне;
+* сохраняется в JPEG, а в ширинах ``POST_IMAGE_WIDTHS`` — ещё и в JPEG и
+  WebP рядом с оригиналом.
+
+Размеры и ширины вариантов хранятся в посте, поэтому шаблоны выводят
+``srcset`` и размеры картинки, не открывая файлы.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+
+from core.storage import is_addressed
+
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+    'webp': ('WEBP', 'webp', 'image/webp'),
+}
+
+
+class OversizedUpload(UploadedFile):
+    """Загрузка, содержимое которой отброшено из-за размера."""
+
+    def __init__(self, name, size):
+        super().__init__(io.BytesIO(), name, size=size)
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл частями и перестаёт писать,
+    когда она превышает ``POST_IMAGE_MAX_BYTES``: остаток запроса
+    читается, но на диск не попадает.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.oversized = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.POST_IMAGE_MAX_BYTES:
+            self.oversized = True
+        if self.oversized:
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.oversized:
+            self.file.close()
+            return OversizedUpload(self.file_name, file_size)
+        return super().file_complete(file_size)
+
+
+def variant_name(name, width, extension):
+    root, _ = os.path.splitext(name)
+    return f'{root}-{width}w.{extension}'
+
+
+def variant_widths(width):
+    """Ширины вариантов картинки шириной ``width``, по возрастанию."""
+    return [
+        size for size in sorted(settings.POST_IMAGE_WIDTHS) if size < width
+    ] + [width]
+
+
+def _variant_file(post, width, format_name):
+    _, extension, _ = FORMATS[format_name]
+    if format_name == 'jpeg' and width == post.image_width:
+        # Оригинал сам служит JPEG-вариантом полной ширины.
+        return post.image.name
+    return variant_name(post.image.name, width, extension)
+
+
+def _widths(post):
+    return [int(width) for width in post.image_widths.split(',')]
+
+
+def variant_files(post):
+    """Имена файлов вариантов картинки поста, кроме оригинала."""
+    if not post.image or not post.image_widths:
+        return []
+    names = [
+        _variant_file(post, width, format_name)
+        for width in _widths(post)
+        for format_name in FORMATS
+    ]
+    return [name for name in names if name != post.image.name]
+
+
+def sources(post):
+    """Варианты картинки поста по форматам: ``{'webp': [(url, ширина),
+    ...], 'jpeg': [...]}``. Пусто, если картинка не обработана.
+    """
+    if not post.image or not post.image_widths:
+        return {}
+    storage = post.image.storage
+    widths = _widths(post)
+    return {
+        format_name: [
+            (storage.url(_variant_file(post, width, format_name)), width)
+            for width in widths
+        ]
+        for format_name in FORMATS
+    }
+
+
+def _encode(image, format_name, icc_profile):
+    pil_format, _, _ = FORMATS[format_name]
+    buffer = io.BytesIO()
+    options = {'quality': settings.POST_IMAGE_QUALITY}
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    if pil_format == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    else:
+        options['method'] = 4
+    image.save(buffer, pil_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def _variant_exists(storage, name):
+    # Имя варианта выведено из хеша оригинала, поэтому файл под ним —
+    # тот же вариант картинки с таким же содержимым, загруженной раньше.
+    return storage.exists(name)
+
+
+def load(upload):
+    """Декодирует загрузку в RGB с учётом поворота из EXIF, сразу
+    уменьшая её до ``POST_IMAGE_MAX_SIZE``.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    limit = settings.POST_IMAGE_MAX_SIZE
+    width, height = image.size
+    if max(width, height) > limit:
+        # JPEG декодируется сразу в 1/2, 1/4 или 1/8 размера, если
+        # результат всё ещё не меньше нужного.
+        scale = limit / max(width, height)
+        image.draft('RGB', (int(width * scale) + 1, int(height * scale) + 1))
+    image = ImageOps.exif_transpose(image)
+    icc_profile = None
+    if image.mode in ('RGB', 'RGBA'):
+        # Профиль CMYK или палитры к RGB-пикселям не подходит.
+        icc_profile = image.info.get('icc_profile')
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail((limit, limit), Image.LANCZOS)
+    return image, icc_profile
+
+
+def ingest(post, upload):
+    """Сохраняет загруженную картинку поста с вариантами и заполняет
+    её размеры. Пост не сохраняется.
+    """
+    image, icc_profile = load(upload)
+    width, height = image.size
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    post.image.save(
+        f'{stem}.jpg', _encode(image, 'jpeg', icc_profile), save=False
+    )
+    post.image_width = width
+    post.image_height = height
+    if not is_addressed(post.image.name):
+        # Без имени по хешу вариант вида cat-480w.jpg мог бы совпасть
+        # с чужим оригиналом, поэтому вариантов нет, выводится оригинал.
+        post.image_widths = ''
+        return
+    widths = variant_widths(width)
+    # Варианты уменьшаются от большего к меньшему: каждый следующий
+    # получается из предыдущего, а не из оригинала.
+    storage = post.image.storage
+    variant = image
+    for size in reversed(widths):
+        names = {}
+        for format_name in FORMATS:
+            name = _variant_file(post, size, format_name)
+            if name != post.image.name and not _variant_exists(storage, name):
+                names[format_name] = name
+        if not names:
+            continue
+        if size != variant.width:
+            variant = variant.resize(
+                (size, max(1, round(height * size / width))), Image.LANCZOS
+            )
+        for format_name, name in names.items():
+            storage.save(name, _encode(variant, format_name, icc_profile))
+    post.image_widths = ','.join(map(str, widths))
+
+
+def clear(post):
+    post.image_width = None
+    post.image_height = None
+    post.image_widths = ''
@@ -0,0 +1,288 @@
+"""Массовый импорт постов, комментариев и подписок.
+
+Строки читаются потоком из файлов JSONL или CSV и записываются
+``bulk_create`` порциями, каждая порция — в своей транзакции. Авторы и
+группы ищутся по словарям в памяти, а не запросом на каждую строку.
+
+Каждая порция записывается под блокировкой на запись (``BEGIN
+IMMEDIATE``, см. ``core.db.backends.sqlite3``), поэтому посты, которые
+сайт создаёт во время импорта, не попадают между строками порции: id
+новых постов выдаёт база, и после вставки они читаются по порядку.
+Даты из файла сохраняются вставкой без ``pre_save`` (см.
+``ExplicitValuesQuerySet``), настройки полей модели не меняются.
+
+``bulk_create`` не отправляет сигналы, поэтому счётчики, ленты
+подписок, полнотекстовый индекс и версии кеша не обновляются во время
+импорта; ``Importer.finish`` пересобирает их один раз в конце.
+
+Форматы строк (поля CSV называются так же):
+
+* посты: ``id`` (идентификатор во внешней системе), ``author``
+  (username), ``group`` (slug, необязательно), ``text``, ``pub_date``
+  (ISO 8601, необязательно), ``image`` (путь в MEDIA_ROOT,
+  необязательно);
+* комментарии: ``post`` (внешний id поста из того же импорта),
+  ``author``, ``text``, ``created``;
+* подписки: ``user``, ``author``.
+"""
+import csv
+import json
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.db.backends.sqlite3.base import immediate
+
+from . import caching, counters, follows, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+# SQLite ограничивает число параметров запроса, поэтому длинные
+# списки id для ``__in`` передаются частями.
+IN_QUERY_SIZE = 500
+
+
+def read_rows(path):
+    """Построчно читает файл JSONL или CSV (по расширению)."""
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(file)
+            return
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ExplicitValuesQuerySet(QuerySet):
+    """``bulk_create`` пишет значения полей объектов как есть.
+
+    Вставка помечается как raw, и ``pre_save`` не вызывается: auto_now
+    и auto_now_add не заменяют даты из импортируемых данных. В отличие
+    от переключения auto_now на полях модели, это не затрагивает
+    сохранения в других потоках.
+    """
+
+    def _insert(self, *args, **kwargs):
+        kwargs['raw'] = True
+        return super()._insert(*args, **kwargs)
+
+
+def parse_date(value, default):
+    date = parse_datetime(value) if value else None
+    if date is None:
+        return default
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+def _max_pk(model):
+    return model.objects.aggregate(pk=Max('pk'))['pk'] or 0
+
+
+class Importer:
+    def __init__(self, batch_size=1000, chunk_size=10000,
+                 create_users=False, rebuild_timelines=True, log=None):
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.create_users = create_users
+        self.rebuild_timelines = rebuild_timelines
+        self.log = log or (lambda message: None)
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        # Внешний id поста -> id в нашей базе.
+        self.post_ids = {}
+        self.start_pks = {
+            model: _max_pk(model) for model in (Post, Comment)
+        }
+        self.last_post_pk = self.start_pks[Post]
+        self.authors = set()
+        self.followers = set()
+        self.followed = set()
+        self.group_ids = set()
+        self.stats = {}
+
+    def _batch_size(self, model):
+        # Больше строк в одном INSERT SQLite не примет: параметров
+        # запроса не больше max_query_params, а SELECT в UNION ALL
+        # не больше 500.
+        fields = model._meta.concrete_fields
+        limit = connection.ops.bulk_batch_size(fields, [None] * 500)
+        return min(self.batch_size, limit, 500)
+
+    def _resolve_users(self, usernames):
+        """Добавляет в словарь недостающих пользователей, при
+        необходимости создавая их одним запросом.
+        """
+        missing = {name for name in usernames if name} - self.users.keys()
+        if not missing or not self.create_users:
+            return
+        # Войти импортированные пользователи смогут после сброса пароля.
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=name, password=password) for name in missing],
+            batch_size=self._batch_size(User),
+            ignore_conflicts=True,
+        )
+        for usernames in chunked(missing, IN_QUERY_SIZE):
+            self.users.update(
+                User.objects.filter(username__in=usernames).values_list(
+                    'username', 'pk'
+                )
+            )
+
+    def _remember_post_ids(self, posts, last_pk):
+        """Запоминает id, которые база выдала постам порции."""
+        if posts and posts[0].pk is None:
+            # SQLite не возвращает id из bulk_create. Порция вставлена
+            # под блокировкой на запись, поэтому новые строки — это
+            # строки после last_pk в порядке вставки.
+            pks = Post.objects.filter(pk__gt=last_pk).order_by(
+                'pk'
+            ).values_list('pk', flat=True)
+            for post, pk in zip(posts, pks):
+                post.pk = pk
+        if posts:
+            self.last_post_pk = posts[-1].pk
+        for post in posts:
+            if post.source_id is not None:
+                self.post_ids[post.source_id] = post.pk
+
+    def _run(self, kind, rows, build, model, created_hook=None):
+        created = skipped = 0
+        started = time.perf_counter()
+        for chunk in chunked(rows, self.chunk_size):
+            self._resolve_users(
+                row.get(key) for row in chunk for key in ('author', 'user')
+            )
+            objects = []
+            for row in chunk:
+                obj = build(row)
+                if obj is None:
+                    skipped += 1
+                else:
+                    objects.append(obj)
+            with immediate(), transaction.atomic():
+                last_pk = _max_pk(model)
+                ExplicitValuesQuerySet(model).bulk_create(
+                    objects,
+                    batch_size=self._batch_size(model),
+                    ignore_conflicts=model is Follow,
+                )
+                if created_hook is not None:
+                    created_hook(objects, last_pk)
+            created += len(objects)
+            self.log(f'{kind}: {created}')
+        seconds = time.perf_counter() - started
+        self.stats[kind] = {
+            'created': created,
+            'skipped': skipped,
+            'seconds': seconds,
+            'rows_per_second': created / seconds if seconds else 0,
+        }
+        return self.stats[kind]
+
+    def _build_post(self, row):
+        author_id = self.users.get(row.get('author'))
+        slug = row.get('group') or None
+        group_id = self.groups.get(slug) if slug else None
+        if (author_id is None or not row.get('text')
+                or (slug and group_id is None)):
+            return None
+        self.authors.add(author_id)
+        self.group_ids.add(group_id)
+        pub_date = parse_date(row.get('pub_date'), timezone.now())
+        post = Post(
+            author_id=author_id,
+            group_id=group_id,
+            text=row['text'],
+            pub_date=pub_date,
+            updated=pub_date,
+            image=row.get('image') or '',
+        )
+        post.source_id = None if row.get('id') is None else str(row['id'])
+        return post
+
+    def _build_comment(self, row):
+        post_id = self.post_ids.get(str(row.get('post')))
+        author_id = self.users.get(row.get('author'))
+        if post_id is None or author_id is None or not row.get('text'):
+            return None
+        return Comment(
+            post_id=post_id,
+            author_id=author_id,
+            text=row['text'],
+            created=parse_date(row.get('created'), timezone.now()),
+        )
+
+    def _build_follow(self, row):
+        user_id = self.users.get(row.get('user'))
+        author_id = self.users.get(row.get('author'))
+        if user_id is None or author_id is None or user_id == author_id:
+            return None
+        self.followers.add(user_id)
+        self.followed.add(author_id)
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def import_posts(self, rows):
+        return self._run(
+            'posts', rows, self._build_post, Post, self._remember_post_ids
+        )
+
+    def import_comments(self, rows):
+        return self._run('comments', rows, self._build_comment, Comment)
+
+    def import_follows(self, rows):
+        return self._run('follows', rows, self._build_follow, Follow)
+
+    def finish(self):
+        """Один раз пересобирает всё, что обычно обновляют сигналы."""
+        started = time.perf_counter()
+        self.log('Пересчёт счётчиков')
+        counters.reconcile()
+
+        self.log('Полнотекстовый индекс')
+        for model, start_pk in self.start_pks.items():
+            search.reindex(
+                model, chunk_size=self.chunk_size, after_pk=start_pk
+            )
+
+        if self.rebuild_timelines:
+            self.log('Ленты подписок')
+            readers = set(self.followers)
+            for author_ids in chunked(self.authors, IN_QUERY_SIZE):
+                readers.update(
+                    Follow.objects.filter(
+                        author_id__in=author_ids
+                    ).values_list('user_id', flat=True)
+                )
+            for user_ids in chunked(sorted(readers), self.chunk_size):
+                timeline.rebuild(user_ids)
+        for user_ids in chunked(self.followers, IN_QUERY_SIZE):
+            follows.invalidate(*user_ids)
+
+        self.log('Кеш страниц')
+        scopes = [
+            caching.INDEX_SCOPE,
+            *caching.group_scopes(*self.group_ids),
+        ]
+        profiles = self.authors | self.followers | self.followed
+        for user_ids in chunked(profiles, IN_QUERY_SIZE):
+            scopes.extend(caching.profile_scopes(*user_ids))
+        caching.bump(*scopes)
+        self.stats['finish'] = {'seconds': time.perf_counter() - started}
+        return self.stats
@@ -0,0 +1,84 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность полных ответов 200 и ответов '
+        '304 на условные запросы для лент и страницы поста.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument(
+            '--username',
+            help='Выполнять запросы от имени этого пользователя.',
+        )
+        parser.add_argument(
+            '--output', help='Файл для сохранения результатов в JSON.'
+        )
+
+    def handle(self, *args, **options):
+        post = Post.objects.select_related('author', 'group').first()
+        if post is None:
+            raise CommandError('В базе нет постов.')
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=[post.author.username]),
+            reverse('posts:post_detail', args=[post.pk]),
+        ]
+        if post.group is not None:
+            urls.insert(
+                1, reverse('posts:group_posts', args=[post.group.slug])
+            )
+
+        client = Client(HTTP_HOST='localhost')
+        if options['username']:
+            user = User.objects.filter(
+                username=options['username']
+            ).first()
+            if user is None:
+                raise CommandError('Пользователь не найден.')
+            client.force_login(user)
+
+        report = [self.run(client, url, options['requests']) for url in urls]
+        self.stdout.write(
+            f'{"url":40} {"200, req/s":>11} {"304, req/s":>11} '
+            f'{"200, bytes":>11}'
+        )
+        for row in report:
+            self.stdout.write(
+                f'{row["url"]:40} {row["full_rps"]:11.0f} '
+                f'{row["not_modified_rps"]:11.0f} {row["full_bytes"]:11d}'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+
+    def measure(self, client, url, count, **headers):
+        started = time.perf_counter()
+        for _ in range(count):
+            response = client.get(url, **headers)
+        return count / (time.perf_counter() - started), response
+
+    def run(self, client, url, count):
+        # Прогрев: страница попадает в кеш лент, как у живого сайта.
+        etag = client.get(url)['ETag']
+        full_rps, response = self.measure(client, url, count)
+        not_modified_rps, revalidated = self.measure(
+            client, url, count, HTTP_IF_NONE_MATCH=etag
+        )
+        if revalidated.status_code != 304:
+            raise CommandError(f'{url}: ожидался ответ 304.')
+        return {
+            'url': url,
+            'full_rps': full_rps,
+            'not_modified_rps': not_modified_rps,
+            'full_bytes': len(response.content),
+        }
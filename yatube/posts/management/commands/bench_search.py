@@ -0,0 +1,87 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.management.commands.bench_cache import percentile
+from posts import search
+from posts.models import Post
+from posts.utils import POSTS_PER_PAGE
+
+
+def icontains_page(query):
+    return list(
+        Post.objects.for_feed().filter(
+            text__icontains=query
+        ).order_by('-pub_date', '-pk')[:POSTS_PER_PAGE]
+    )
+
+
+def fts_page(query):
+    return list(search.search_pagination(query))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время поиска постов через icontains (LIKE) и через '
+        'индекс FTS5 на данных текущей базы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'queries', nargs='*',
+            help='Поисковые запросы; по умолчанию слова из случайных постов.',
+        )
+        parser.add_argument('--samples', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--output', help='Файл для сохранения результатов в JSON.'
+        )
+
+    def handle(self, *args, queries=(), **options):
+        if not search.is_available():
+            raise CommandError('Индекс FTS5 доступен только на SQLite.')
+        queries = list(queries) or self.sample_queries(options['samples'])
+        if not queries:
+            raise CommandError('В базе нет постов для выбора запросов.')
+        report = [
+            self.run(name, page, queries, options['repeat'])
+            for name, page in (('icontains', icontains_page),
+                               ('fts5', fts_page))
+        ]
+        self.stdout.write(
+            f'{"method":10} {"queries":>7} {"p50, ms":>8} {"p99, ms":>8}'
+        )
+        for row in report:
+            self.stdout.write(
+                f'{row["method"]:10} {row["queries"]:7d} '
+                f'{row["p50_ms"]:8.2f} {row["p99_ms"]:8.2f}'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+
+    def sample_queries(self, count):
+        texts = Post.objects.order_by('?').values_list(
+            'text', flat=True
+        )[:count]
+        return [
+            random.choice(terms)
+            for terms in map(search.TERM_RE.findall, texts)
+            if terms
+        ]
+
+    def run(self, method, page, queries, repeat):
+        latencies = []
+        for _ in range(repeat):
+            for query in queries:
+                started = time.perf_counter()
+                page(query)
+                latencies.append(time.perf_counter() - started)
+        return {
+            'method': method,
+            'queries': len(queries),
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+        }
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from posts.orphans import Collector
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки, на которые не ссылается ни один пост, их '
+        'миниатюры и записи миниатюр в хранилище ключей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, что было бы удалено.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько файлов удалять параллельно; '
+                 '1 — последовательно в текущем потоке.',
+        )
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Не больше стольких удалений в секунду; 0 — без '
+                 'ограничения.',
+        )
+        parser.add_argument(
+            '--min-age', type=float,
+            default=settings.MEDIA_GC_MIN_AGE / 60 / 60,
+            help='Не трогать файлы моложе стольких часов.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько постов выбирать из базы за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        stats = Collector(
+            dry_run=options['dry_run'],
+            workers=options['workers'],
+            rate=options['rate'],
+            min_age=options['min_age'] * 60 * 60,
+            chunk_size=options['chunk_size'],
+        ).collect()
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(
+            f'{verb}: картинок {stats["images"]}, '
+            f'миниатюр {stats["thumbnails"]}, '
+            f'записей хранилища ключей {stats["kvstore"]}, '
+            f'{filesizeformat(stats["bytes"])}'
+        )
+        self.stdout.write(self.style.SUCCESS('Сборка мусора завершена'))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import EXPORTS, FORMATS, export_rows, parse_since, render
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает посты или комментарии в NDJSON или CSV '
+        'для аналитики и резервных копий.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS), default='ndjson'
+        )
+        parser.add_argument(
+            '--since',
+            help='Только строки, изменённые после этой даты (ISO 8601).',
+        )
+        parser.add_argument(
+            '--after', type=int,
+            help='Продолжить после строки с этим id.',
+        )
+        parser.add_argument(
+            '--base-url', default='',
+            help='Адрес сайта для ссылок на изображения.',
+        )
+        parser.add_argument(
+            '--output', help='Файл для выгрузки, по умолчанию stdout.'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_since(options['since'])
+            if since is None:
+                raise CommandError('--since: дата в формате ISO 8601')
+        rows = export_rows(
+            options['kind'],
+            since=since,
+            after=options['after'],
+            base_url=options['base_url'],
+        )
+        parts = render(options['kind'], rows, options['format'])
+        if not options['output']:
+            for part in parts:
+                self.stdout.write(part, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as file:
+            file.writelines(parts)
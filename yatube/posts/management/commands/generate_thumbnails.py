@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def generate_in_thread(post_id):
+    try:
+        thumbnails.generate(post_id)
+    finally:
+        # У каждого потока своё соединение с базой.
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры картинок существующих постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько картинок обрабатывать параллельно; '
+                 '1 — последовательно в текущем потоке.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Сколько постов выбирать из базы за один запрос.',
+        )
+
+    def handle(self, *args, workers=4, chunk_size=500, **options):
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                self.process(
+                    lambda ids: executor.map(generate_in_thread, ids),
+                    chunk_size,
+                )
+        else:
+            self.process(
+                lambda ids: map(thumbnails.generate, ids), chunk_size
+            )
+        self.stdout.write(self.style.SUCCESS('Миниатюры созданы'))
+
+    def process(self, run, chunk_size):
+        posts = Post.objects.exclude(image='').order_by('pk')
+        processed = 0
+        last_pk = 0
+        while True:
+            chunk = list(
+                posts.filter(pk__gt=last_pk).values_list(
+                    'pk', flat=True
+                )[:chunk_size]
+            )
+            if not chunk:
+                return
+            last_pk = chunk[-1]
+            list(run(chunk))
+            processed += len(chunk)
+            self.stdout.write(f'Обработано постов: {processed}')
@@ -0,0 +1,108 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.storage import is_addressed
+from posts import caching, images, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище по содержимому и '
+        'переписывает пути к ним пачками. Прежние файлы остаются на '
+        'месте до сборки мусора.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Сколько постов переносить за один раз.',
+        )
+
+    def handle(self, *args, chunk_size=500, **options):
+        storage = Post._meta.get_field('image').storage
+        # Прежнее имя -> новое: одинаковые файлы хешируются один раз.
+        self.moved = {}
+        self.missing = self.failed = 0
+        posts = Post.objects.exclude(image='').order_by('pk').only(
+            'pk', 'image', 'image_width', 'image_widths',
+            'author_id', 'group_id',
+        )
+        processed = 0
+        last_pk = 0
+        while True:
+            chunk = list(posts.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            processed += self.process(storage, chunk)
+            self.stdout.write(f'Перенесено картинок: {processed}')
+        if self.missing:
+            self.stdout.write(f'Файлов не найдено: {self.missing}')
+        if self.failed:
+            self.stdout.write(f'Миниатюр не создано: {self.failed}')
+        self.stdout.write(self.style.SUCCESS('Картинки перенесены'))
+
+    def process(self, storage, chunk):
+        chunk = [post for post in chunk if not is_addressed(post.image.name)]
+        self.store(storage, {post.image.name for post in chunk})
+        moved = [
+            (post, post.image.name) for post in chunk
+            if post.image.name in self.moved
+        ]
+        for post, old_name in moved:
+            self.move(storage, post, self.moved[old_name])
+        now = timezone.now()
+        references = Counter()
+        with transaction.atomic():
+            for post, old_name in moved:
+                # Картинку поста могли успеть сменить: тогда ссылки нет.
+                references[post.image.name] += Post.objects.filter(
+                    pk=post.pk, image=old_name
+                ).update(image=post.image.name, updated=now)
+            # Ссылки добавляются в одной транзакции с новыми путями.
+            for name, count in references.items():
+                if count:
+                    storage.retain(name, count)
+        if moved:
+            caching.bump(
+                caching.INDEX_SCOPE,
+                *caching.group_scopes(*{post.group_id for post, _ in moved}),
+                *caching.profile_scopes(
+                    *{post.author_id for post, _ in moved}
+                ),
+            )
+        return len(moved)
+
+    def store(self, storage, names):
+        """Сохраняет файлы пачки по содержимому, пока без ссылок."""
+        for name in names:
+            if name in self.moved:
+                continue
+            if storage.exists(name):
+                with storage.open(name) as content:
+                    self.moved[name] = storage.add(name, content, 0)
+            else:
+                self.missing += 1
+
+    def move(self, storage, post, name):
+        """Переводит пост на новое имя вместе с вариантами и миниатюрами;
+        путь в базе меняется позже.
+        """
+        old_variants = images.variant_files(post)
+        post.image.name = name
+        for old, new in zip(old_variants, images.variant_files(post)):
+            if storage.exists(old) and not storage.exists(new):
+                with storage.open(old) as content:
+                    storage.save(new, content)
+        if not post.image_widths:
+            # Миниатюры sorl привязаны к имени файла: создаём их до
+            # смены пути, чтобы карточка не показала заглушку.
+            try:
+                thumbnails.generate_for_image(post.image)
+            except Exception as error:
+                self.failed += 1
+                self.stderr.write(f'Пост {post.pk}: {error}')
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from posts.importer import Importer, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Массово импортирует посты, комментарии и подписки из файлов '
+        'JSONL или CSV и пересобирает производные данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', help='Файл с постами.')
+        parser.add_argument('--comments', help='Файл с комментариями.')
+        parser.add_argument('--follows', help='Файл с подписками.')
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать неизвестных пользователей без пароля.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк вставлять одним INSERT.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Сколько строк записывать в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        importer = Importer(
+            batch_size=options['batch_size'],
+            chunk_size=options['chunk_size'],
+            create_users=options['create_users'],
+            log=lambda message: self.stderr.write(message),
+        )
+        steps = (
+            ('posts', importer.import_posts),
+            ('comments', importer.import_comments),
+            ('follows', importer.import_follows),
+        )
+        for option, run in steps:
+            if options[option]:
+                stats = run(read_rows(options[option]))
+                self.stdout.write(
+                    f'{option}: создано {stats["created"]}, '
+                    f'пропущено {stats["skipped"]}, '
+                    f'{stats["rows_per_second"]:.0f} строк/с'
+                )
+        stats = importer.finish()
+        self.stdout.write(
+            f'Производные данные пересобраны за '
+            f'{stats["finish"]["seconds"]:.1f} с'
+        )
+        self.stdout.write(self.style.SUCCESS('Импорт завершён'))
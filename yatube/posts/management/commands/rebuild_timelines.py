@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок из таблиц Follow и Post.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя; можно указать несколько раз.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько пользователей обрабатывать за один проход.',
+        )
+
+    def handle(self, *args, user_ids=None, chunk_size=1000, **options):
+        if user_ids is None:
+            # Лента может остаться и у тех, кто уже ни на кого не подписан.
+            user_ids = sorted(
+                set(Follow.objects.values_list('user_id', flat=True))
+                | set(TimelineEntry.objects.values_list('user_id', flat=True))
+            )
+        rebuilt = 0
+        chunk = []
+        for user_id in user_ids:
+            chunk.append(user_id)
+            if len(chunk) >= chunk_size:
+                timeline.rebuild(chunk)
+                rebuilt += len(chunk)
+                chunk = []
+        if chunk:
+            timeline.rebuild(chunk)
+            rebuilt += len(chunk)
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересобрано лент: {rebuilt}')
+        )
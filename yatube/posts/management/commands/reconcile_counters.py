@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счётчики с исходными таблицами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько строк сверять за один запрос.',
+        )
+
+    def handle(self, *args, chunk_size=1000, **options):
+        fixed = counters.reconcile(chunk_size=chunk_size)
+        for kind, count in fixed.items():
+            self.stdout.write(f'{kind}: исправлено {count}')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены'))
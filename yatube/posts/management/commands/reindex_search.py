@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов и комментариев.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Сколько строк индексировать в одной транзакции.',
+        )
+
+    def handle(self, *args, chunk_size=10000, **options):
+        if not search.is_available():
+            self.stdout.write(
+                'Полнотекстовый индекс есть только у SQLite, '
+                'переиндексация не нужна'
+            )
+            return
+        for model in (Post, Comment):
+            count = search.reindex(model, chunk_size=chunk_size)
+            self.stdout.write(f'{model._meta.label}: {count}')
+        self.stdout.write(self.style.SUCCESS('Индекс перестроен'))
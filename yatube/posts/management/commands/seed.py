@@ -0,0 +1,262 @@
+"""Синтетические данные для нагрузочных тестов.
+
+Распределения похожи на живой сайт: немногие авторы пишут большую
+часть постов (закон Ципфа), на популярных авторов подписываются чаще,
+число подписок у пользователя распределено по Парето, обсуждают в
+основном свежие посты. Запись идёт через ``Importer``, поэтому
+счётчики, поиск, ленты и кеш пересобираются так же, как после импорта.
+
+Полный объём: ``seed --users 100000 --posts 1000000 --comments 3000000``.
+"""
+import os
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from PIL import Image
+
+from posts.importer import Importer, chunked
+from posts.models import Group, Post, User
+
+WORDS = (
+    'город', 'утро', 'кофе', 'книга', 'поезд', 'море', 'дождь', 'кот',
+    'собака', 'работа', 'проект', 'код', 'релиз', 'ошибка', 'идея',
+    'музыка', 'концерт', 'фильм', 'сериал', 'выходные', 'отпуск', 'горы',
+    'лес', 'река', 'велосипед', 'бег', 'зал', 'ужин', 'рецепт', 'пирог',
+    'друзья', 'семья', 'дети', 'школа', 'университет', 'экзамен', 'лекция',
+    'статья', 'новости', 'погода', 'зима', 'весна', 'лето', 'осень',
+    'снег', 'солнце', 'фото', 'камера', 'прогулка', 'парк', 'метро',
+    'машина', 'дорога', 'путешествие', 'аэропорт', 'отель', 'музей',
+    'выставка', 'театр', 'футбол', 'матч', 'победа', 'новый', 'старый',
+    'хороший', 'сегодня', 'вчера', 'завтра', 'наконец', 'опять', 'очень',
+)
+FIRST_NAMES = (
+    'Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Алексей', 'Елена',
+    'Дмитрий', 'Наталья', 'Сергей', 'Татьяна', 'Михаил',
+)
+LAST_NAMES = (
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров',
+    'Соколов', 'Михайлов', 'Новиков', 'Фёдоров', 'Морозов', 'Волков',
+)
+IMAGE_DIR = 'posts/seed'
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса рангов 1..count для ``random.choices``."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+def make_text(rng, min_words, max_words):
+    # Длина постов тоже скошена: коротких больше, чем длинных.
+    count = min_words + int(
+        (max_words - min_words) * rng.random() ** 3
+    )
+    return ' '.join(rng.choices(WORDS, k=count)).capitalize() + '.'
+
+
+def make_images(rng, count):
+    """Несколько картинок, на которые ссылаются посты с изображением."""
+    directory = os.path.join(settings.MEDIA_ROOT, IMAGE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for number in range(count):
+        name = f'{IMAGE_DIR}/seed-{number}.jpg'
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        if not os.path.exists(path):
+            color = tuple(rng.randrange(256) for _ in range(3))
+            Image.new('RGB', (1200, 800), color).save(path, quality=80)
+        names.append(name)
+    return names
+
+
+class PostIds:
+    """Сопоставление «id поста → id поста» для строк комментариев.
+
+    Строки постов генерируются без внешних id, чтобы ``Importer`` не
+    держал словарь на миллион записей; комментарии ссылаются сразу на
+    id в базе.
+    """
+
+    def __init__(self, first, last):
+        self.first = first
+        self.last = last
+
+    def get(self, key):
+        pk = int(key)
+        return pk if self.first <= pk <= self.last else None
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, '
+        'постами с картинками, комментариями и подписками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--follow-alpha', type=float, default=1.1,
+            help='Параметр Парето для числа подписок; меньше — длиннее '
+                 'хвост.',
+        )
+        parser.add_argument('--max-follows', type=int, default=1000)
+        parser.add_argument(
+            '--author-skew', type=float, default=1.1,
+            help='Показатель закона Ципфа для авторства постов.',
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=0.05,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределены даты публикации.',
+        )
+        parser.add_argument('--prefix', default='user')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--skip-timelines', action='store_true',
+            help='Не собирать ленты подписок (быстрее на больших '
+                 'объёмах).',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.now = timezone.now()
+        started = time.perf_counter()
+        usernames = self.create_users()
+        slugs = self.create_groups()
+        importer = Importer(
+            rebuild_timelines=not options['skip_timelines'],
+            log=lambda message: self.stderr.write(message),
+        )
+        weights = zipf_weights(len(usernames), options['author_skew'])
+        # Популярность авторов не связана с порядком регистрации.
+        authors = self.rng.sample(usernames, len(usernames))
+
+        self.report(importer.import_posts(
+            self.post_rows(authors, weights, slugs)
+        ), 'posts')
+        first_pk = importer.start_pks[Post] + 1
+        last_pk = importer.last_post_pk
+        importer.post_ids = PostIds(first_pk, last_pk)
+        self.report(importer.import_comments(
+            self.comment_rows(usernames, first_pk, last_pk)
+        ), 'comments')
+        self.report(importer.import_follows(
+            self.follow_rows(usernames, authors, weights)
+        ), 'follows')
+        importer.finish()
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.perf_counter() - started:.0f} с'
+        ))
+
+    def report(self, stats, kind):
+        self.stdout.write(
+            f'{kind}: {stats["created"]}, '
+            f'{stats["rows_per_second"]:.0f} строк/с'
+        )
+
+    def create_users(self):
+        prefix = self.options['prefix']
+        usernames = [
+            f'{prefix}{number}' for number in range(self.options['users'])
+        ]
+        # Пароль непригоден для входа; бенчмарки входят force_login.
+        password = make_password(None)
+        for chunk in chunked(usernames, 10000):
+            User.objects.bulk_create(
+                [
+                    User(
+                        username=name,
+                        first_name=self.rng.choice(FIRST_NAMES),
+                        last_name=self.rng.choice(LAST_NAMES),
+                        password=password,
+                    )
+                    for name in chunk
+                ],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+        self.stdout.write(f'users: {len(usernames)}')
+        return usernames
+
+    def create_groups(self):
+        groups = [
+            Group(
+                title=f'Группа {number}',
+                slug=f'{self.options["prefix"]}-group-{number}',
+                description=make_text(self.rng, 5, 30),
+            )
+            for number in range(self.options['groups'])
+        ]
+        Group.objects.bulk_create(groups, ignore_conflicts=True)
+        return [group.slug for group in groups]
+
+    def post_rows(self, authors, weights, slugs):
+        options = self.options
+        images = make_images(self.rng, 20) if options['image_share'] else []
+        group_weights = zipf_weights(len(slugs), 1) if slugs else None
+        span = timedelta(days=options['days'])
+        count = options['posts']
+        for number in range(count):
+            author, = self.rng.choices(authors, cum_weights=weights)
+            group = ''
+            if slugs and self.rng.random() < 0.7:
+                group, = self.rng.choices(slugs, cum_weights=group_weights)
+            image = ''
+            if images and self.rng.random() < options['image_share']:
+                image = self.rng.choice(images)
+            # Даты растут вместе с id, как у постов, созданных на сайте.
+            pub_date = self.now - span * (1 - (number + 1) / count)
+            yield {
+                'author': author,
+                'group': group,
+                'text': make_text(self.rng, 3, 120),
+                'pub_date': pub_date.isoformat(),
+                'image': image,
+            }
+
+    def comment_rows(self, usernames, first_pk, last_pk):
+        if last_pk < first_pk:
+            return
+        total = last_pk - first_pk + 1
+        for _ in range(self.options['comments']):
+            # Чаще комментируют свежие посты.
+            offset = int(total * self.rng.random() ** 4)
+            pk = last_pk - offset
+            created = self.now - timedelta(
+                days=self.options['days'] * offset / total
+            )
+            yield {
+                'post': pk,
+                'author': self.rng.choice(usernames),
+                'text': make_text(self.rng, 1, 30),
+                'created': created.isoformat(),
+            }
+
+    def follow_rows(self, usernames, authors, weights):
+        options = self.options
+        for user in usernames:
+            count = min(
+                options['max_follows'],
+                int(self.rng.paretovariate(options['follow_alpha'])),
+                len(authors) - 1,
+            )
+            # На популярных авторов подписываются чаще.
+            followed = set(self.rng.choices(
+                authors, cum_weights=weights, k=count
+            ))
+            followed.discard(user)
+            for author in followed:
+                yield {'user': user, 'author': author}
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Полнотекстовые индексы FTS5 есть только у SQLite, на других СУБД
+# поиск работает через icontains (см. posts/search.py).
+INDEXES = {
+    'posts_post_fts': 'posts_post',
+    'posts_comment_fts': 'posts_comment',
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for index, table in INDEXES.items():
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {index} USING fts5('
+            f"text, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {index} (rowid, text) SELECT id, text FROM {table}'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for index in INDEXES:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.6 on 2026-10-17 08:14
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('posts', '0007_image_metadata'),
+    ]
+
+    operations = [
+        # Хранилище не меняет схему, а SQLite иначе пересоздал бы
+        # таблицу постов целиком.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='post',
+                    name='image',
+                    field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+                ),
+            ],
+        ),
+    ]
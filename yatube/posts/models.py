@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -9,11 +11,42 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True)
     description = models.TextField()
+    posts_count = models.IntegerField(
+        'Количество постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self) -> str:
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    # Поля, которые выводятся в карточке поста в лентах.
+    FEED_FIELDS = (
+        'text',
+        'pub_date',
+        'updated',
+        'image',
+        'image_width',
+        'image_height',
+        'image_widths',
+        'author__username',
+        'author__first_name',
+        'author__last_name',
+        'group__title',
+        'group__slug',
+    )
+
+    def for_feed(self):
+        """Выборка для лент: автор и группа подтягиваются одним
+        запросом, загружаются только поля карточки.
+        """
+        return self.select_related('author', 'group').only(
+            *self.FEED_FIELDS
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
@@ -25,11 +58,18 @@ class Post(models.Model):
         auto_now_add=True,
         db_index=True,
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+    # Отдельные индексы по author и group не нужны: их заменяют
+    # составные индексы лент в Meta.indexes.
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='posts',
-        verbose_name='Автор'
+        verbose_name='Автор',
+        db_index=False,
     )
 
     group = models.ForeignKey(
@@ -39,24 +79,73 @@ class Post(models.Model):
         null=True,
         related_name='posts',
         verbose_name='Группа',
-        help_text='Выберите группу'
+        help_text='Выберите группу',
+        db_index=False,
     )
 
+    # Файлы по хешу содержимого: одинаковые картинки хранятся один раз,
+    # ссылки на них кешируются навсегда (core/storage.py).
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    # Заполняются при загрузке (posts/images.py). Не width_field и
+    # height_field: те при создании объекта открывают файл картинки,
+    # если размеры ещё не известны.
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, editable=False
+    )
+    image_widths = models.CharField(
+        'Ширины вариантов картинки',
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
+    )
+    comments_count = models.IntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Индексы совпадают с фильтром и порядком лент (-pub_date, -pk).
+        # SQLite дописывает rowid в конец индекса по возрастанию, поэтому
+        # поля тоже идут по возрастанию: индекс читается с конца без
+        # сортировки. Убывающий pub_date требовал бы досортировки по id.
+        indexes = [
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
 
+class CommentQuerySet(models.QuerySet):
+    def for_list(self):
+        """Комментарии вместе с авторами одним запросом."""
+        return self.select_related('author').only(
+            'post', 'text', 'created', 'author__username'
+        )
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -65,6 +154,7 @@ class Comment(models.Model):
         null=True,
         related_name='comments',
         verbose_name='Пост',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -82,8 +172,16 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -96,6 +194,7 @@ class Follow(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='following',
+        db_index=False,
     )
 
     class Meta:
@@ -105,3 +204,82 @@ class Follow(models.Model):
                 name='unique_follow'
             )
         ]
+        # Подписчики автора при раскладке поста по лентам читаются
+        # из индекса, без обращения к таблице.
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class UserCounters(models.Model):
+    """Счётчики пользователя, поддерживаемые сигналами.
+
+    Строка создаётся при первом чтении, до этого счётчики
+    не ведутся.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+    )
+    posts_count = models.IntegerField(default=0)
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+
+
+class TimelineQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Записи ленты вместе с карточками постов одним запросом."""
+        return self.select_related('post__author', 'post__group').only(
+            'pub_date',
+            'post',
+            *(f'post__{field}' for field in PostQuerySet.FEED_FIELDS)
+        )
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок: пост автора, на которого подписан user.
+
+    Ленты заполняются при публикации поста (fan-out on write), поэтому
+    страница подписок читается одним диапазоном по индексу.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    objects = TimelineQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx'
+            ),
+        ]
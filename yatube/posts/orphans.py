@@ -0,0 +1,258 @@
+"""Сборка мусора в картинках постов и их миниатюрах.
+
+Картинка остаётся на диске после замены в ``post_edit`` или удаления
+поста, если на неё не ведёт счётчик ссылок хранилища (файлы, загруженные
+до ``core.storage``) или счётчик разошёлся с базой. Вместе с картинкой
+остаются её миниатюры sorl-thumbnail и их записи в хранилище ключей.
+
+Сборщик проходит посты пачками и складывает имена картинок и их
+вариантов в фильтр Блума, затем по хранилищу ключей sorl отбирает
+миниатюры картинок, на которые ссылаются посты, и обходит каталоги
+``posts/`` и миниатюр. Всё, чего нет в фильтрах, удаляется. Ошибка
+фильтра только оставляет лишний файл до следующего запуска.
+
+Файлы моложе ``min_age`` секунд не трогаются: их могли загрузить после
+начала обхода. Файлы по хешу удаляются через ``discard``, который
+оставляет файл, если ссылки на него менялись в том же окне — например,
+старую картинку только что загрузили снова.
+"""
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from core.bloom import BloomFilter
+from core.models import StoredFile
+from core.storage import ADDRESSED, is_addressed
+
+from . import images
+from .models import Post
+
+IMAGE_DIRECTORY = 'posts'
+
+
+def _key(name):
+    # Файл по хешу учитывается по хешу: так в фильтр попадают сразу
+    # все его варианты.
+    match = ADDRESSED.search(name)
+    return match.group('digest') if match else name
+
+
+def walk(storage, directory):
+    """Файлы каталога хранилища: ``(имя, размер, время изменения)``."""
+    stack = [storage.path(directory)]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    # Файл удалили во время обхода, например вместе с
+                    # исходным.
+                    continue
+                name = os.path.relpath(entry.path, storage.location)
+                yield name.replace(os.sep, '/'), stat.st_size, stat.st_mtime
+
+
+class RateLimiter:
+    """Не больше ``rate`` вызовов ``wait`` в секунду на все потоки;
+    0 — без ограничения.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            moment = max(now, self.next)
+            self.next = moment + self.interval
+        time.sleep(moment - now)
+
+
+class Collector:
+    def __init__(self, dry_run=False, workers=4, rate=0,
+                 min_age=None, chunk_size=1000):
+        self.dry_run = dry_run
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.min_age = (
+            settings.MEDIA_GC_MIN_AGE if min_age is None else min_age
+        )
+        self.chunk_size = chunk_size
+        self.storage = Post._meta.get_field('image').storage
+        self.thumbnail_storage = default.storage
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    def collect(self):
+        """Удаляет лишние файлы и возвращает счётчики: ``images``,
+        ``thumbnails``, ``kvstore`` (записей) и ``bytes``.
+        """
+        self.started = time.time()
+        # Граница «свежести» для ссылок — то же окно, что для mtime.
+        self.fresh_since = timezone.now() - timedelta(seconds=self.min_age)
+        self.referenced, count = self.scan_posts()
+        self.thumbnails = self.scan_kvstore(count)
+        tasks = chain(self.image_orphans(), self.thumbnail_orphans())
+        if self.workers > 1:
+            self.remove_in_threads(tasks)
+        else:
+            for task in tasks:
+                self.remove(task)
+        return self.stats
+
+    def scan_posts(self):
+        """Фильтр с картинками постов и их вариантами."""
+        posts = Post.objects.exclude(image='').order_by('pk').only(
+            'pk', 'image', 'image_width', 'image_widths'
+        )
+        count = posts.count()
+        referenced = BloomFilter(
+            count * (2 + 2 * len(settings.POST_IMAGE_WIDTHS))
+        )
+        last_pk = 0
+        while True:
+            chunk = list(posts.filter(pk__gt=last_pk)[:self.chunk_size])
+            if not chunk:
+                return referenced, count
+            last_pk = chunk[-1].pk
+            for post in chunk:
+                referenced.add(_key(post.image.name))
+                for name in images.variant_files(post):
+                    referenced.add(_key(name))
+
+    def is_recent(self, mtime):
+        return mtime > self.started - self.min_age
+
+    def is_orphan_source(self, name):
+        if _key(name) in self.referenced:
+            return False
+        try:
+            mtime = os.path.getmtime(self.storage.path(name))
+        except OSError:
+            return True
+        if self.is_recent(mtime):
+            return False
+        return not (is_addressed(name) and StoredFile.objects.filter(
+            name=name, updated__gte=self.fresh_since
+        ).exists())
+
+    def scan_kvstore(self, count):
+        """Фильтр с миниатюрами картинок постов. Записи миниатюр
+        картинок без постов удаляются из хранилища ключей, сами файлы
+        миниатюр — при обходе каталога.
+        """
+        kvstore = default.kvstore
+        thumbnails = BloomFilter(count * len(settings.POST_THUMBNAIL_SIZES))
+        for key in list(kvstore._find_keys(identity='thumbnails')):
+            source = kvstore._get(key)
+            thumbnail_keys = kvstore._get(key, identity='thumbnails') or []
+            if source is not None and not self.is_orphan_source(source.name):
+                for thumbnail_key in thumbnail_keys:
+                    thumbnail = kvstore._get(thumbnail_key)
+                    if thumbnail is not None:
+                        thumbnails.add(thumbnail.name)
+                continue
+            self.stats['kvstore'] += len(thumbnail_keys) + 2
+            if self.dry_run:
+                continue
+            for thumbnail_key in thumbnail_keys:
+                kvstore._delete(thumbnail_key)
+            kvstore._delete(key, identity='thumbnails')
+            kvstore._delete(key)
+        return thumbnails
+
+    def image_orphans(self):
+        discarded = set()
+        for name, size, mtime in walk(self.storage, IMAGE_DIRECTORY):
+            key = _key(name)
+            if self.is_recent(mtime) or key in self.referenced:
+                continue
+            if not is_addressed(name):
+                yield self.delete_image, name, size
+            elif key not in discarded:
+                # Файл по хешу удаляется с исходным и всеми вариантами.
+                discarded.add(key)
+                yield self.discard_image, name, size
+
+    def thumbnail_orphans(self):
+        prefix = sorl_settings.THUMBNAIL_PREFIX.rstrip('/')
+        for name, size, mtime in walk(self.thumbnail_storage, prefix):
+            if not self.is_recent(mtime) and name not in self.thumbnails:
+                yield self.delete_thumbnail, name, size
+
+    def delete_image(self, name, size):
+        if not self.dry_run:
+            self.storage.delete(name)
+        return 'images', size
+
+    def discard_image(self, name, size):
+        family = self.storage.family(name)
+        size = sum(self.storage.size(path) for path in family)
+        if self.dry_run:
+            return 'images', size
+        if not self.storage.discard(name, self.fresh_since):
+            return None
+        return 'images', size
+
+    def delete_thumbnail(self, name, size):
+        if not self.dry_run:
+            self.thumbnail_storage.delete(name)
+        return 'thumbnails', size
+
+    def remove(self, task):
+        self.limiter.wait()
+        method, name, size = task
+        try:
+            result = method(name, size)
+        except FileNotFoundError:
+            # Файл уже удалён вместе с исходным или другим процессом.
+            return
+        if result is None:
+            return
+        kind, size = result
+        with self.lock:
+            self.stats[kind] += 1
+            self.stats['bytes'] += size
+
+    def remove_in_threads(self, tasks):
+        """Потоки разбирают общий генератор задач; каждый закрывает своё
+        соединение с базой один раз, когда задачи кончились.
+        """
+        lock = threading.Lock()
+
+        def work():
+            try:
+                while True:
+                    with lock:
+                        task = next(tasks, None)
+                    if task is None:
+                        return
+                    self.remove(task)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(work) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
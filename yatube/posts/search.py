@@ -0,0 +1,192 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+На SQLite поиск идёт по виртуальным таблицам FTS5 (см. миграцию
+0005_search), которые сигналы поддерживают в актуальном состоянии.
+Результаты ранжируются по bm25 среди всех совпадений и листаются
+курсором по (rank, id). Для частых слов подсчёт bm25 по всем документам
+дороже, зато релевантный старый пост не теряется за новыми.
+На других СУБД используется обычный ``icontains``.
+"""
+import base64
+import json
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import Comment, Post
+from .utils import POSTS_PER_PAGE, CursorPage
+
+INDEXES = {
+    Post: 'posts_post_fts',
+    Comment: 'posts_comment_fts',
+}
+
+TERM_RE = re.compile(r'\w+')
+
+# Префиксный поиск по слишком коротким словам перебирает почти весь
+# словарь индекса.
+PREFIX_MIN_LENGTH = 3
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_query(query):
+    """Превращает пользовательский ввод в безопасный запрос FTS5:
+    все слова обязательны, последнее (если оно не слишком короткое)
+    ищется по префиксу.
+    """
+    terms = TERM_RE.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    if len(terms[-1]) >= PREFIX_MIN_LENGTH:
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def index(model, pk, text):
+    if not is_available():
+        return
+    table = INDEXES[model]
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [pk])
+        cursor.execute(
+            f'INSERT INTO {table} (rowid, text) VALUES (%s, %s)', [pk, text]
+        )
+
+
+def unindex(model, pk):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEXES[model]} WHERE rowid = %s', [pk])
+
+
+def reindex(model, chunk_size=10000, after_pk=0):
+    """Перестраивает индекс модели порциями по диапазонам id.
+
+    С ``after_pk`` индексируются только строки с большим id, например
+    добавленные массовым импортом.
+    """
+    if not is_available():
+        return 0
+    table = INDEXES[model]
+    source = model._meta.db_table
+    indexed = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid > %s', [after_pk])
+        last_pk = after_pk
+        while True:
+            cursor.execute(
+                f'SELECT MAX(id), COUNT(*) FROM (SELECT id FROM {source} '
+                f'WHERE id > %s ORDER BY id LIMIT %s)',
+                [last_pk, chunk_size],
+            )
+            max_pk, count = cursor.fetchone()
+            if not count:
+                break
+            with transaction.atomic():
+                cursor.execute(
+                    f'INSERT INTO {table} (rowid, text) SELECT id, text '
+                    f'FROM {source} WHERE id > %s AND id <= %s',
+                    [last_pk, max_pk],
+                )
+            indexed += count
+            last_pk = max_pk
+        cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+    return indexed
+
+
+def filter_queryset(queryset, query):
+    """Отбирает объекты, подходящие под запрос (для админки)."""
+    model = queryset.model
+    if not is_available():
+        return queryset.filter(text__icontains=query)
+    fts_query = match_query(query)
+    if fts_query is None:
+        return queryset.none()
+    table = INDEXES[model]
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [fts_query]
+    ))
+
+
+class SearchPaginator:
+    """Курсорный пагинатор результатов поиска по (rank, id)."""
+
+    def __init__(self, query, per_page):
+        self.query = query
+        self.per_page = per_page
+
+    def encode_cursor(self, post, forward):
+        payload = json.dumps([int(forward), post.search_rank, post.pk])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            forward, rank, pk = json.loads(
+                base64.urlsafe_b64decode(cursor.encode())
+            )
+            return bool(forward), float(rank), int(pk)
+        except (TypeError, ValueError):
+            return None
+
+    def _matches(self, fts_query, decoded):
+        table = INDEXES[Post]
+        sql = (
+            f'SELECT id, score FROM (SELECT rowid AS id, rank AS score '
+            f'FROM {table} WHERE {table} MATCH %s)'
+        )
+        params = [fts_query]
+        forward = True
+        if decoded is not None:
+            forward, rank, pk = decoded
+            op = '>' if forward else '<'
+            sql += f' WHERE score {op} %s OR (score = %s AND id {op} %s)'
+            params += [rank, rank, pk]
+        order = '' if forward else ' DESC'
+        sql += f' ORDER BY score{order}, id{order} LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        return forward, rows
+
+    def _fallback_page(self):
+        posts = list(
+            Post.objects.for_feed().filter(
+                text__icontains=self.query
+            ).order_by('-pub_date', '-pk')[:self.per_page]
+        )
+        return CursorPage(posts, self, False, False)
+
+    def get_page(self, cursor=None):
+        if not is_available():
+            return self._fallback_page()
+        fts_query = match_query(self.query)
+        if fts_query is None:
+            return CursorPage([], self, False, False)
+        decoded = self.decode_cursor(cursor) if cursor else None
+        forward, rows = self._matches(fts_query, decoded)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        posts = Post.objects.for_feed().in_bulk([pk for pk, _ in rows])
+        results = []
+        for pk, rank in rows:
+            post = posts.get(pk)
+            if post is not None:
+                post.search_rank = rank
+                results.append(post)
+        if forward:
+            return CursorPage(results, self, has_more, decoded is not None)
+        return CursorPage(results, self, True, has_more)
+
+
+def search_pagination(query, cursor=None):
+    """Страница результатов поиска постов по запросу ``query``."""
+    return SearchPaginator(query, POSTS_PER_PAGE).get_page(cursor)
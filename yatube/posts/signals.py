@@ -0,0 +1,252 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.storage import is_original
+
+from . import (caching, counters, follows, search, tasks, thumbnails,
+               timeline)
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    # Пост может переехать в другую группу или сменить картинку:
+    # запоминаем прежние значения.
+    instance._previous_group_id = None
+    instance._previous_image = None
+    if instance.pk is not None:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image'
+        ).first()
+        if previous is not None:
+            instance._previous_group_id, instance._previous_image = previous
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    caching.bump(
+        caching.INDEX_SCOPE,
+        *caching.group_scopes(instance.group_id, previous_group_id),
+        *caching.profile_scopes(instance.author_id),
+    )
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_pages(sender, instance, **kwargs):
+    caching.bump(
+        caching.INDEX_SCOPE,
+        *caching.group_scopes(instance.group_id),
+        *caching.profile_scopes(instance.author_id),
+    )
+
+
+def _touch_posts(**filters):
+    # Смена updated сбрасывает закешированные карточки постов.
+    Post.objects.filter(**filters).update(updated=timezone.now())
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_names(sender, instance, **kwargs):
+    instance._previous_names = None
+    if instance.pk is not None:
+        instance._previous_names = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', 'title').first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    # Название группы выводится в карточках постов на всех лентах.
+    # При удалении работаем до SET_NULL, пока посты ещё в группе.
+    previous_names = getattr(instance, '_previous_names', None)
+    if previous_names == (instance.slug, instance.title):
+        # Описание выводится только на странице самой группы.
+        caching.bump(caching.group_scope(instance.slug))
+        return
+    scopes = [caching.INDEX_SCOPE, caching.group_scope(instance.slug)]
+    if previous_names:
+        scopes.append(caching.group_scope(previous_names[0]))
+    author_ids = Post.objects.filter(group_id=instance.pk).values_list(
+        'author_id', flat=True
+    ).distinct()
+    caching.bump(*scopes, *caching.profile_scopes(*author_ids))
+    _touch_posts(group_id=instance.pk)
+
+
+# При входе обновляется только last_login.
+LOGIN_UPDATE = frozenset(['last_login'])
+
+
+def _card_names(user):
+    return user.username, user.first_name, user.last_name
+
+
+@receiver(pre_save, sender=User)
+def remember_author_names(sender, instance, update_fields, **kwargs):
+    instance._previous_names = None
+    if instance.pk is not None and update_fields != LOGIN_UPDATE:
+        instance._previous_names = User.objects.filter(
+            pk=instance.pk
+        ).values_list('username', 'first_name', 'last_name').first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_pages(sender, instance, created, update_fields,
+                            **kwargs):
+    # Карточки зависят только от имени автора: вход или смена пароля
+    # их не затрагивают.
+    previous_names = getattr(instance, '_previous_names', None)
+    if (created or update_fields == LOGIN_UPDATE
+            or previous_names == _card_names(instance)):
+        return
+    scopes = [caching.INDEX_SCOPE, caching.profile_scope(instance.username)]
+    if previous_names:
+        scopes.append(caching.profile_scope(previous_names[0]))
+    group_ids = Post.objects.filter(author_id=instance.pk).values_list(
+        'group_id', flat=True
+    ).distinct()
+    caching.bump(*scopes, *caching.group_scopes(*group_ids))
+    _touch_posts(author_id=instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_author_pages(sender, instance, **kwargs):
+    caching.bump(
+        caching.INDEX_SCOPE,
+        caching.profile_scope(instance.username),
+    )
+
+
+@receiver(post_save, sender=Post)
+def generate_thumbnails(sender, instance, created, **kwargs):
+    previous_image = getattr(instance, '_previous_image', None)
+    if instance.image and instance.image.name != previous_image:
+        tasks.enqueue(thumbnails.generate, instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def retain_saved_image(sender, instance, created, **kwargs):
+    # Хранилище не считает ссылку при записи файла: она появляется в
+    # транзакции сохранения поста и откатывается вместе с ним.
+    previous_image = getattr(instance, '_previous_image', None)
+    name = instance.image.name
+    if name and name != previous_image and is_original(name):
+        instance.image.storage.retain(name)
+
+
+def release_image(name):
+    # Ссылка снимается после фиксации: при откате пост по-прежнему
+    # ссылается на файл.
+    storage = Post._meta.get_field('image').storage
+    transaction.on_commit(lambda: storage.release(name))
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, created, **kwargs):
+    previous_image = getattr(instance, '_previous_image', None)
+    if previous_image and previous_image != instance.image.name:
+        release_image(previous_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        tasks.enqueue(timeline.fan_out, instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        tasks.enqueue(timeline.backfill, instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline(sender, instance, **kwargs):
+    tasks.enqueue(timeline.remove, instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_profiles(sender, instance, **kwargs):
+    # В профилях выводятся число подписчиков и подписок.
+    caching.bump(
+        *caching.profile_scopes(instance.user_id, instance.author_id)
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_following(sender, instance, **kwargs):
+    follows.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, 'posts_count', 1)
+        counters.change(Group, instance.group_id, 'posts_count', 1)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        counters.change(Group, previous_group_id, 'posts_count', -1)
+        counters.change(Group, instance.group_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'posts_count', -1)
+    counters.change(Group, instance.group_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments_page(sender, instance, **kwargs):
+    caching.bump(caching.comments_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change(Post, instance.post_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change(Post, instance.post_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.user_id, 'following_count', 1)
+        counters.change_user(instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user(instance.user_id, 'following_count', -1)
+    counters.change_user(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def index_text(sender, instance, **kwargs):
+    # Индекс обновляется в той же транзакции, что и сама запись.
+    search.index(sender, instance.pk, instance.text)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def unindex_text(sender, instance, **kwargs):
+    search.unindex(sender, instance.pk)
@@ -0,0 +1,49 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POSTS_TASK_WORKERS,
+            thread_name_prefix='posts-task',
+        )
+    return _executor
+
+
+def _call(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась с ошибкой', func)
+
+
+def _run(func, args, kwargs):
+    try:
+        _call(func, args, kwargs)
+    finally:
+        # У каждого потока своё соединение с базой, не копим их.
+        connection.close()
+
+
+def enqueue(func, *args, **kwargs):
+    """Выполняет ``func`` в фоновом потоке после фиксации транзакции.
+
+    При ``POSTS_TASKS_EAGER`` задача выполняется после фиксации в этом
+    же потоке, это удобно в тестах. Ошибка задачи в обоих случаях
+    только пишется в лог и не доходит до вызывающего кода.
+    """
+    if settings.POSTS_TASKS_EAGER:
+        transaction.on_commit(lambda: _call(func, args, kwargs))
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run, func, args, kwargs)
+    )
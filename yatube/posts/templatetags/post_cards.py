@@ -0,0 +1,47 @@
+from django import template
+
+from posts import follows, images, thumbnails
+from posts.caching import render_post_cards
+
+register = template.Library()
+
+# Ширина картинки на странице: колонка col-md-9 или весь экран.
+IMAGE_SIZES = '(min-width: 768px) 75vw, 100vw'
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    request = context.get('request')
+    following = follows.NOBODY
+    if request is not None:
+        following = follows.following_for(request)
+    return render_post_cards(posts, following=following)
+
+
+def srcset(variants):
+    return ', '.join(f'{url} {width}w' for url, width in variants)
+
+
+@register.inclusion_tag('posts/includes/thumbnail.html')
+def post_thumbnail(image, size='card'):
+    """Картинка поста с вариантами из ``posts.images``; для картинок,
+    загруженных до их появления, — готовая миниатюра или заглушка.
+
+    Размеры и ссылки берутся из полей поста, файлы не открываются.
+    """
+    post = getattr(image, 'instance', None)
+    sources = images.sources(post) if post is not None else {}
+    if sources:
+        return {
+            'image': image,
+            'post': post,
+            'sizes': IMAGE_SIZES,
+            'webp_srcset': srcset(sources['webp']),
+            'jpeg_srcset': srcset(sources['jpeg']),
+            # Для браузеров без srcset — средний вариант.
+            'src': sources['jpeg'][len(sources['jpeg']) // 2][0],
+        }
+    return {
+        'image': image,
+        'thumbnail': thumbnails.get_existing(image, size),
+    }
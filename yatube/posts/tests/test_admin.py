@@ -0,0 +1,115 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import admin as posts_admin
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        cls.follow = Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, params=None):
+        url = reverse(f'admin:posts_{model}_changelist')
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['cl'].result_list)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        return len(context)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Число запросов списка не зависит от числа строк на странице."""
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                url = reverse(f'admin:posts_{model}_changelist')
+                before = self.count_queries(url)
+                for number in range(5):
+                    user = User.objects.create_user(
+                        username=f'{model}{number}'
+                    )
+                    post = Post.objects.create(
+                        author=user, text='Ещё', group=self.group
+                    )
+                    Comment.objects.create(post=post, author=user, text='Ещё')
+                    Follow.objects.create(user=user, author=self.author)
+                self.assertEqual(self.count_queries(url), before + 5 * (
+                    # Виджет выбранной группы в list_editable.
+                    model == 'post'
+                ))
+
+    def test_input_filters(self):
+        """Фильтры по внешним ключам принимают значение из поля ввода."""
+        other = Post.objects.create(author=self.reader, text='Другой')
+        self.assertEqual(
+            self.changelist('post', {'author': 'reader'}), [other]
+        )
+        self.assertEqual(
+            self.changelist('comment', {'post': self.post.pk}),
+            [self.comment]
+        )
+        self.assertEqual(self.changelist('comment', {'post': 'abc'}), [])
+        self.assertEqual(
+            self.changelist('follow', {'user': 'reader'}), [self.follow]
+        )
+
+    def test_follow_search_by_username(self):
+        """Подписки ищутся по точному имени пользователя."""
+        self.assertEqual(
+            self.changelist('follow', {'q': 'author'}), [self.follow]
+        )
+        self.assertEqual(self.changelist('follow', {'q': 'auth'}), [])
+
+    def test_estimated_count(self):
+        """Для большой таблицы число строк берётся из статистики."""
+        paginator = posts_admin.EstimatedCountPaginator(
+            Post.objects.all(), 10
+        )
+        with mock.patch.object(
+            posts_admin, 'estimate_table_rows', return_value=10 ** 6
+        ):
+            self.assertEqual(paginator.count, 10 ** 6)
+
+        Post.objects.create(author=self.author, text='Ещё пост')
+        paginator = posts_admin.EstimatedCountPaginator(
+            Post.objects.filter(author=self.author), 10
+        )
+        with mock.patch.object(posts_admin, 'EXACT_COUNT_LIMIT', 1):
+            self.assertEqual(paginator.count, 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(
+            posts_admin.estimate_table_rows(Post, 'default'),
+            Post.objects.count()
+        )
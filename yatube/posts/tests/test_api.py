@@ -0,0 +1,204 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import run_on_commit
+from posts.utils import POSTS_PER_PAGE
+
+User = get_user_model()
+
+
+@override_settings(POSTS_TASKS_EAGER=True)
+class FeedApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        with run_on_commit():
+            cls.posts = [
+                Post.objects.create(
+                    author=cls.author,
+                    text=f'Пост {number}',
+                    group=cls.group,
+                )
+                for number in range(POSTS_PER_PAGE + 3)
+            ]
+            Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.index_url = reverse('posts:api_index')
+        cls.group_url = reverse(
+            'posts:api_group_posts', kwargs={'slug': cls.group.slug}
+        )
+        cls.profile_url = reverse(
+            'posts:api_profile', kwargs={'username': cls.author.username}
+        )
+        cls.follow_url = reverse('posts:api_follow_index')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def test_feeds_page_by_cursor(self):
+        """Ленты отдаются страницами с курсором на следующую."""
+        clients = (
+            (self.guest_client, self.index_url),
+            (self.guest_client, self.group_url),
+            (self.guest_client, self.profile_url),
+            (self.reader_client, self.follow_url),
+        )
+        newest = [post.pk for post in reversed(self.posts)]
+        for client, url in clients:
+            with self.subTest(url=url):
+                data = client.get(url).json()
+                self.assertEqual(
+                    [card['id'] for card in data['results']],
+                    newest[:POSTS_PER_PAGE]
+                )
+                self.assertIsNone(data['previous'])
+                data = client.get(url, {'cursor': data['next']}).json()
+                self.assertEqual(
+                    [card['id'] for card in data['results']],
+                    newest[POSTS_PER_PAGE:]
+                )
+                self.assertIsNone(data['next'])
+
+    def test_card_contents(self):
+        card = self.guest_client.get(self.index_url).json()['results'][0]
+        self.assertEqual(card['text'], self.posts[-1].text)
+        self.assertEqual(
+            card['author'],
+            {'id': self.author.pk, 'username': 'author', 'name': 'Лев Толстой'}
+        )
+        self.assertEqual(card['group'], {'slug': 'group', 'title': 'Группа'})
+        self.assertIsNone(card['image'])
+        self.assertEqual(card['thumbnails'], {})
+
+    def test_image_urls_are_absolute(self):
+        """Ссылка на картинку абсолютная, миниатюры пока нет."""
+        Post.objects.filter(pk=self.posts[-1].pk).update(
+            image='posts/cat.gif'
+        )
+        card = self.guest_client.get(self.index_url).json()['results'][0]
+        self.assertEqual(
+            card['image'], 'http://testserver/media/posts/cat.gif'
+        )
+        self.assertEqual(card['thumbnails'], {'card': None})
+
+    def test_cached_feed_keeps_links_of_each_host(self):
+        """Закешированная страница не отдаёт ссылки другого хоста
+        или схемы.
+        """
+        Post.objects.filter(pk=self.posts[-1].pk).update(
+            image='posts/cat.gif'
+        )
+        for extra, origin in (
+            ({}, 'http://testserver'),
+            ({'HTTP_HOST': 'localhost'}, 'http://localhost'),
+            ({'secure': True}, 'https://testserver'),
+        ):
+            with self.subTest(**extra):
+                response = self.guest_client.get(self.index_url, **extra)
+                self.assertEqual(
+                    response.json()['results'][0]['image'],
+                    f'{origin}/media/posts/cat.gif',
+                )
+
+    def test_field_selection(self):
+        """Параметр fields оставляет только запрошенные поля."""
+        response = self.guest_client.get(
+            self.index_url, {'fields': 'id,text'}
+        )
+        for card in response.json()['results']:
+            self.assertEqual(set(card), {'id', 'text'})
+        response = self.guest_client.get(
+            self.index_url, {'fields': 'id,password'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+
+    def test_anonymous_feed_is_cached_with_html_rules(self):
+        """Анонимный ответ кешируется и сбрасывается новым постом."""
+        self.guest_client.get(self.index_url)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(self.index_url)
+        self.assertEqual(response.status_code, 200)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        data = self.guest_client.get(self.index_url).json()
+        self.assertEqual(data['results'][0]['id'], post.pk)
+
+    def test_etag_revalidation(self):
+        """Неизменившаяся лента отвечает 304, после изменения — 200."""
+        etag = self.guest_client.get(self.group_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(
+                self.group_url, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        self.group.description = 'Новое описание'
+        self.group.save()
+        response = self.guest_client.get(
+            self.group_url, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(
+            response.json()['group']['description'], 'Новое описание'
+        )
+
+    def test_follow_feed(self):
+        """Лента подписок требует входа и сверяется по содержимому."""
+        response = self.guest_client.get(self.follow_url)
+        self.assertEqual(response.status_code, 401)
+        response = self.reader_client.get(self.follow_url)
+        self.assertIn('private', response['Cache-Control'])
+        response = self.reader_client.get(
+            self.follow_url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_profile_following(self):
+        data = self.guest_client.get(self.profile_url).json()
+        self.assertEqual(data['author']['posts_count'], len(self.posts))
+        self.assertNotIn('following', data['author'])
+        data = self.reader_client.get(self.profile_url).json()
+        self.assertTrue(data['author']['following'])
+
+    def test_post_view_and_comments(self):
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.reader, text='Ого')
+        url = reverse('posts:api_post', kwargs={'post_id': post.pk})
+        response = self.guest_client.get(url)
+        data = response.json()
+        self.assertEqual(data['id'], post.pk)
+        self.assertEqual(data['comments_count'], 1)
+        self.assertEqual(data['comments']['results'][0]['text'], 'Ого')
+        response = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+        comments = self.guest_client.get(
+            reverse('posts:api_post_comments', kwargs={'post_id': post.pk})
+        ).json()
+        self.assertEqual(len(comments['results']), 1)
+
+    def test_missing_objects(self):
+        urls = (
+            reverse('posts:api_post', kwargs={'post_id': 0}),
+            reverse('posts:api_post_comments', kwargs={'post_id': 0}),
+            reverse('posts:api_group_posts', kwargs={'slug': 'missing'}),
+            reverse('posts:api_profile', kwargs={'username': 'missing'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('detail', response.json())
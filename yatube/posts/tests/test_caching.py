@@ -0,0 +1,346 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from posts import caching
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other_author = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-group',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Пост в группе',
+            group=cls.group,
+        )
+        cls.group_url = reverse(
+            'posts:group_posts',
+            kwargs={'slug': cls.group.slug}
+        )
+        cls.other_group_url = reverse(
+            'posts:group_posts',
+            kwargs={'slug': cls.other_group.slug}
+        )
+        cls.profile_url = reverse(
+            'posts:profile',
+            kwargs={'username': cls.author.username}
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def versions(self):
+        return {
+            scope: caching.get_version(scope)
+            for scope in (
+                caching.INDEX_SCOPE,
+                caching.group_scope(self.group.slug),
+                caching.group_scope(self.other_group.slug),
+                caching.profile_scope(self.author.username),
+                caching.profile_scope(self.other_author.username),
+            )
+        }
+
+    def test_post_busts_only_pages_it_appears_on(self):
+        """Новый пост сбрасывает главную, свою группу и профиль автора,
+        но не чужие группы и профили.
+        """
+        before = self.versions()
+        Post.objects.create(
+            author=self.author,
+            text='Ещё пост',
+            group=self.group,
+        )
+        after = self.versions()
+        changed = {scope for scope in before if before[scope] != after[scope]}
+        self.assertEqual(
+            changed,
+            {
+                caching.INDEX_SCOPE,
+                caching.group_scope(self.group.slug),
+                caching.profile_scope(self.author.username),
+            }
+        )
+
+    def test_moving_post_busts_both_groups(self):
+        """Перенос поста в другую группу сбрасывает обе группы."""
+        self.guest_client.get(self.group_url)
+        self.guest_client.get(self.other_group_url)
+
+        self.post.group = self.other_group
+        self.post.save()
+
+        old_group_page = self.guest_client.get(self.group_url)
+        new_group_page = self.guest_client.get(self.other_group_url)
+        self.assertEqual(len(old_group_page.context['page_obj']), 0)
+        self.assertEqual(
+            list(new_group_page.context['page_obj']),
+            [self.post]
+        )
+
+    def test_group_rename_busts_author_profile(self):
+        """Переименование группы обновляет профиль автора её постов."""
+        self.guest_client.get(self.profile_url)
+        self.group.title = 'Новое название'
+        self.group.save()
+        response = self.guest_client.get(self.profile_url)
+        self.assertContains(response, 'Новое название')
+
+    def test_authorized_user_is_not_served_from_cache(self):
+        """Страницы авторизованных пользователей не кешируются."""
+        client = Client()
+        client.force_login(self.other_author)
+        client.get(self.profile_url)
+        response = client.get(self.profile_url)
+        self.assertIsNotNone(response.context)
+
+
+class FeedCacheCommitTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.request = RequestFactory().get(reverse('posts:index'))
+
+    def test_page_read_before_commit_is_not_served(self):
+        """Страница, собранная параллельным запросом между записью и
+        фиксацией, после фиксации уже не находится в кеше.
+        """
+        with transaction.atomic():
+            Post.objects.create(author=self.author, text='Новый пост')
+            # Так ключ страницы видит запрос, которому пост ещё не виден.
+            stale_key = caching.page_key(caching.INDEX_SCOPE, self.request)
+            cache.set(stale_key, 'прежняя страница')
+        self.assertNotEqual(
+            caching.page_key(caching.INDEX_SCOPE, self.request), stale_key
+        )
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+
+
+class PostCardCacheTests(TestCase):
+    card_template = 'posts/includes/post_card.html'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Классика',
+            slug='classic',
+            description='Описание',
+        )
+        Post.objects.create(author=cls.author, text='Пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def cards(self):
+        return caching.render_post_cards(Post.objects.for_feed())
+
+    def test_cards_are_rendered_once(self):
+        """Повторная выдача карточек не рендерит шаблон."""
+        html = self.cards()
+        with self.assertTemplateNotUsed(self.card_template):
+            self.assertEqual(self.cards(), html)
+
+    def test_post_edit_invalidates_card(self):
+        """Правка поста меняет его карточку."""
+        self.cards()
+        post = Post.objects.get()
+        post.text = 'Исправленный пост'
+        post.save()
+        with self.assertTemplateUsed(self.card_template):
+            self.assertIn('Исправленный пост', self.cards())
+
+    def test_group_and_author_renames_invalidate_cards(self):
+        """Переименование группы или автора меняет карточки."""
+        self.cards()
+        self.group.title = 'Новая классика'
+        self.group.save()
+        self.assertIn('Новая классика', self.cards())
+
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Алексей'
+        author.save()
+        self.assertIn('Алексей Толстой', self.cards())
+
+    def test_login_does_not_invalidate_cards(self):
+        """Вход пользователя не сбрасывает кеш карточек."""
+        self.cards()
+        author = User.objects.get(pk=self.author.pk)
+        author.set_password('password')
+        author.save()
+        self.client.login(username='author', password='password')
+        with self.assertTemplateNotUsed(self.card_template):
+            self.cards()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Пост',
+            group=cls.group,
+        )
+        cls.index_url = reverse('posts:index')
+        cls.group_url = reverse(
+            'posts:group_posts',
+            kwargs={'slug': cls.group.slug}
+        )
+        cls.profile_url = reverse(
+            'posts:profile',
+            kwargs={'username': cls.author.username}
+        )
+        cls.post_url = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': cls.post.pk}
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def revalidate(self, client, url, etag):
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_page_is_not_modified(self):
+        """Неизменившаяся страница отдаётся ответом 304 без запросов
+        к базе.
+        """
+        for url in (self.index_url, self.group_url, self.profile_url):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Last-Modified', response)
+                self.assertIn('no-cache', response['Cache-Control'])
+                with self.assertNumQueries(0):
+                    response = self.revalidate(
+                        self.guest_client, url, response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_new_post_changes_etag(self):
+        """Новый пост меняет ETag лент, в которых он выводится."""
+        etags = {
+            url: self.guest_client.get(url)['ETag']
+            for url in (self.index_url, self.group_url, self.profile_url)
+        }
+        Post.objects.create(author=self.author, text='Ещё пост')
+        self.assertEqual(
+            self.revalidate(
+                self.guest_client, self.index_url, etags[self.index_url]
+            ).status_code,
+            200
+        )
+        self.assertEqual(
+            self.revalidate(
+                self.guest_client, self.profile_url, etags[self.profile_url]
+            ).status_code,
+            200
+        )
+        self.assertEqual(
+            self.revalidate(
+                self.guest_client, self.group_url, etags[self.group_url]
+            ).status_code,
+            304
+        )
+
+    def test_etag_depends_on_user(self):
+        """У авторизованного пользователя свой ETag и приватный кеш."""
+        guest_etag = self.guest_client.get(self.index_url)['ETag']
+        response = self.reader_client.get(self.index_url)
+        self.assertNotEqual(response['ETag'], guest_etag)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(
+            self.revalidate(
+                self.reader_client, self.index_url, response['ETag']
+            ).status_code,
+            304
+        )
+        self.assertEqual(
+            self.revalidate(
+                self.guest_client, self.index_url, response['ETag']
+            ).status_code,
+            200
+        )
+
+    def test_follow_changes_profile_etag(self):
+        """Подписка меняет ETag профиля автора."""
+        etag = self.reader_client.get(self.profile_url)['ETag']
+        self.reader_client.get(
+            reverse(
+                'posts:profile_follow',
+                kwargs={'username': self.author.username}
+            )
+        )
+        response = self.revalidate(self.reader_client, self.profile_url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['following'])
+
+    def test_group_description_change_busts_group_page(self):
+        """Правка описания группы обновляет её страницу."""
+        etag = self.guest_client.get(self.group_url)['ETag']
+        self.group.description = 'Новое описание'
+        self.group.save()
+        response = self.revalidate(self.guest_client, self.group_url, etag)
+        self.assertContains(response, 'Новое описание')
+
+    def test_post_page_revalidation(self):
+        """Страница поста обновляется после комментария и правки."""
+        etag = self.reader_client.get(self.post_url)['ETag']
+        # Сессия, пользователь и сам пост.
+        with self.assertNumQueries(3):
+            response = self.revalidate(self.reader_client, self.post_url, etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'}
+        )
+        response = self.revalidate(self.reader_client, self.post_url, etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        response = self.revalidate(self.reader_client, self.post_url, etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_post_is_not_found(self):
+        """Для несуществующего поста валидаторов нет, ответ — 404."""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
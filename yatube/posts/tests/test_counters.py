@@ -0,0 +1,116 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.counters import get_user_counters
+from posts.models import Comment, Follow, Group, Post, UserCounters
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-group',
+            description='Описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def refresh(self, *objects):
+        for obj in objects:
+            obj.refresh_from_db()
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        author_counters = get_user_counters(self.author)
+        reader_counters = get_user_counters(self.reader)
+
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.refresh(author_counters, reader_counters, post, self.group)
+
+        self.assertEqual(author_counters.posts_count, 1)
+        self.assertEqual(author_counters.followers_count, 1)
+        self.assertEqual(reader_counters.following_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.delete()
+        self.refresh(author_counters, reader_counters, self.group)
+
+        self.assertEqual(author_counters.posts_count, 0)
+        self.assertEqual(author_counters.followers_count, 0)
+        self.assertEqual(reader_counters.following_count, 0)
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_moving_post_moves_group_counter(self):
+        """Перенос поста между группами переносит и счётчик."""
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+        post.group = self.other_group
+        post.save()
+        self.refresh(self.group, self.other_group)
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+    def test_counters_are_computed_on_first_read(self):
+        """Строка счётчиков считается по таблицам при первом чтении."""
+        Post.objects.bulk_create(
+            [Post(author=self.author, text='Пост') for _ in range(3)]
+        )
+        self.assertFalse(
+            UserCounters.objects.filter(user=self.author).exists()
+        )
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'author'})
+        )
+        self.assertEqual(response.context['author_posts_cnt'], 3)
+
+    def test_reconcile_command_repairs_drift(self):
+        """Команда reconcile_counters исправляет рассинхронизацию."""
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+        Comment.objects.bulk_create([
+            Comment(post=post, author=self.reader, text='К')
+            for _ in range(2)
+        ])
+        UserCounters.objects.filter(user=self.author).update(posts_count=7)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=5)
+
+        call_command('reconcile_counters', chunk_size=1, stdout=StringIO())
+
+        post.refresh_from_db()
+        self.refresh(self.group)
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.author).posts_count, 1
+        )
+        self.assertEqual(
+            UserCounters.objects.get(user=self.reader).posts_count, 0
+        )
@@ -0,0 +1,149 @@
+import csv
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=cls.author,
+                group=cls.group if number % 2 else None,
+            )
+            for number in range(5)
+        ]
+        Post.objects.filter(pk=cls.posts[0].pk).update(
+            image='posts/cat.gif'
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.posts[0],
+            author=cls.staff,
+            text='Комментарий, с "кавычками"',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def get(self, kind, **params):
+        return self.client.get(
+            reverse('posts:export', args=[kind]), params
+        )
+
+    def read_ndjson(self, response):
+        content = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_ndjson_export(self):
+        """Выгрузка постов в NDJSON идёт потоком в порядке id."""
+        response = self.get('posts')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith(
+            'application/x-ndjson'
+        ))
+        rows = self.read_ndjson(response)
+        self.assertEqual(
+            [row['id'] for row in rows], [post.pk for post in self.posts]
+        )
+        first = rows[0]
+        self.assertEqual(first['text'], 'Пост 0')
+        self.assertEqual(first['author'], 'author')
+        self.assertIsNone(first['group'])
+        self.assertEqual(
+            first['image'], 'http://testserver/media/posts/cat.gif'
+        )
+        self.assertEqual(first['comments_count'], 1)
+        self.assertEqual(rows[1]['group'], 'group')
+        self.assertEqual(rows[1]['image'], '')
+
+    def test_file_urls_come_from_field_storage(self):
+        """Ссылку на картинку строит хранилище поля image."""
+        storage = Post._meta.get_field('image').storage
+        with mock.patch.object(
+            storage, 'url', return_value='https://cdn.example.com/cat.gif'
+        ):
+            rows = self.read_ndjson(self.get('posts'))
+        self.assertEqual(rows[0]['image'], 'https://cdn.example.com/cat.gif')
+
+    def test_csv_export(self):
+        """CSV с заголовком, экранированием и именем файла."""
+        response = self.get('comments', format='csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('comments.csv', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['text'], self.comment.text)
+        self.assertEqual(rows[0]['post'], str(self.posts[0].pk))
+        self.assertEqual(rows[0]['author'], 'staff')
+
+    def test_resume_after_id(self):
+        """С ``after`` выгрузка продолжается после указанной строки."""
+        rows = self.read_ndjson(self.get('posts', after=self.posts[2].pk))
+        self.assertEqual(
+            [row['id'] for row in rows],
+            [post.pk for post in self.posts[3:]],
+        )
+
+    def test_since_exports_only_changes(self):
+        """С ``since`` выгружаются только изменённые после даты строки."""
+        moment = timezone.now()
+        Post.objects.exclude(pk=self.posts[1].pk).update(
+            updated=moment - timedelta(days=1)
+        )
+        Post.objects.filter(pk=self.posts[1].pk).update(
+            updated=moment + timedelta(minutes=1)
+        )
+        rows = self.read_ndjson(self.get('posts', since=moment.isoformat()))
+        self.assertEqual([row['id'] for row in rows], [self.posts[1].pk])
+        tomorrow = (moment + timedelta(days=1)).date().isoformat()
+        rows = self.read_ndjson(self.get('posts', since=tomorrow))
+        self.assertEqual(rows, [])
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.get('posts', format='xml').status_code, 400)
+        self.assertEqual(self.get('posts', since='вчера').status_code, 400)
+        self.assertEqual(self.get('posts', after='x').status_code, 400)
+        self.assertEqual(self.get('users').status_code, 404)
+
+    def test_export_is_staff_only(self):
+        """Обычному пользователю и гостю выгрузка недоступна."""
+        self.client.force_login(self.author)
+        response = self.get('posts')
+        self.assertEqual(response.status_code, 302)
+        self.client.logout()
+        response = self.get('posts')
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_command(self):
+        stdout = StringIO()
+        call_command(
+            'export_posts', 'posts',
+            after=self.posts[3].pk,
+            base_url='https://yatube.example/',
+            stdout=stdout,
+        )
+        rows = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.posts[4].pk])
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import follows
+from posts.caching import FOLLOWING_MARK
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}')
+            for i in range(3)
+        ]
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.reader, author=author)
+        for author in cls.authors:
+            Post.objects.create(author=author, text=f'Пост {author}')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def test_following_is_cached(self):
+        """Подписки читаются из базы один раз, дальше — из кеша."""
+        with self.assertNumQueries(1):
+            following = follows.get_following(self.reader.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                follows.get_following(self.reader.pk).author_ids,
+                following.author_ids,
+            )
+        ids = [author.pk for author in self.authors]
+        self.assertIn(ids[0], following)
+        self.assertNotIn(ids[2], following)
+        self.assertEqual(following.among(ids), set(ids[:2]))
+        self.assertEqual(follows.get_following(self.authors[0].pk).among(ids),
+                         set())
+
+    def test_follow_and_unfollow_update_graph(self):
+        author = self.authors[2]
+        before = follows.get_following(self.reader.pk)
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': author})
+        )
+        after = follows.get_following(self.reader.pk)
+        self.assertIn(author.pk, after)
+        self.assertNotEqual(before.version, after.version)
+        self.client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': author})
+        )
+        self.assertNotIn(author.pk, follows.get_following(self.reader.pk))
+
+    def test_feed_marks_followed_authors(self):
+        """Карточки авторов из подписок помечены, гостю пометок нет."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertContains(response, FOLLOWING_MARK, count=2)
+        response = Client().get(url)
+        self.assertNotContains(response, FOLLOWING_MARK)
+
+    def test_follow_changes_feed_etag(self):
+        """После подписки лента не отдаётся из кеша браузера."""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        self.client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.authors[2]}
+        ))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, FOLLOWING_MARK, count=3)
+
+    def test_api_following_state(self):
+        """В карточках API у авторизованного есть признак подписки."""
+        response = self.client.get(reverse('posts:api_index'))
+        following = {
+            card['author']['username']: card['author']['following']
+            for card in response.json()['results']
+        }
+        self.assertEqual(
+            following,
+            {'author0': True, 'author1': True, 'author2': False},
+        )
@@ -206,6 +206,18 @@ class PostCreateFormTests(TestCase):
             self.test_comment_text
         )
 
+    def test_comment_to_missing_post_is_not_found(self):
+        """Комментарий к несуществующему посту не ставится в очередь
+        записи, ответ — 404.
+        """
+        comments_count = Comment.objects.count()
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': 99999}),
+            data={'text': self.test_comment_text},
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Comment.objects.count(), comments_count)
+
     def test_not_add_comment_for_guest_client(self):
         """Проверка невозможности комментирования поста не авторизованным
         пользователем.
@@ -0,0 +1,226 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageFile
+
+from posts import images
+from posts.forms import PostForm
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+# Тег EXIF Orientation: картинку нужно повернуть на 90° по часовой.
+ORIENTATION = 0x0112
+
+
+def jpeg(width, height, **options):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, 'JPEG', **options)
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_IMAGE_MAX_SIZE=400,
+    POST_IMAGE_WIDTHS=(100, 200),
+)
+class ImagePipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create(self, content, name='photo.jpg'):
+        return self.client.post(
+            reverse('posts:post_create'),
+            {
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(name, content, 'image/jpeg'),
+            },
+        )
+
+    def test_upload_is_downsized_rotated_and_stripped(self):
+        """Картинка поворачивается по EXIF, уменьшается и сохраняется
+        без EXIF, а её размеры записываются в пост.
+        """
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        self.create(jpeg(1200, 600, exif=exif.tobytes()))
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual((post.image_width, post.image_height), (200, 400))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (200, 400))
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertNotIn('exif', stored.info)
+
+    def test_variants_are_created_in_jpeg_and_webp(self):
+        """Рядом с оригиналом лежат варианты меньших ширин в JPEG и
+        WebP, а WebP есть и в полной ширине.
+        """
+        self.create(jpeg(600, 300))
+        post = Post.objects.get()
+        self.assertEqual(post.image_widths, '100,200,400')
+        root = os.path.splitext(post.image.path)[0]
+        for suffix, size in (
+            ('-100w.jpg', (100, 50)),
+            ('-200w.jpg', (200, 100)),
+            ('-100w.webp', (100, 50)),
+            ('-200w.webp', (200, 100)),
+            ('-400w.webp', (400, 200)),
+        ):
+            with self.subTest(suffix=suffix):
+                with Image.open(root + suffix) as variant:
+                    self.assertEqual(variant.size, size)
+        self.assertFalse(os.path.exists(root + '-400w.jpg'))
+
+    def test_small_image_is_not_upscaled(self):
+        """Маленькая картинка сохраняется в своём размере, без вариантов
+        больше неё.
+        """
+        self.create(jpeg(150, 80))
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (150, 80))
+        self.assertEqual(post.image_widths, '100,150')
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1000)
+    def test_oversized_upload_is_rejected(self):
+        """Файл больше POST_IMAGE_MAX_BYTES отклоняется, не попадая во
+        временный файл целиком.
+        """
+        content = jpeg(300, 300, quality=100)
+        self.assertGreater(len(content), 1000)
+        with mock.patch.object(
+            images.TemporaryFileUploadHandler,
+            'receive_data_chunk',
+            autospec=True,
+            side_effect=lambda handler, data, start: None,
+        ) as receive:
+            response = self.create(content)
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 1000\xa0байт.'
+        )
+        written = sum(len(call[0][1]) for call in receive.call_args_list)
+        self.assertLessEqual(written, 1000)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_decompression_bomb_is_rejected(self):
+        """Картинка с большим числом пикселей отклоняется по заголовку,
+        без декодирования.
+        """
+        content = jpeg(200, 200)
+        with mock.patch.object(ImageFile.ImageFile, 'load') as load:
+            response = self.create(content)
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(
+            response,
+            'form',
+            'image',
+            'Картинка больше 0 мегапикселей.',
+        )
+        load.assert_not_called()
+
+    def test_other_files_are_not_overwritten(self):
+        """В хранилище без имён по хешу загрузка не трогает чужой файл
+        с именем её варианта.
+        """
+        storage = FileSystemStorage(location=TEMP_MEDIA_ROOT)
+        storage.save('posts/cat-100w.jpg', ContentFile(b'other'))
+        post = Post(author=self.user, text='Пост')
+        with mock.patch.object(
+            Post._meta.get_field('image'), 'storage', storage
+        ):
+            images.ingest(
+                post, SimpleUploadedFile('cat.jpg', jpeg(300, 300))
+            )
+        self.assertEqual(post.image.name, 'posts/cat.jpg')
+        self.assertEqual(post.image_widths, '')
+        with storage.open('posts/cat-100w.jpg') as file:
+            self.assertEqual(file.read(), b'other')
+
+    def test_edit_without_image_keeps_metadata(self):
+        """Правка текста не трогает обработанную картинку."""
+        self.create(jpeg(300, 300))
+        post = Post.objects.get()
+        form = PostForm(
+            {'text': 'Новый текст'}, instance=post
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_widths, '100,200,300')
+        self.assertEqual(post.image_width, 300)
+
+    def test_page_renders_srcset_without_opening_files(self):
+        """Страница выводит srcset и размеры картинки по полям поста, не
+        открывая файлы.
+        """
+        self.create(jpeg(600, 300))
+        post = Post.objects.get()
+        cache.clear()
+        with mock.patch.object(images.Image, 'open') as image_open, \
+                mock.patch('django.core.files.storage.open') as file_open:
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk})
+            )
+        image_open.assert_not_called()
+        file_open.assert_not_called()
+        root = settings.MEDIA_URL + os.path.splitext(post.image.name)[0]
+        self.assertContains(
+            response,
+            f'srcset="{root}-100w.webp 100w, {root}-200w.webp 200w, '
+            f'{root}-400w.webp 400w"',
+        )
+        self.assertContains(
+            response,
+            f'srcset="{root}-100w.jpg 100w, {root}-200w.jpg 200w, '
+            f'{root}.jpg 400w"',
+        )
+        self.assertContains(response, 'width="400"')
+        self.assertContains(response, 'height="200"')
+        # Пропорции задают размеры картинки, она не обрезается.
+        self.assertNotContains(response, 'object-fit')
+
+    def test_api_lists_variants(self):
+        """Карточка API содержит размеры и варианты картинки."""
+        self.create(jpeg(600, 300))
+        root = os.path.splitext(Post.objects.get().image.name)[0]
+        cache.clear()
+        card = self.client.get(reverse('posts:api_index')).json()[
+            'results'
+        ][0]
+        self.assertEqual(card['variants']['width'], 400)
+        self.assertEqual(card['variants']['height'], 200)
+        self.assertEqual(
+            card['variants']['formats']['webp'][0],
+            {
+                'url': f'http://testserver/media/{root}-100w.webp',
+                'width': 100,
+            },
+        )
@@ -0,0 +1,142 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import search
+from posts.importer import Importer
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class ImportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_jsonl(self, name, rows):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        return path
+
+    def write_csv(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    def run_import(self, **files):
+        stdout = StringIO()
+        call_command(
+            'import_posts',
+            create_users=True,
+            chunk_size=2,
+            stdout=stdout,
+            stderr=StringIO(),
+            **files,
+        )
+        return stdout.getvalue()
+
+    def test_import_creates_rows_and_derived_data(self):
+        """Импорт создаёт записи и пересобирает счётчики, индекс и ленты."""
+        posts = self.write_jsonl('posts.jsonl', [
+            {'id': 'a', 'author': 'partner', 'group': 'group',
+             'text': 'Импортированный енот',
+             'pub_date': '2020-01-02T03:04:05'},
+            {'id': 'b', 'author': 'partner', 'text': 'Второй пост'},
+            {'id': 'c', 'author': 'partner', 'group': 'missing',
+             'text': 'Пост в неизвестной группе'},
+        ])
+        comments = self.write_csv(
+            'comments.csv',
+            'post,author,text,created\n'
+            'a,reader,Комментарий,2020-01-03T00:00:00\n'
+            'zzz,reader,Комментарий к неизвестному посту,\n'
+        )
+        follows = self.write_jsonl('follows.jsonl', [
+            {'user': 'reader', 'author': 'partner'},
+            {'user': 'reader', 'author': 'partner'},
+            {'user': 'partner', 'author': 'partner'},
+        ])
+
+        with mock.patch('posts.tasks.enqueue') as enqueue:
+            output = self.run_import(
+                posts=posts, comments=comments, follows=follows
+            )
+        # Сигналы не срабатывали, фоновых задач нет.
+        enqueue.assert_not_called()
+        self.assertIn('posts: создано 2, пропущено 1', output)
+        self.assertIn('comments: создано 1, пропущено 1', output)
+
+        partner = User.objects.get(username='partner')
+        self.assertFalse(partner.has_usable_password())
+        post = Post.objects.get(text='Импортированный енот')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Comment.objects.get().created.day, 3)
+        self.assertEqual(Follow.objects.count(), 1)
+
+        partner.counters.refresh_from_db()
+        self.assertEqual(partner.counters.posts_count, 2)
+        self.assertEqual(partner.counters.followers_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(
+            [p.pk for p in search.search_pagination('енот')], [post.pk]
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+
+    def test_posts_created_during_import_do_not_collide(self):
+        """Пост, созданный сайтом во время импорта, не мешает ему, а
+        комментарии попадают к своим постам.
+        """
+        author = User.objects.create_user(username='author')
+
+        def rows():
+            yield {'id': 'a', 'author': 'author', 'text': 'Первый'}
+            yield {'id': 'b', 'author': 'author', 'text': 'Второй'}
+            # Между порциями пост публикуют на сайте.
+            Post.objects.create(author=author, text='С сайта')
+            yield {'id': 'c', 'author': 'author', 'text': 'Третий'}
+
+        importer = Importer(chunk_size=2)
+        importer.import_posts(rows())
+        importer.import_comments([
+            {'post': source_id, 'author': 'reader', 'text': f'К {source_id}'}
+            for source_id in ('a', 'b', 'c')
+        ])
+
+        self.assertEqual(Post.objects.count(), 4)
+        for source_id, text in (('a', 'Первый'), ('b', 'Второй'),
+                                ('c', 'Третий')):
+            with self.subTest(source_id=source_id):
+                self.assertEqual(
+                    Comment.objects.get(text=f'К {source_id}').post.text,
+                    text
+                )
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+        self.assertTrue(Post._meta.get_field('updated').auto_now)
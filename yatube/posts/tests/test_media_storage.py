@@ -0,0 +1,202 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from sorl.thumbnail import default
+
+from core.models import StoredFile
+from core.storage import is_addressed
+from posts import images, thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def write_legacy(name, content=SMALL_GIF):
+    """Файл под исходным именем, как до хранилища по содержимому."""
+    path = os.path.join(TEMP_MEDIA_ROOT, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(content)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class HashMediaTests(TestCase):
+    """Команда hash_media переносит картинки в хранилище по
+    содержимому.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.clear()
+
+    def test_legacy_paths_are_rewritten(self):
+        """Одинаковые файлы под разными именами сводятся к одному, а
+        ссылки считаются по постам.
+        """
+        write_legacy('posts/cat.gif')
+        write_legacy('posts/cat_copy.gif')
+        posts = [
+            Post.objects.create(author=self.user, text='1', image=name)
+            for name in ('posts/cat.gif', 'posts/cat.gif',
+                         'posts/cat_copy.gif')
+        ]
+        Post.objects.create(author=self.user, text='Без картинки')
+        call_command('hash_media', chunk_size=2, stdout=StringIO())
+        names = {
+            Post.objects.get(pk=post.pk).image.name for post in posts
+        }
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_addressed(name))
+        self.assertTrue(name.endswith('.gif'))
+        self.assertEqual(StoredFile.objects.get(name=name).references, 3)
+        post = Post.objects.get(pk=posts[0].pk)
+        self.assertIsNotNone(thumbnails.get_existing(post.image, 'card'))
+
+    def test_processed_variants_are_moved(self):
+        """Варианты картинки переносятся вместе с ней."""
+        write_legacy('posts/photo.jpg', b'jpeg')
+        for name in ('posts/photo-100w.jpg', 'posts/photo-100w.webp',
+                     'posts/photo-200w.webp'):
+            write_legacy(name, name.encode())
+        post = Post.objects.create(
+            author=self.user,
+            text='Пост',
+            image='posts/photo.jpg',
+            image_width=200,
+            image_height=100,
+            image_widths='100,200',
+        )
+        call_command('hash_media', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertTrue(is_addressed(post.image.name))
+        for name in images.variant_files(post):
+            with self.subTest(name=name):
+                self.assertTrue(post.image.storage.exists(name))
+
+    def test_missing_files_are_skipped(self):
+        # bulk_create: без сигналов, которые пытались бы сделать
+        # миниатюру несуществующего файла.
+        Post.objects.bulk_create([
+            Post(author=self.user, text='Пост', image='posts/lost.gif')
+        ])
+        post = Post.objects.get()
+        out = StringIO()
+        call_command('hash_media', stdout=out)
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, 'posts/lost.gif')
+        self.assertIn('Файлов не найдено: 1', out.getvalue())
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_TASKS_EAGER=True, MEDIA_GC_MIN_AGE=0
+)
+class ImageReleaseTests(TransactionTestCase):
+    """Ссылки на картинку снимаются после фиксации удаления или смены
+    картинки поста.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content=SMALL_GIF):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост',
+            image=SimpleUploadedFile('small.gif', content, 'image/gif'),
+        )
+
+    def test_shared_file_outlives_one_post(self):
+        first = self.create_post()
+        second = self.create_post()
+        self.assertEqual(first.image.name, second.image.name)
+        first.delete()
+        self.assertTrue(second.image.storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(second.image.storage.exists(second.image.name))
+
+    def test_reference_is_taken_with_the_post(self):
+        """Ссылку на файл добавляет сохранение поста, а откат этого
+        сохранения её не оставляет.
+        """
+        post = Post(author=self.user, text='Пост')
+        post.image.save(
+            'small.gif', SimpleUploadedFile('small.gif', SMALL_GIF),
+            save=False,
+        )
+        name = post.image.name
+        self.assertEqual(StoredFile.objects.get(name=name).references, 0)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                post.save()
+                raise RuntimeError
+        self.assertEqual(StoredFile.objects.get(name=name).references, 0)
+
+        post.pk = None
+        post.save()
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+        post.text = 'Правка'
+        post.save()
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+
+    @override_settings(MEDIA_GC_MIN_AGE=60 * 60)
+    def test_release_keeps_file_of_unsaved_upload(self):
+        """Последняя ссылка снимается, пока тот же файл загружен для
+        ещё не сохранённого поста: файл остаётся и получает его ссылку.
+        """
+        first = self.create_post()
+        upload = Post(author=self.user, text='Пост')
+        upload.image.save(
+            'small.gif', SimpleUploadedFile('small.gif', SMALL_GIF),
+            save=False,
+        )
+        first.delete()
+        name = upload.image.name
+        self.assertTrue(upload.image.storage.exists(name))
+        upload.save()
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+
+    def test_replaced_image_is_released(self):
+        post = self.create_post()
+        old_name = post.image.name
+        post.image = SimpleUploadedFile('new.gif', SMALL_GIF + b'\0')
+        post.save()
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+    def test_author_deletion_releases_images(self):
+        post = self.create_post()
+        self.user.delete()
+        self.assertFalse(post.image.storage.exists(post.image.name))
+        self.assertFalse(StoredFile.objects.exists())
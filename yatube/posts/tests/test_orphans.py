@@ -0,0 +1,185 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core.models import StoredFile
+from posts import images, thumbnails
+from posts.forms import PostForm
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def media_path(name):
+    return os.path.join(TEMP_MEDIA_ROOT, name)
+
+
+def write_legacy(name, content=SMALL_GIF):
+    """Файл под исходным именем, как до хранилища по содержимому."""
+    os.makedirs(os.path.dirname(media_path(name)), exist_ok=True)
+    with open(media_path(name), 'wb') as file:
+        file.write(content)
+
+
+def jpeg(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (600, 300), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_WIDTHS=(100, 200))
+class CollectMediaTests(TestCase):
+    """Команда collect_media удаляет картинки без постов, их варианты,
+    миниатюры и записи миниатюр в хранилище ключей.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.clear()
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def legacy_post(self, name):
+        write_legacy(name)
+        post = Post.objects.create(author=self.user, text='Пост', image=name)
+        thumbnails.generate_for_image(post.image)
+        return post
+
+    def processed_post(self, color):
+        form = PostForm(
+            {'text': 'Пост'},
+            {'image': SimpleUploadedFile('photo.jpg', jpeg(color))},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        post.author = self.user
+        post.save()
+        return post
+
+    def collect(self, **options):
+        out = StringIO()
+        options.setdefault('min_age', 0)
+        options.setdefault('workers', 1)
+        call_command('collect_media', chunk_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def thumbnail_path(self, post):
+        thumbnail = thumbnails.get_existing(post.image, 'card')
+        return thumbnail.storage.path(thumbnail.name)
+
+    def test_orphaned_legacy_image_and_thumbnails_are_removed(self):
+        """Картинка удалённого поста уходит вместе с миниатюрами и их
+        записями, картинка живого поста остаётся.
+        """
+        kept = self.legacy_post('posts/kept.gif')
+        removed = self.legacy_post('posts/removed.gif')
+        kept_thumbnail = self.thumbnail_path(kept)
+        removed_thumbnail = self.thumbnail_path(removed)
+        removed_image = removed.image
+        Post.objects.filter(pk=removed.pk).delete()
+        self.collect()
+        self.assertTrue(os.path.exists(media_path('posts/kept.gif')))
+        self.assertTrue(os.path.exists(kept_thumbnail))
+        self.assertFalse(os.path.exists(media_path('posts/removed.gif')))
+        self.assertFalse(os.path.exists(removed_thumbnail))
+        self.assertIsNotNone(thumbnails.get_existing(kept.image, 'card'))
+        self.assertIsNone(default.kvstore.get(ImageFile(removed_image)))
+
+    def test_leaked_reference_is_collected_with_variants(self):
+        """Файл по хешу с разошедшимся счётчиком удаляется со всеми
+        вариантами, файлы живого поста остаются.
+        """
+        kept = self.processed_post('green')
+        removed = self.processed_post('red')
+        # В TestCase фиксации нет, ссылка после удаления не снимается.
+        Post.objects.filter(pk=removed.pk).delete()
+        self.assertEqual(
+            StoredFile.objects.get(name=removed.image.name).references, 1
+        )
+        self.collect()
+        for name in [removed.image.name, *images.variant_files(removed)]:
+            with self.subTest(name=name):
+                self.assertFalse(os.path.exists(media_path(name)))
+        for name in [kept.image.name, *images.variant_files(kept)]:
+            with self.subTest(name=name):
+                self.assertTrue(os.path.exists(media_path(name)))
+        self.assertFalse(
+            StoredFile.objects.filter(name=removed.image.name).exists()
+        )
+
+    def test_dry_run_removes_nothing(self):
+        write_legacy('posts/orphan.gif')
+        out = self.collect(dry_run=True)
+        self.assertTrue(os.path.exists(media_path('posts/orphan.gif')))
+        self.assertIn('Будет удалено: картинок 1', out)
+
+    def test_recent_files_are_kept(self):
+        """Файлы моложе --min-age могли загрузить во время обхода."""
+        write_legacy('posts/fresh.gif')
+        write_legacy('posts/stale.gif')
+        old = time.time() - 2 * 60 * 60
+        os.utime(media_path('posts/stale.gif'), (old, old))
+        self.collect(min_age=1)
+        self.assertTrue(os.path.exists(media_path('posts/fresh.gif')))
+        self.assertFalse(os.path.exists(media_path('posts/stale.gif')))
+
+    def test_recently_referenced_files_are_kept(self):
+        """Старый файл по хешу, ссылки на который менялись в пределах
+        --min-age, не удаляется: его могли только что загрузить снова.
+        """
+        removed = self.processed_post('red')
+        Post.objects.filter(pk=removed.pk).delete()
+        old = time.time() - 2 * 60 * 60
+        for name in [removed.image.name, *images.variant_files(removed)]:
+            os.utime(media_path(name), (old, old))
+        StoredFile.objects.filter(name=removed.image.name).update(
+            updated=timezone.now() - timedelta(minutes=30)
+        )
+        self.collect(min_age=1)
+        self.assertTrue(os.path.exists(media_path(removed.image.name)))
+
+    def test_parallel_rate_limited_removal(self):
+        for index in range(5):
+            write_legacy(f'posts/orphan{index}.gif')
+        started = time.monotonic()
+        # Файлы без записей в базе: потокам не нужна транзакция теста.
+        with mock.patch('posts.orphans.connection') as connection:
+            out = self.collect(rate=50, workers=3)
+        # Соединение закрывается один раз на поток, а не на задачу.
+        self.assertEqual(connection.close.call_count, 3)
+        self.assertIn('Удалено: картинок 5', out)
+        self.assertGreaterEqual(time.monotonic() - started, 4 / 50)
+        self.assertEqual(os.listdir(media_path('posts')), [])
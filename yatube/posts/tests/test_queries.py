@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import timeline
+from posts.caching import card_key
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedQueryBudgetTests(TestCase):
+    """Число запросов ленты не зависит от количества постов на странице.
+
+    Посты создаются без картинок: поиск миниатюр sorl-thumbnail
+    проверяется отдельно. Перед замером кеш карточек сбрасывается,
+    чтобы страница действительно рендерила посты.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{i}',
+                first_name='Имя',
+                last_name=f'Фамилия {i}',
+            )
+            for i in range(10)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+
+        # Бюджеты для авторизованного клиента: сессия и пользователь
+        # плюс запросы самой страницы. Подписки читаются из кеша.
+        # Значение — бюджет и функция числа постов на странице.
+        cls.budgets = {
+            reverse('posts:index'): (3, lambda count: count),
+            reverse('posts:follow_index'): (3, lambda count: count),
+            reverse('posts:group_posts', kwargs={'slug': 'group'}): (
+                4, lambda count: count
+            ),
+            reverse('posts:profile', kwargs={'username': 'author0'}): (
+                4, lambda count: count // 2 + 1
+            ),
+        }
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def create_posts(self, count):
+        for i in range(count):
+            Post.objects.create(
+                author=self.authors[0] if i % 2 else self.authors[i],
+                text=f'Пост {i}',
+                group=self.group,
+            )
+        # Рассылка по лентам идёт в on_commit и в TestCase не
+        # срабатывает, поэтому ленту читателя собираем явно.
+        timeline.rebuild([self.reader.pk])
+
+    def assert_budgets(self, count):
+        card_keys = [card_key(post) for post in Post.objects.all()]
+        for url, (budget, shown) in self.budgets.items():
+            # Первое открытие профиля создаёт строку счётчиков автора.
+            self.client.get(url)
+            cache.delete_many(card_keys)
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url)
+                self.assertEqual(
+                    len(response.context['page_obj']), shown(count)
+                )
+
+    def test_query_budget_with_one_post(self):
+        self.create_posts(1)
+        self.assert_budgets(1)
+
+    def test_query_budget_with_full_page(self):
+        self.create_posts(10)
+        self.assert_budgets(10)
@@ -0,0 +1,156 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+
+User = get_user_model()
+
+# Полный просмотр таблицы или сортировка во временном B-дереве.
+BAD_PLAN = re.compile(r'^SCAN \w+$|^SCAN \w+ AS \w+$|TEMP B-TREE')
+# Запросы, которым полный просмотр или сортировка разрешены:
+# список всех групп в форме поста и ранжирование не более тысячи
+# найденных FTS5 постов.
+ALLOWED = (
+    re.compile(r'FROM "posts_group"$'),
+    re.compile(r'FROM posts_post_fts WHERE'),
+)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN SQLite')
+class QueryPlanTests(TestCase):
+    """Запросы страниц читают данные по индексам, без полного
+    просмотра таблиц и сортировки во временном B-дереве.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Енот {i}'
+            )
+            for i in range(POSTS_PER_PAGE + 1)
+        ]
+        cls.post = posts[0]
+        for i in range(COMMENTS_PER_PAGE + 1):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {i}'
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        timeline.rebuild([cls.reader.pk])
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[3] for row in cursor.fetchall()]
+
+    def assert_indexed(self, queries):
+        for query in queries:
+            sql, params = query
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            if any(pattern.search(sql) for pattern in ALLOWED):
+                continue
+            plan = self.explain(sql, params)
+            bad = [step for step in plan if BAD_PLAN.search(step)]
+            self.assertEqual(bad, [], f'{sql}\n{plan}')
+
+    def capture(self, function):
+        # captured_queries хранит SQL с подставленными значениями,
+        # поэтому запросы с параметрами перехватываются на курсоре.
+        queries = []
+
+        def wrapper(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(wrapper):
+            result = function()
+        return queries, result
+
+    def get(self, url, data=None):
+        queries, response = self.capture(
+            lambda: self.client.get(url, data or {})
+        )
+        self.assertEqual(response.status_code, 200, url)
+        return queries, response
+
+    def test_pages_use_indexes(self):
+        """Первые и следующие страницы лент и поста идут по индексам."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            reverse('posts:search'),
+        ]
+        self.client.force_login(self.author)
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                queries, response = self.get(
+                    url, {'q': 'енот'} if 'search' in url else None
+                )
+                self.assert_indexed(queries)
+                page = response.context.get('page_obj')
+                if page is not None and page.has_next():
+                    cache.clear()
+                    queries, _ = self.get(url, {'cursor': page.next_cursor})
+                    self.assert_indexed(queries)
+
+    def test_api_uses_indexes(self):
+        """Ответы API читают посты и комментарии по индексам."""
+        urls = [
+            reverse('posts:api_index'),
+            reverse('posts:api_group_posts', kwargs={'slug': 'group'}),
+            reverse('posts:api_profile', kwargs={'username': 'author'}),
+            reverse('posts:api_follow_index'),
+            reverse('posts:api_post', kwargs={'post_id': self.post.pk}),
+            reverse(
+                'posts:api_post_comments', kwargs={'post_id': self.post.pk}
+            ),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                queries, response = self.get(url)
+                self.assert_indexed(queries)
+                cursor = response.json().get('next')
+                if cursor:
+                    cache.clear()
+                    queries, _ = self.get(url, {'cursor': cursor})
+                    self.assert_indexed(queries)
+
+    def test_timeline_maintenance_uses_indexes(self):
+        """Раскладка поста по лентам и дозаполнение ленты идут по
+        индексам подписок и постов автора.
+        """
+        queries, _ = self.capture(lambda: timeline.fan_out(self.post.pk))
+        self.assert_indexed(queries)
+        queries, _ = self.capture(
+            lambda: timeline.backfill(self.reader.pk, self.author.pk)
+        )
+        self.assert_indexed(queries)
@@ -0,0 +1,145 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Post
+from posts.utils import POSTS_PER_PAGE
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Кот сидит на подоконнике'
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.author, text='Собака гуляет во дворе'
+        )
+
+    def search_ids(self, query, cursor=None):
+        return [
+            post.pk for post in search.search_pagination(query, cursor)
+        ]
+
+    def test_search_finds_posts_by_words(self):
+        """Поиск находит посты по словам и префиксу без учёта регистра."""
+        self.assertEqual(self.search_ids('кот'), [self.post.pk])
+        self.assertEqual(self.search_ids('СОБАК'), [self.other_post.pk])
+        self.assertEqual(self.search_ids('кот двор'), [])
+
+    def test_search_ignores_query_syntax(self):
+        """Операторы FTS5 в запросе не ломают поиск."""
+        for query in ('"кот', 'кот OR', 'NEAR(кот', '*', 'кот -собака'):
+            with self.subTest(query=query):
+                search.search_pagination(query)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        post = Post.objects.create(author=self.author, text='Попугай')
+        self.assertEqual(self.search_ids('попугай'), [post.pk])
+
+        post.text = 'Хомяк'
+        post.save()
+        self.assertEqual(self.search_ids('попугай'), [])
+        self.assertEqual(self.search_ids('хомяк'), [post.pk])
+
+        post.delete()
+        self.assertEqual(self.search_ids('хомяк'), [])
+
+    def test_search_pages_by_cursor(self):
+        """Выдача листается курсором вперёд и назад без повторов."""
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'Рыба номер {number}')
+            for number in range(POSTS_PER_PAGE + 3)
+        ])
+        search.reindex(Post)
+
+        first = search.search_pagination('рыба')
+        self.assertEqual(len(first), POSTS_PER_PAGE)
+        self.assertTrue(first.has_next())
+        self.assertFalse(first.has_previous())
+
+        second = search.search_pagination('рыба', first.next_cursor)
+        self.assertEqual(len(second), 3)
+        self.assertFalse(second.has_next())
+        self.assertTrue(second.has_previous())
+        self.assertFalse({p.pk for p in first} & {p.pk for p in second})
+
+        back = search.search_pagination('рыба', second.previous_cursor)
+        self.assertEqual([p.pk for p in back], [p.pk for p in first])
+
+    def test_old_relevant_post_ranks_first(self):
+        """Релевантный пост находится первым, даже если после него
+        опубликованы сотни постов со случайным упоминанием слова.
+        """
+        relevant = Post.objects.create(
+            author=self.author, text='Жираф, жираф и ещё раз жираф'
+        )
+        Post.objects.bulk_create([
+            Post(
+                author=self.author,
+                text=f'Заметка {number}: длинный рассказ о погоде, '
+                     f'городе, дороге и, между прочим, жирафе',
+            )
+            for number in range(1500)
+        ])
+        search.reindex(Post)
+        self.assertEqual(self.search_ids('жираф')[0], relevant.pk)
+
+    def test_search_view(self):
+        """Страница поиска выводит найденные посты."""
+        url = reverse('posts:search')
+        response = self.client.get(url, {'q': 'подоконник'})
+        self.assertEqual(
+            list(response.context['page_obj']), [self.post]
+        )
+        response = self.client.get(url)
+        self.assertIsNone(response.context['page_obj'])
+
+    def test_search_view_query_budget(self):
+        """Страница результатов собирается за постоянное число запросов."""
+        with self.assertNumQueries(2):
+            self.client.get(reverse('posts:search'), {'q': 'кот'})
+
+    def test_comments_indexed(self):
+        """Комментарии попадают в индекс и ищутся в админке."""
+        comment = Comment.objects.create(
+            post=self.post, author=self.author, text='Отличный котёнок'
+        )
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'котён'}
+        )
+        self.assertEqual(list(response.context['cl'].result_list), [comment])
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собака'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.other_post]
+        )
+
+    def test_reindex_command(self):
+        """Команда reindex_search восстанавливает рассинхронизированный
+        индекс.
+        """
+        Post.objects.filter(pk=self.post.pk).update(text='Енот')
+        self.assertEqual(self.search_ids('енот'), [])
+
+        call_command('reindex_search', chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(self.search_ids('енот'), [self.post.pk])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM posts_post_fts')
+            self.assertEqual(cursor.fetchone()[0], Post.objects.count())
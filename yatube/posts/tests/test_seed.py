@@ -0,0 +1,60 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, **options):
+        options = {
+            'users': 30,
+            'groups': 3,
+            'posts': 200,
+            'comments': 300,
+            'image_share': 0.1,
+            **options,
+        }
+        call_command('seed', stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_seed_creates_requested_volume(self):
+        """seed создаёт заданное число записей с корректными связями."""
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertFalse(
+            Follow.objects.filter(user=F('author')).exists()
+        )
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_authorship_is_skewed(self):
+        """Большую часть постов пишут немногие авторы."""
+        self.seed()
+        counts = sorted(
+            (
+                Post.objects.filter(author=user).count()
+                for user in User.objects.all()
+            ),
+            reverse=True,
+        )
+        self.assertGreater(sum(counts[:3]), sum(counts) / 3)
+
+    def test_skip_timelines(self):
+        """С --skip-timelines ленты подписок не собираются."""
+        self.seed(skip_timelines=True)
+        self.assertFalse(TimelineEntry.objects.exists())
@@ -0,0 +1,87 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default
+
+from posts import thumbnails
+from posts.models import Post
+from posts.tests.utils import run_on_commit
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    placeholder = 'aspect-ratio'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.clear()
+
+    def create_post(self, name='small.gif'):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        )
+
+    def post_page(self, post):
+        return self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+
+    @override_settings(POSTS_TASKS_EAGER=True)
+    def test_thumbnail_is_generated_on_save(self):
+        """Миниатюра создаётся при сохранении поста, а не при показе."""
+        with run_on_commit():
+            post = self.create_post()
+        self.assertIsNotNone(thumbnails.get_existing(post.image, 'card'))
+        response = self.post_page(post)
+        self.assertNotContains(response, self.placeholder)
+        self.assertContains(response, '<img class="card-img')
+
+    @override_settings(POSTS_TASKS_EAGER=False)
+    def test_placeholder_until_thumbnail_exists(self):
+        """Пока миниатюры нет, шаблон выводит заглушку и не создаёт
+        миниатюру сам.
+        """
+        post = self.create_post('pending.gif')
+        response = self.post_page(post)
+        self.assertContains(response, self.placeholder)
+        self.assertIsNone(thumbnails.get_existing(post.image, 'card'))
+
+    @override_settings(POSTS_TASKS_EAGER=False)
+    def test_backfill_command(self):
+        """Команда generate_thumbnails создаёт недостающие миниатюры."""
+        post = self.create_post('backfill.gif')
+        call_command('generate_thumbnails', workers=1, stdout=StringIO())
+        self.assertIsNotNone(thumbnails.get_existing(post.image, 'card'))
@@ -0,0 +1,113 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry
+from posts.tests.utils import run_on_commit
+
+User = get_user_model()
+
+
+@override_settings(POSTS_TASKS_EAGER=True)
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.follow_index_url = reverse('posts:follow_index')
+        cls.follow_url = reverse(
+            'posts:profile_follow',
+            kwargs={'username': cls.author.username}
+        )
+        cls.unfollow_url = reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': cls.author.username}
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def timeline_post_ids(self):
+        return list(
+            TimelineEntry.objects.filter(user=self.reader).order_by(
+                '-pub_date', '-post_id'
+            ).values_list('post_id', flat=True)
+        )
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новый пост попадает только в ленты подписчиков автора."""
+        with run_on_commit():
+            Follow.objects.create(user=self.reader, author=self.author)
+            post = Post.objects.create(author=self.author, text='Новый пост')
+            Post.objects.create(author=self.stranger, text='Чужой пост')
+
+        self.assertEqual(self.timeline_post_ids(), [post.pk])
+        response = self.reader_client.get(self.follow_index_url)
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_follow_backfills_and_unfollow_cleans_timeline(self):
+        """Подписка дозаполняет ленту, отписка её очищает."""
+        with run_on_commit():
+            posts = [
+                Post.objects.create(author=self.author, text=f'Пост {i}')
+                for i in range(3)
+            ]
+            self.reader_client.get(self.follow_url)
+        self.assertCountEqual(
+            self.timeline_post_ids(),
+            [post.pk for post in posts]
+        )
+
+        with run_on_commit():
+            self.reader_client.get(self.unfollow_url)
+        self.assertEqual(self.timeline_post_ids(), [])
+
+    def test_late_backfill_after_unfollow_is_skipped(self):
+        """Дозаполнение, выполненное уже после отписки, не возвращает
+        посты автора в ленту.
+        """
+        Post.objects.create(author=self.author, text='Пост')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        follow.delete()
+        timeline.remove(self.reader.pk, self.author.pk)
+        timeline.backfill(self.reader.pk, self.author.pk)
+        self.assertEqual(self.timeline_post_ids(), [])
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_timeline_is_trimmed(self):
+        """Лента не длиннее TIMELINE_LENGTH и хранит самые новые посты."""
+        with run_on_commit():
+            Follow.objects.create(user=self.reader, author=self.author)
+            posts = [
+                Post.objects.create(author=self.author, text=f'Пост {i}')
+                for i in range(4)
+            ]
+        self.assertEqual(
+            self.timeline_post_ids(),
+            [posts[3].pk, posts[2].pk]
+        )
+
+    def test_rebuild_command_restores_timeline(self):
+        """Команда rebuild_timelines восстанавливает потерянные ленты."""
+        with run_on_commit():
+            Follow.objects.create(user=self.reader, author=self.author)
+            post = Post.objects.create(author=self.author, text='Пост')
+        stale_post = Post.objects.create(author=self.stranger, text='Чужой')
+        TimelineEntry.objects.all().delete()
+        TimelineEntry.objects.create(
+            user=self.reader,
+            post=stale_post,
+            author=self.stranger,
+            pub_date=stale_post.pub_date,
+        )
+
+        call_command('rebuild_timelines', stdout=StringIO())
+
+        self.assertEqual(self.timeline_post_ids(), [post.pk])
@@ -10,7 +10,9 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from faker import Faker
 
-from posts.models import Follow, Group, Post
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import run_on_commit
+from posts.utils import COMMENTS_PER_PAGE
 
 User = get_user_model()
 
@@ -107,8 +109,7 @@ class PostsPagesTests(TestCase):
         cls.second_page_profile_post_cnt = 10
         cls.third_page_profile_post_cnt = 8
 
-        cls.add_second_page_url = '?page=2'
-        cls.add_third_page_url = '?page=3'
+        cls.cursor_param = '?cursor='
 
         cls.page_obj_name = 'page_obj'
         cls.post_obj_name = 'post'
@@ -174,6 +175,16 @@ class PostsPagesTests(TestCase):
         self.guest_client = Client()
         cache.clear()
 
+    def get_pages(self, url, count):
+        """Проходит по страницам ленты, следуя курсорам пагинатора."""
+        pages = [self.authorized_client.get(url)]
+        for _ in range(count - 1):
+            cursor = pages[-1].context[self.page_obj_name].next_cursor
+            pages.append(
+                self.authorized_client.get(url + self.cursor_param + cursor)
+            )
+        return pages
+
     def test_pages_uses_correct_templates(self):
         """Проверяем, что URL-адрес использует соответствующий шаблон."""
 
@@ -189,12 +200,8 @@ class PostsPagesTests(TestCase):
         2) на страницах правильный контекст;
         3) посты на страницах отсортированы по возрастанию даты добавления.
         """
-        first_page = self.authorized_client.get(self.index_url)
-        second_page = self.authorized_client.get(
-            self.index_url + self.add_second_page_url
-        )
-        third_page = self.authorized_client.get(
-            self.index_url + self.add_third_page_url
+        first_page, second_page, third_page = self.get_pages(
+            self.index_url, 3
         )
 
         pages = {
@@ -252,10 +259,7 @@ class PostsPagesTests(TestCase):
         4) выведены только посты с указанной группой
         """
 
-        first_page = self.authorized_client.get(self.group_url)
-        second_page = self.authorized_client.get(
-            self.group_url + self.add_second_page_url
-        )
+        first_page, second_page = self.get_pages(self.group_url, 2)
 
         pages = {
             first_page: self.first_page_group_post_cnt,
@@ -305,14 +309,8 @@ class PostsPagesTests(TestCase):
         4) выведены только посты автора auth
         """
         # запоминаем содержание страниц
-        first_page = self.authorized_client.get(self.auth_url)
-
-        second_page = self.authorized_client.get(
-            self.auth_url + self.add_second_page_url
-        )
-
-        third_page = self.authorized_client.get(
-            self.auth_url + self.add_third_page_url
+        first_page, second_page, third_page = self.get_pages(
+            self.auth_url, 3
         )
 
         pages = {
@@ -359,6 +357,45 @@ class PostsPagesTests(TestCase):
                             ][number + 1].pub_date
                         )
 
+    def test_paginator_navigates_back_and_forth(self):
+        """Проверяем, что курсоры ведут на соседние страницы без
+        пропусков и повторов, а последняя страница не имеет следующей.
+        """
+        first_page, second_page, third_page = self.get_pages(
+            self.index_url, 3
+        )
+        seen = [
+            post.pk
+            for page in (first_page, second_page, third_page)
+            for post in page.context[self.page_obj_name]
+        ]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), Post.objects.count())
+        self.assertFalse(third_page.context[self.page_obj_name].has_next())
+
+        cursor = second_page.context[self.page_obj_name].previous_cursor
+        back_page = self.authorized_client.get(
+            self.index_url + self.cursor_param + cursor
+        )
+        self.assertEqual(
+            list(back_page.context[self.page_obj_name]),
+            list(first_page.context[self.page_obj_name])
+        )
+
+    def test_paginator_ignores_broken_cursor(self):
+        """Испорченный курсор отдаёт первую страницу."""
+        first_page = self.authorized_client.get(self.index_url)
+        broken_page = self.authorized_client.get(
+            self.index_url + self.cursor_param + 'not-a-cursor'
+        )
+        self.assertEqual(broken_page.status_code, 200)
+        broken_page_obj = broken_page.context[self.page_obj_name]
+        self.assertEqual(
+            list(broken_page_obj),
+            list(first_page.context[self.page_obj_name])
+        )
+        self.assertFalse(broken_page_obj.has_previous())
+
     def test_post_detail_correct_context(self):
         """Проверяем, что для каждой записи в базе выводится пост
         с правильным контекстом.
@@ -516,35 +553,31 @@ class PostsPagesTests(TestCase):
         self.assertNotIn(yet_another_post, self.group.posts.all())
 
     def test_index_cache(self):
-        """Тестирование кеширования главной страницы."""
-        posts_count = Post.objects.count()
-        page_content = self.authorized_client.get(self.index_url).content
+        """Тестирование кеширования главной страницы: страница берётся
+        из кеша без запросов к базе и обновляется сразу после изменения
+        постов.
+        """
+        page_content = self.guest_client.get(self.index_url).content
+        with self.assertNumQueries(0):
+            cached_page_content = self.guest_client.get(
+                self.index_url
+            ).content
+        self.assertEqual(cached_page_content, page_content)
+
         yet_another_post = Post.objects.create(
             author=self.user,
             text=self.additional_post_text,
         )
-        self.assertEqual(Post.objects.count(), posts_count + 1)
-
-        cached_page_content = self.authorized_client.get(
-            self.index_url
-        ).content
-        self.assertEqual(cached_page_content, page_content)
-
-        cache.clear()
-
-        new_page = self.authorized_client.get(self.index_url).content
-        self.assertNotEqual(cached_page_content, new_page)
+        new_page = self.guest_client.get(self.index_url).content
+        self.assertNotEqual(new_page, page_content)
+        self.assertIn(self.additional_post_text.encode(), new_page)
 
         yet_another_post.delete()
-        self.assertEqual(Post.objects.count(), posts_count)
-
-        cached_new_page = self.authorized_client.get(self.index_url).content
-        self.assertEqual(cached_new_page, new_page)
-
-        cache.clear()
-
-        new_page_2 = self.authorized_client.get(self.index_url).content
-        self.assertNotEqual(new_page_2, cached_new_page)
+        page_after_delete = self.guest_client.get(self.index_url).content
+        self.assertNotIn(
+            self.additional_post_text.encode(),
+            page_after_delete
+        )
 
     def test_authorized_user_can_follow(self):
         """Проверка возможности подписки авторизованным пользователем."""
@@ -586,14 +619,85 @@ class PostsPagesTests(TestCase):
             ).exists()
         )
 
+    @override_settings(POSTS_TASKS_EAGER=True)
     def test_post_of_followed_user_is_visible_for_follower(self):
-        self.authorized_client.post(self.follow_url, follow=True)
+        with run_on_commit():
+            self.authorized_client.post(self.follow_url, follow=True)
         follower_page = self.authorized_client.get(self.follow_index_url)
         self.assertEqual(
             follower_page.context[self.page_obj_name][0].author,
             self.user2
         )
 
-        self.authorized_client.post(self.unfollow_url, follow=True)
+        with run_on_commit():
+            self.authorized_client.post(self.unfollow_url, follow=True)
         follower_page = self.authorized_client.get(self.follow_index_url)
         self.assertFalse(len(follower_page.context[self.page_obj_name]))
+
+
+class PostCommentsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        Comment.objects.bulk_create([
+            Comment(post=cls.post, author=cls.author, text=f'Комментарий {i}')
+            for i in range(COMMENTS_PER_PAGE + 5)
+        ])
+        cls.post_url = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': cls.post.pk}
+        )
+        cls.comments_url = reverse(
+            'posts:post_comments',
+            kwargs={'post_id': cls.post.pk}
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_view_shows_first_page_of_comments(self):
+        """На странице поста выводится только первая порция
+        комментариев, авторы загружаются тем же запросом.
+        """
+        response = self.client.get(self.post_url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, self.comments_url)
+
+    def test_load_more_returns_next_batch(self):
+        """Кнопка «Показать ещё» отдаёт оставшиеся комментарии."""
+        first_page = self.client.get(self.post_url).context['comments']
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.comments_url + '?cursor=' + first_page.next_cursor
+            )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 5)
+        self.assertFalse(rest.has_next())
+        self.assertFalse(
+            {c.pk for c in rest} & {c.pk for c in first_page}
+        )
+
+    def test_first_page_is_cached_until_new_comment(self):
+        """Первая страница комментариев кешируется и сбрасывается
+        новым комментарием.
+        """
+        self.client.get(self.post_url)
+        with self.assertNumQueries(1):
+            self.client.get(self.post_url)
+
+        reader = Client()
+        reader.force_login(self.author)
+        reader.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Свежий комментарий'},
+        )
+        response = self.client.get(self.post_url)
+        self.assertEqual(
+            response.context['comments'][0].text,
+            'Свежий комментарий'
+        )
@@ -0,0 +1,103 @@
+"""Предварительная генерация миниатюр картинок постов.
+
+Миниатюры всех размеров из ``settings.POST_THUMBNAIL_SIZES`` создаются
+в фоне сразу после сохранения поста. Шаблоны только ищут готовую
+миниатюру в хранилище ключей sorl-thumbnail и, пока её нет, выводят
+заглушку, поэтому страница никогда не ждёт обработки картинки.
+
+Картинкам, загруженным через форму, миниатюры не нужны: их варианты
+создаёт ``posts.images``. Миниатюры остаются для импортированных и
+загруженных раньше картинок.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core import metrics
+
+from . import caching
+from .models import Post
+
+# Сколько секунд генерация миниатюр одного поста держит блокировку.
+LOCK_TIMEOUT = 300
+
+
+class PostThumbnailBackend(ThumbnailBackend):
+    def _normalize_options(self, source, options):
+        # Те же умолчания, что в ThumbnailBackend.get_thumbnail, чтобы
+        # имена файлов миниатюр совпадали.
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_existing_thumbnail(self, file_, geometry_string, **options):
+        """Возвращает готовую миниатюру или ``None``, не создавая её."""
+        source = ImageFile(file_)
+        options = self._normalize_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = PostThumbnailBackend()
+
+
+def get_existing(image, size):
+    """Готовая миниатюра размера ``size`` из POST_THUMBNAIL_SIZES."""
+    if not image:
+        return None
+    geometry, options = settings.POST_THUMBNAIL_SIZES[size]
+    return backend.get_existing_thumbnail(image, geometry, **options)
+
+
+def generate_for_image(image):
+    """Создаёт недостающие миниатюры и возвращает их количество."""
+    created = 0
+    started = time.perf_counter()
+    for geometry, options in settings.POST_THUMBNAIL_SIZES.values():
+        if backend.get_existing_thumbnail(image, geometry, **options):
+            continue
+        backend.get_thumbnail(image, geometry, **options)
+        created += 1
+    if created:
+        metrics.observe(
+            'yatube_thumbnail_seconds', time.perf_counter() - started
+        )
+    return created
+
+
+def generate(post_id):
+    """Создаёт миниатюры картинки поста и обновляет его карточку."""
+    lock = f'thumbnail-lock:{post_id}'
+    if not cache.add(lock, True, LOCK_TIMEOUT):
+        # Миниатюры этого поста уже создаёт другой воркер.
+        return
+    try:
+        post = Post.objects.filter(pk=post_id).only(
+            'image', 'image_widths', 'author_id', 'group_id'
+        ).first()
+        if post is None or not post.image or post.image_widths:
+            # У картинок, обработанных posts.images, свои варианты.
+            return
+        if generate_for_image(post.image):
+            # Карточки и страницы с заглушкой нужно перестроить.
+            Post.objects.filter(pk=post_id).update(updated=timezone.now())
+            caching.bump(
+                caching.INDEX_SCOPE,
+                *caching.group_scopes(post.group_id),
+                *caching.profile_scopes(post.author_id),
+            )
+    finally:
+        cache.delete(lock)
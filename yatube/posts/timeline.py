@@ -0,0 +1,125 @@
+"""Материализованные ленты подписок.
+
+Каждый пост при публикации раскладывается в ленты подписчиков автора,
+а подписка и отписка дозаполняют и чистят ленту пользователя. Длина
+ленты ограничена ``settings.TIMELINE_LENGTH``.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.db.backends.sqlite3.base import immediate
+
+from .models import Follow, Post, TimelineEntry
+
+BATCH_SIZE = 500
+
+
+def _entry(user_id, post):
+    return TimelineEntry(
+        user_id=user_id,
+        post_id=post.pk,
+        author_id=post.author_id,
+        pub_date=post.pub_date,
+    )
+
+
+def trim(user_id):
+    """Удаляет из ленты записи сверх ``TIMELINE_LENGTH``."""
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    boundary = entries.order_by('-pub_date', '-post_id').values_list(
+        'pub_date', 'post_id'
+    )[settings.TIMELINE_LENGTH:settings.TIMELINE_LENGTH + 1]
+    boundary = list(boundary)
+    if not boundary:
+        return
+    pub_date, post_id = boundary[0]
+    entries.filter(
+        Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, post_id__lte=post_id)
+    ).delete()
+
+
+def fan_out(post_id):
+    """Добавляет пост в ленты всех подписчиков его автора."""
+    post = Post.objects.filter(pk=post_id).only(
+        'pk', 'author_id', 'pub_date'
+    ).first()
+    if post is None:
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    batch = []
+    for user_id in follower_ids.iterator():
+        batch.append(user_id)
+        if len(batch) >= BATCH_SIZE:
+            _fan_out_batch(post, batch)
+            batch = []
+    if batch:
+        _fan_out_batch(post, batch)
+
+
+def _fan_out_batch(post, user_ids):
+    with transaction.atomic():
+        TimelineEntry.objects.bulk_create(
+            [_entry(user_id, post) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+    for user_id in user_ids:
+        trim(user_id)
+
+
+def backfill(user_id, author_id):
+    """Дозаполняет ленту последними постами нового автора.
+
+    Задачи выполняются без порядка, и отписка могла успеть раньше:
+    подписка проверяется в той же транзакции, что пишет ленту.
+    """
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk'
+    ).only('pk', 'author_id', 'pub_date')[:settings.TIMELINE_LENGTH]
+    with immediate(), transaction.atomic():
+        if not Follow.objects.filter(
+            user_id=user_id, author_id=author_id
+        ).exists():
+            return
+        TimelineEntry.objects.bulk_create(
+            [_entry(user_id, post) for post in posts],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+    trim(user_id)
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete()
+
+
+def _rebuild_sql():
+    # Лента собирается одним INSERT ... SELECT без создания объектов
+    # моделей: при массовой пересборке (импорт, rebuild_timelines)
+    # построчная работа ORM обходилась дороже самих запросов.
+    return (
+        f'INSERT INTO {TimelineEntry._meta.db_table} '
+        f'(user_id, post_id, author_id, pub_date) '
+        f'SELECT %s, id, author_id, pub_date FROM {Post._meta.db_table} '
+        f'WHERE author_id IN (SELECT author_id FROM {Follow._meta.db_table} '
+        f'WHERE user_id = %s) '
+        f'ORDER BY pub_date DESC, id DESC LIMIT %s'
+    )
+
+
+def rebuild(user_ids):
+    """Пересобирает ленты указанных пользователей с нуля в одной
+    транзакции.
+    """
+    sql = _rebuild_sql()
+    with transaction.atomic(), connection.cursor() as cursor:
+        for user_id in user_ids:
+            TimelineEntry.objects.filter(user_id=user_id).delete()
+            cursor.execute(
+                sql, [user_id, user_id, settings.TIMELINE_LENGTH]
+            )
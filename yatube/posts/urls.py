@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
@@ -9,6 +9,8 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
+    path('export/<str:kind>/', views.export, name='export'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -20,6 +22,11 @@ urlpatterns = [
         name='profile_unfollow'
     ),
     path('posts/<int:post_id>/', views.post_view, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path(
@@ -27,4 +34,22 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    path('api/v1/posts/', api.index, name='api_index'),
+    path(
+        'api/v1/group/<slug:slug>/posts/',
+        api.group_posts,
+        name='api_group_posts'
+    ),
+    path(
+        'api/v1/profile/<str:username>/posts/',
+        api.profile,
+        name='api_profile'
+    ),
+    path('api/v1/follow/', api.follow_index, name='api_follow_index'),
+    path('api/v1/posts/<int:post_id>/', api.post_view, name='api_post'),
+    path(
+        'api/v1/posts/<int:post_id>/comments/',
+        api.post_comments,
+        name='api_post_comments'
+    ),
 ]
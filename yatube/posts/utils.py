@@ -1,8 +1,178 @@
-from django.core.paginator import Paginator
+import base64
+import json
 
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 
-def pagination(request, post_list):
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+from .models import Comment
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+
+class CursorPage:
+    """Страница выборки, полученная курсорным пагинатором.
+
+    Повторяет интерфейс ``django.core.paginator.Page`` в той части,
+    которая нужна шаблонам: итерация, длина, ``has_next``,
+    ``has_previous`` и ``has_other_pages``. Курсоры считаются по
+    исходным строкам, поэтому ``object_list`` можно заменить,
+    например, на связанные объекты.
+    """
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._edges = (object_list[0], object_list[-1]) if object_list else ()
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        """Курсор на более старые записи."""
+        if not self._has_next or not self._edges:
+            return None
+        return self.paginator.encode_cursor(self._edges[1], True)
+
+    @property
+    def previous_cursor(self):
+        """Курсор на более новые записи."""
+        if not self._has_previous or not self._edges:
+            return None
+        return self.paginator.encode_cursor(self._edges[0], False)
+
+
+class CursorPaginator:
+    """Пагинатор по ключу сортировки (keyset pagination).
+
+    Вместо ``COUNT(*)`` и ``OFFSET`` страница выбирается условием
+    «строго после последней показанной записи», поэтому стоимость
+    запроса не зависит от номера страницы. Поля ``ordering`` должны
+    однозначно упорядочивать выборку и иметь одно направление.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-pk')):
+        descending = {field.startswith('-') for field in ordering}
+        if len(descending) != 1:
+            raise ValueError(
+                'Все поля ordering должны иметь одно направление.'
+            )
+        self.object_list = object_list
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.descending = descending.pop()
+        self.fields = tuple(field.lstrip('-') for field in ordering)
+
+    def _reversed_ordering(self):
+        if self.descending:
+            return self.fields
+        return tuple(f'-{field}' for field in self.fields)
+
+    def _model_field(self, name):
+        opts = self.object_list.model._meta
+        if name == 'pk':
+            return opts.pk
+        return opts.get_field(name)
+
+    def encode_cursor(self, obj, forward):
+        values = [
+            self._model_field(field).value_to_string(obj)
+            for field in self.fields
+        ]
+        payload = json.dumps([int(forward)] + values)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """Разбирает курсор, для испорченного возвращает ``None``."""
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            forward, *values = payload
+            if len(values) != len(self.fields):
+                return None
+            position = [
+                self._model_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            return None
+        return bool(forward), position
+
+    def _seek(self, position, forward):
+        """Условие «строго после position» по направлению обхода."""
+        older = forward == self.descending
+        lookup = 'lt' if older else 'gt'
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            step = Q(**{f'{field}__{lookup}': position[index]})
+            for prev_field, value in zip(self.fields, position[:index]):
+                step &= Q(**{prev_field: value})
+            condition |= step
+        return condition
+
+    def get_page(self, cursor=None):
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            rows = list(
+                self.object_list.order_by(*self.ordering)[:self.per_page + 1]
+            )
+            has_next = len(rows) > self.per_page
+            return CursorPage(rows[:self.per_page], self, has_next, False)
+
+        forward, position = decoded
+        queryset = self.object_list.filter(self._seek(position, forward))
+        if forward:
+            rows = list(
+                queryset.order_by(*self.ordering)[:self.per_page + 1]
+            )
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            return CursorPage(rows, self, has_more, True)
+
+        rows = list(
+            queryset.order_by(
+                *self._reversed_ordering()
+            )[:self.per_page + 1]
+        )
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return CursorPage(rows, self, True, has_more)
+
+
+def pagination(request, post_list, ordering=('-pub_date', '-pk')):
+    paginator = CursorPaginator(post_list, POSTS_PER_PAGE, ordering)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def comments_paginator(post_id):
+    """Пагинатор комментариев поста, от новых к старым."""
+    return CursorPaginator(
+        Comment.objects.filter(post_id=post_id).for_list(),
+        COMMENTS_PER_PAGE,
+        ordering=('-created', '-pk'),
+    )
+
+
+def comments_pagination(post_id, cursor=None):
+    return comments_paginator(post_id).get_page(cursor)
@@ -1,17 +1,28 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
-from django.views.decorators.cache import cache_page
 
+from core.db import group_commit
+
+from . import caching, follows
+from .caching import cache_feed, conditional, feed_validators
+from .counters import get_user_counters
+from .export import EXPORTS, FORMATS, buffered, export_rows, parse_since
+from .export import render as render_export
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import pagination
+from .models import Follow, Group, Post, TimelineEntry, User
+from .search import search_pagination
+from .utils import comments_pagination, pagination
 
 
-@cache_page(20, key_prefix="index_page")
+@conditional(feed_validators(caching.index_scope))
+@cache_feed(caching.index_scope)
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.select_related('group').all()
+    post_list = Post.objects.for_feed()
     page_obj = pagination(request, post_list)
     context = {
         'page_obj': page_obj,
@@ -19,10 +30,12 @@ def index(request):
     return render(request, template, context)
 
 
+@conditional(feed_validators(caching.group_scope))
+@cache_feed(caching.group_scope)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = group.posts.for_feed()
     page_obj = pagination(request, post_list)
     context = {
         'group': group,
@@ -31,34 +44,53 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@conditional(feed_validators(caching.profile_scope))
+@cache_feed(caching.profile_scope)
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    author_posts_cnt = post_list.count()
+    author = get_object_or_404(
+        User.objects.select_related('counters'),
+        username=username
+    )
+    post_list = author.posts.for_feed()
+    author_counters = get_user_counters(author)
     page_obj = pagination(request, post_list)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user,
-            author=author
-        ).exists()
-    else:
-        following = False
+    following = author.pk in follows.following_for(request)
     context = {
         'author': author,
-        'author_posts_cnt': author_posts_cnt,
+        'author_counters': author_counters,
+        'author_posts_cnt': author_counters.posts_count,
         'page_obj': page_obj,
         'following': following
     }
     return render(request, template, context)
 
 
+def get_post(request, post_id):
+    """Пост страницы; загружается один раз за запрос, так как нужен и
+    для валидаторов условного запроса, и для самой страницы.
+    """
+    if not hasattr(request, '_post'):
+        request._post = Post.objects.select_related(
+            'author__counters', 'group'
+        ).filter(id=post_id).first()
+    return request._post
+
+
+def post_page_validators(request, post_id):
+    post = get_post(request, post_id)
+    return None if post is None else caching.post_validators(post)
+
+
+@conditional(post_page_validators)
 def post_view(request, post_id):
     template = 'posts/post_view.html'
-    post = get_object_or_404(Post, id=post_id)
-    author_posts_cnt = post.author.posts.count()
+    post = get_post(request, post_id)
+    if post is None:
+        raise Http404('Пост не найден')
+    author_posts_cnt = get_user_counters(post.author).posts_count
     form = CommentForm()
-    comments = post.comments.all()
+    comments = caching.first_comments_page(post.pk)
     context = {
         'post': post,
         'author_posts_cnt': author_posts_cnt,
@@ -68,15 +100,39 @@ def post_view(request, post_id):
     return render(request, template, context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    template = 'posts/includes/comments.html'
+    comments = comments_pagination(post_id, request.GET.get('cursor'))
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, template, context)
+
+
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = search_pagination(query, request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
 
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        group_commit.submit(post.save)
         return redirect(
             reverse(
                 'posts:profile',
@@ -107,7 +163,9 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        # Файл картинки, пост и ссылка на файл сохраняются вместе.
+        with transaction.atomic():
+            form.save()
         return redirect(
             reverse(
                 'posts:post_detail',
@@ -128,17 +186,17 @@ def add_comment(request, post_id):
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
-        comment.post = Post(pk=post_id)
-        comment.save()
+        comment.post = get_object_or_404(Post, pk=post_id)
+        group_commit.submit(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
     template = 'posts/index.html'
-    user = request.user
-    post_list = Post.objects.filter(author__following__user=user)
-    page_obj = pagination(request, post_list)
+    entries = TimelineEntry.objects.filter(user=request.user).for_feed()
+    page_obj = pagination(request, entries, ordering=('-pub_date', '-post_id'))
+    page_obj.object_list = [entry.post for entry in page_obj]
     context = {
         'page_obj': page_obj
     }
@@ -182,3 +240,36 @@ def profile_unfollow(request, username):
             kwargs={'username': username}
         )
     )
+
+
+@staff_member_required
+def export(request, kind):
+    """Потоковая выгрузка постов или комментариев для аналитики."""
+    if kind not in EXPORTS:
+        raise Http404('Неизвестная выгрузка')
+    output_format = request.GET.get('format', 'ndjson')
+    if output_format not in FORMATS:
+        return HttpResponseBadRequest('Формат: ndjson или csv')
+    since = request.GET.get('since')
+    if since:
+        since = parse_since(since)
+        if since is None:
+            return HttpResponseBadRequest('since: дата в формате ISO 8601')
+    after = request.GET.get('after')
+    if after and not after.isdigit():
+        return HttpResponseBadRequest('after: id последней строки')
+    rows = export_rows(
+        kind,
+        since=since or None,
+        after=int(after) if after else None,
+        base_url=request.build_absolute_uri('/'),
+    )
+    response = StreamingHttpResponse(
+        buffered(render_export(kind, rows, output_format)),
+        content_type=FORMATS[output_format],
+    )
+    if output_format == 'csv':
+        response['Content-Disposition'] = (
+            f'attachment; filename="{kind}.csv"'
+        )
+    return response
@@ -55,6 +55,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,6 +64,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.db.routers.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -91,11 +94,53 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # SQLite с WAL и прагмами для конкурентной записи (core/db).
+        'ENGINE': 'core.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переиспользуется между запросами.
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Реплики только для чтения (core/db/routers.py): на них идут ленты,
+# страница поста и списки админки. Для проверки на одной машине
+# подойдёт копия SQLite, которую обновляет
+# ``python manage.py sync_replicas --interval 1``, если добавить
+# 'replica' в DATABASE_REPLICAS
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_posts',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:post_comments',
+    'posts:api_index',
+    'posts:api_group_posts',
+    'posts:api_profile',
+    'posts:api_post',
+    'posts:api_post_comments',
+    'admin:*_changelist',
+]
+# GET-представления, которые пишут в базу: после них, как и после
+# любого POST, пользователь читает из основной базы
+REPLICA_PIN_VIEWS = ['posts:profile_follow', 'posts:profile_unfollow']
+# Реплика, отставшая больше чем на столько секунд, не используется
+REPLICA_MAX_LAG = 5
+# Сколько секунд после записи пользователь читает только с реплик,
+# уже получивших его изменения
+REPLICA_PIN_SECONDS = 30
+# Как часто процесс проверяет отставание реплик
+REPLICA_CHECK_INTERVAL = 1
+
+# Сколько записей групповая фиксация объединяет в одну транзакцию
+GROUP_COMMIT_MAX_BATCH = 64
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -157,9 +202,72 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Файлы моложе стольких секунд не удаляются ни сборщиком мусора, ни
+# снятием последней ссылки: их загрузка могла ещё не сохранить объект
+MEDIA_GC_MIN_AGE = 24 * 60 * 60
 
+# Общий для всех воркеров кеш в файле SQLite (см. core/cache.py)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'LOCK_TIMEOUT': 10,
+            'STALE_TIMEOUT': 60,
+            'EARLY_EXPIRY_BETA': 1,
+        },
     }
 }
+
+# Тесты получают свой файл кеша во временном каталоге (core/testing.py)
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# Фоновые задачи приложения posts выполняются в пуле потоков; True —
+# в потоке запроса после фиксации (для тестов)
+POSTS_TASKS_EAGER = False
+POSTS_TASK_WORKERS = 4
+
+# Сколько последних постов хранится в ленте подписок пользователя
+TIMELINE_LENGTH = 1000
+
+# Страницы лент сбрасываются сигналами, поэтому живут без ограничения
+FEED_CACHE_TIMEOUT = None
+
+# Подписки пользователя в кеше тоже сбрасываются сигналами; срок жизни
+# лишь ограничивает ошибку, если запись попала в кеш до фиксации
+FOLLOWING_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Размеры миниатюр картинок постов: создаются в фоне после сохранения
+POST_THUMBNAIL_SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+# Загрузки пишутся во временный файл частями; файл больше
+# POST_IMAGE_MAX_BYTES дочитывается без записи и отклоняется формой.
+# Первый рубеж — ограничение тела запроса в nginx (client_max_body_size)
+FILE_UPLOAD_HANDLERS = ['posts.images.ImageUploadHandler']
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+# Картинки с большим числом пикселей отклоняются до декодирования
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
+# Картинки постов уменьшаются до такого размера по большей стороне и
+# сохраняются ещё и в этих ширинах, в JPEG и WebP (см. posts/images.py)
+POST_IMAGE_MAX_SIZE = 2048
+POST_IMAGE_WIDTHS = (480, 960, 1600)
+POST_IMAGE_QUALITY = 85
+
+# Выборочное профилирование запросов: каждый N-й запрос в среднем
+# (0 — только запросы с токеном из profile_token в заголовке X-Profile)
+PROFILE_SAMPLE_RATE = 0
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILE_KEEP = 500
+PROFILE_TOKEN_MAX_AGE = 24 * 60 * 60
+
+# Метрики для Prometheus: каждый воркер раз в METRICS_FLUSH_INTERVAL
+# секунд сохраняет свои итоги в METRICS_DIR, /metrics/ их складывает.
+# Каталог очищают при развёртывании
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 10
+# Токен сборщика для заголовка Authorization: Bearer; пустой — только
+# для сотрудников
+METRICS_TOKEN = ''